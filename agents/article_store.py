@@ -0,0 +1,226 @@
+"""
+SQLite article store with an FTS5 full-text index, and the static search
+artifact built from it.
+
+Every published article is written to the store. The search artifact is a set
+of compact JSON files under docs/search/:
+
+    docs/search/t/<prefix>.json   {"term": [doc id, ...], ...} for every indexed
+                                  term starting with <prefix> (its first two
+                                  characters), newest documents first
+    docs/search/d/<block>.json    {"<doc id>": [title, url, date], ...} for ids
+                                  in [block * 500, block * 500 + 500)
+
+so the browser only downloads the shard for what is being typed plus the
+metadata blocks of the hits. Shards are read straight from the FTS5 index via
+fts5vocab, and after a publish only the shards touched by the new article's
+terms are regenerated.
+"""
+import os
+import re
+import json
+import html
+import sqlite3
+import unicodedata
+
+from markup import article_tags
+
+STORE_NAME = "articles.db"
+PREFIX_LENGTH = 2
+DOC_BLOCK_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    url TEXT NOT NULL,
+    published TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_published ON articles (published);
+CREATE TABLE IF NOT EXISTS article_tags (
+    tag TEXT NOT NULL,
+    article_id INTEGER NOT NULL REFERENCES articles (id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, article_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, body, content='articles', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_terms USING fts5vocab(articles_fts, 'instance');
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_vocab USING fts5vocab(articles_fts, 'row');
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_au AFTER UPDATE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    INSERT INTO articles_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+"""
+
+_WORD_RE = re.compile(r"[^\W_]+")
+_MAIN_CONTENT_RE = re.compile(r'<div class="main-content">(.*?)</div>', re.S)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def tokenize(text):
+    """Approximates the unicode61 tokenizer (lowercase, diacritics removed) to find a document's terms."""
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return set(_WORD_RE.findall(folded))
+
+
+def html_to_text(page):
+    """Extracts the readable article text from a published page (used for articles without a source)."""
+    match = _MAIN_CONTENT_RE.search(page)
+    return html.unescape(_TAG_RE.sub(" ", match.group(1) if match else page)).strip()
+
+
+class ArticleStore:
+    """Articles plus their FTS5 index, in one SQLite database."""
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM articles").fetchone()[0]
+
+    def upsert(self, key, title, body, url, published, tags=()):
+        """Inserts or updates an article and replaces its tags; returns its id."""
+        with self.db:
+            self.db.execute(
+                "INSERT INTO articles (key, title, body, url, published) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET title=excluded.title, body=excluded.body, "
+                "url=excluded.url, published=excluded.published "
+                "WHERE title IS NOT excluded.title OR body IS NOT excluded.body "
+                "OR url IS NOT excluded.url OR published IS NOT excluded.published",
+                (key, title, body, url, published),
+            )
+            article_id = self.db.execute("SELECT id FROM articles WHERE key = ?", (key,)).fetchone()[0]
+            self.db.execute("DELETE FROM article_tags WHERE article_id = ?", (article_id,))
+            self.db.executemany("INSERT OR IGNORE INTO article_tags (tag, article_id) VALUES (?, ?)",
+                                ((tag, article_id) for tag in tags))
+        return article_id
+
+    def sync_manifest(self, builder, only_missing=True):
+        """Upserts articles from the site manifest; by default only those the store doesn't have yet."""
+        known = {row[0] for row in self.db.execute("SELECT key FROM articles")} if only_missing else set()
+        for key, record in builder.manifest.articles.items():
+            if key in known:
+                continue
+            if record.get("source"):
+                with open(os.path.join(builder.content_dir, record["source"]), "r") as f:
+                    body = f.read()
+            else:
+                with open(os.path.join(builder.website_dir, record["output"]), "r") as f:
+                    body = html_to_text(f.read())
+            self.upsert(key, record["title"], body, record["output"], record["date"],
+                        article_tags(body, record["title"]))
+
+    def search(self, query, limit=20):
+        """Full-text search; returns (id, title, url, published) rows best match first."""
+        return self.db.execute(
+            "SELECT a.id, a.title, a.url, a.published FROM articles_fts "
+            "JOIN articles a ON a.id = articles_fts.rowid "
+            "WHERE articles_fts MATCH ? ORDER BY bm25(articles_fts, 5.0, 1.0) LIMIT ?",
+            (query, limit),
+        ).fetchall()
+
+    def iter_articles(self, newest_first=False, tag=None, offset=0, limit=-1, with_body=False):
+        """Streams (id, key, title, url, published[, body]) rows ordered by publish date.
+
+        Rows come straight off the SQLite cursor, so callers can walk the whole
+        archive without holding it in memory.
+        """
+        order = "DESC" if newest_first else "ASC"
+        columns = "a.id, a.key, a.title, a.url, a.published" + (", a.body" if with_body else "")
+        if tag is None:
+            return self.db.execute(
+                f"SELECT {columns} FROM articles a ORDER BY a.published {order}, a.id {order} LIMIT ? OFFSET ?",
+                (limit, offset))
+        return self.db.execute(
+            f"SELECT {columns} FROM articles a JOIN article_tags t ON t.article_id = a.id WHERE t.tag = ? "
+            f"ORDER BY a.published {order}, a.id {order} LIMIT ? OFFSET ?",
+            (tag, limit, offset))
+
+    def count(self, tag=None):
+        if tag is None:
+            return len(self)
+        return self.db.execute("SELECT count(*) FROM article_tags WHERE tag = ?", (tag,)).fetchone()[0]
+
+    def tags(self, article_id=None):
+        """Returns [(tag, article count)] sorted by tag, optionally only the tags of one article."""
+        if article_id is None:
+            return self.db.execute("SELECT tag, count(*) FROM article_tags GROUP BY tag ORDER BY tag").fetchall()
+        return self.db.execute(
+            "SELECT tag, (SELECT count(*) FROM article_tags c WHERE c.tag = t.tag) FROM article_tags t "
+            "WHERE article_id = ? ORDER BY tag", (article_id,)).fetchall()
+
+    def prefixes(self):
+        """Returns every term prefix present in the index."""
+        rows = self.db.execute("SELECT DISTINCT substr(term, 1, ?) FROM articles_vocab", (PREFIX_LENGTH,))
+        return {row[0] for row in rows}
+
+    def postings(self, prefix):
+        """Returns {term: [doc ids, newest first]} for all indexed terms starting with prefix."""
+        if len(prefix) < PREFIX_LENGTH:
+            # Terms shorter than the prefix length have a shard of their own.
+            rows = self.db.execute("SELECT DISTINCT term, doc FROM articles_terms WHERE term = ?", (prefix,))
+        else:
+            upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            rows = self.db.execute(
+                "SELECT DISTINCT term, doc FROM articles_terms WHERE term >= ? AND term < ?", (prefix, upper))
+        postings = {}
+        for term, doc in rows:
+            postings.setdefault(term, []).append(doc)
+        for docs in postings.values():
+            docs.sort(reverse=True)
+        return postings
+
+    def doc_block(self, block):
+        """Returns {id: [title, url, published date]} for one metadata block."""
+        start = block * DOC_BLOCK_SIZE
+        rows = self.db.execute(
+            "SELECT id, title, url, substr(published, 1, 10) FROM articles WHERE id >= ? AND id < ? ORDER BY id",
+            (start, start + DOC_BLOCK_SIZE))
+        return {str(doc_id): [title, url, date] for doc_id, title, url, date in rows}
+
+
+def _dump(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, sort_keys=True)
+
+
+def write_search_index(store, builder, prefixes=None, doc_ids=None):
+    """Writes search shards through the site builder (unchanged shards are not rewritten).
+
+    With prefixes/doc_ids of None every shard is regenerated; otherwise only the
+    term shards for the given prefixes and the metadata blocks holding doc_ids.
+    Returns the number of shard files considered.
+    """
+    if prefixes is None:
+        prefixes = store.prefixes()
+    if doc_ids is None:
+        doc_ids = [row[0] for row in store.db.execute("SELECT id FROM articles")]
+    for prefix in sorted(prefixes):
+        builder.emit(f"search/t/{prefix}.json", _dump(store.postings(prefix)))
+    blocks = {doc_id // DOC_BLOCK_SIZE for doc_id in doc_ids}
+    for block in sorted(blocks):
+        builder.emit(f"search/d/{block}.json", _dump(store.doc_block(block)))
+    builder.emit("search/meta.json", _dump({"prefix": PREFIX_LENGTH, "block": DOC_BLOCK_SIZE}))
+    return len(prefixes) + len(blocks)
+
+
+def term_prefixes(*texts):
+    """Returns the shard prefixes touched by the terms of the given texts."""
+    return {term[:PREFIX_LENGTH] for text in texts for term in tokenize(text)}
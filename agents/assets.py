@@ -0,0 +1,197 @@
+"""
+Post-render optimization of the published site.
+
+    minify_html / minify_css     whitespace and comment stripping
+    fingerprint_assets           docs/style.css -> style.<hash>.css (minified) and
+                                 docs/search.js -> search.<hash>.js, so they can be
+                                 served with far-future cache headers
+    precompress                  .gz (and .br when the brotli module is installed)
+                                 siblings for hosts that serve precompressed files
+
+Compression runs in a thread pool (zlib and brotli release the GIL) and is
+skipped for files whose hash matches the one recorded in the manifest. Each
+build appends a size/time report to logs/asset_report.jsonl.
+"""
+import os
+import re
+import glob
+import gzip
+import json
+import time
+import datetime
+
+from site_build import content_hash
+
+# Source assets in docs/ that get a fingerprinted copy, keyed by template name.
+FINGERPRINTED_ASSETS = {"style": "style.css", "search": "search.js"}
+COMPRESSIBLE_EXTENSIONS = (".html", ".css", ".js", ".xml", ".json")
+MIN_COMPRESS_SIZE = 256
+
+_RAW_BLOCK_RE = re.compile(r"(<(pre|textarea|script|style)\b.*?</\2>)", re.S | re.I)
+_HTML_COMMENT_RE = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_NEWLINE_SPACE_RE = re.compile(r"\s*\n\s*")
+_SPACE_RUN_RE = re.compile(r"[ \t]{2,}")
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE_RE = re.compile(r"\s+")
+_CSS_PUNCT_RE = re.compile(r"\s*([{};,>])\s*")
+_CSS_BRACE_RE = re.compile(r"([{}])")
+_CSS_COLON_RE = re.compile(r"\s*:\s*")
+
+
+def minify_html(text):
+    """Strips comments and indentation; whitespace inside pre/textarea/script/style is left alone."""
+    pieces = []
+    parts = _RAW_BLOCK_RE.split(text)
+    # split() yields text, raw block, tag name, text, raw block, tag name, ...
+    for index in range(0, len(parts), 3):
+        chunk = _HTML_COMMENT_RE.sub("", parts[index])
+        chunk = _NEWLINE_SPACE_RE.sub("\n", chunk)
+        pieces.append(_SPACE_RUN_RE.sub(" ", chunk))
+        if index + 1 < len(parts):
+            pieces.append(parts[index + 1])
+    return "".join(pieces).strip() + "\n"
+
+
+def minify_css(text):
+    text = _CSS_COMMENT_RE.sub("", text)
+    text = _CSS_SPACE_RE.sub(" ", text)
+    text = _CSS_PUNCT_RE.sub(r"\1", text)
+    # Spaces around ":" only go inside declaration blocks (text closed by "}"); in a
+    # selector "a :hover" means something else than "a:hover".
+    parts = _CSS_BRACE_RE.split(text)
+    for index in range(0, len(parts) - 1, 2):
+        if parts[index + 1] == "}":
+            parts[index] = _CSS_COLON_RE.sub(":", parts[index])
+    return "".join(parts).replace(";}", "}").strip() + "\n"
+
+
+def fingerprint_assets(builder, minify=True):
+    """Writes fingerprinted copies of the source assets and removes superseded ones.
+
+    Returns {name: file name} for the templates' `assets` context.
+    """
+    names = {}
+    for name, source in FINGERPRINTED_ASSETS.items():
+        path = os.path.join(builder.website_dir, source)
+        if not os.path.exists(path):
+            continue
+        with open(path, "r") as f:
+            text = f.read()
+        stem, ext = os.path.splitext(source)
+        if minify and ext == ".css":
+            text = minify_css(text)
+        digest = content_hash(text)[:10]
+        fingerprinted = f"{stem}.{digest}{ext}"
+        builder.emit(fingerprinted, text)
+        names[name] = fingerprinted
+        version_re = re.compile(rf"^{re.escape(stem)}\.([0-9a-f]{{10}}){re.escape(ext)}(\.gz|\.br)?$")
+        for stale in glob.glob(os.path.join(builder.website_dir, f"{stem}.*")):
+            match = version_re.match(os.path.basename(stale))
+            if match and match.group(1) != digest:
+                os.remove(stale)
+                builder.changed.append(stale)
+    return names
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _compress(path, brotli):
+    """Writes path.gz (and path.br); returns (raw, gzip, brotli) sizes."""
+    with open(path, "rb") as f:
+        data = f.read()
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    with open(f"{path}.gz", "wb") as f:
+        f.write(gz)
+    br_size = None
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        with open(f"{path}.br", "wb") as f:
+            f.write(br)
+        br_size = len(br)
+    return len(data), len(gz), br_size
+
+
+def _candidates(builder, full):
+    if not full:
+        site_prefix = os.path.join(builder.website_dir, "")
+        return [p for p in builder.changed if p.startswith(site_prefix) and os.path.exists(p)]
+    paths = []
+    for root, dirs, files in os.walk(builder.website_dir):
+        dirs[:] = [d for d in dirs if not d.startswith("_")]
+        paths.extend(os.path.join(root, name) for name in files)
+    return paths
+
+
+def precompress(builder, full=False, workers=None):
+    """Compresses the files written by this build (every site file when full) in parallel.
+
+    Files whose content hash matches the manifest's asset record keep their
+    existing siblings. Returns a list of (path, raw, gzip, brotli) for files
+    that were compressed.
+    """
+    brotli = _brotli()
+    jobs = []
+    for path in _candidates(builder, full):
+        if not path.endswith(COMPRESSIBLE_EXTENSIONS) or path.endswith("_template.html") \
+                or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+            continue
+        rel_path = os.path.relpath(path, builder.website_dir)
+        with open(path, "rb") as f:
+            digest = content_hash(f.read())
+        record = builder.manifest.assets.get(rel_path)
+        if record and record["hash"] == digest and os.path.exists(f"{path}.gz") \
+                and (brotli is None or os.path.exists(f"{path}.br")):
+            continue
+        jobs.append((path, rel_path, digest))
+
+    results = []
+    if not jobs:
+        return results
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 1) + 1)) as pool:
+        for (path, rel_path, digest), sizes in zip(jobs, pool.map(lambda job: _compress(job[0], brotli), jobs)):
+            raw, gz, br = sizes
+            builder.manifest.put_asset(rel_path, {"hash": digest, "bytes": raw, "gzip": gz, "brotli": br})
+            builder.changed.append(f"{path}.gz")
+            if br is not None:
+                builder.changed.append(f"{path}.br")
+            results.append((rel_path, raw, gz, br))
+    return results
+
+
+def write_report(report_path, results, seconds, page_paths=("index.html",), builder=None):
+    """Appends one JSON line summarising this build's optimization to report_path; returns it."""
+    report = {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "seconds": round(seconds, 3),
+        "files": len(results),
+        "bytes": sum(r[1] for r in results),
+        "gzip": sum(r[2] for r in results),
+        "brotli": sum(r[3] or 0 for r in results) or None,
+        "largest": [{"path": p, "bytes": raw, "gzip": gz, "brotli": br}
+                    for p, raw, gz, br in sorted(results, key=lambda r: r[1], reverse=True)[:20]],
+    }
+    if builder is not None:
+        # Compressed bytes a first visit to each page costs: the page plus its stylesheet.
+        assets = builder.manifest.assets
+        style = assets.get(builder.page_context.get("assets", {}).get("style", ""), {})
+        report["page_view_gzip"] = {
+            page: assets[page]["gzip"] + style.get("gzip", 0) for page in page_paths if page in assets
+        }
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, "a") as f:
+        f.write(json.dumps(report, separators=(",", ":")) + "\n")
+    return report
+
+
+def optimize(builder, report_path, full=False):
+    """Runs the compression stage and writes the build report."""
+    start = time.perf_counter()
+    results = precompress(builder, full=full)
+    return write_report(report_path, results, time.perf_counter() - start, builder=builder)
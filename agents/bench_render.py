@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: single-pass markup renderer vs. the previous regex section splitter.
+
+Usage: python3 agents/bench_render.py [--sizes 2,20,200,2000] [--repeat 5]
+Sizes are approximate article sizes in KB. For each size the best time per
+render and the peak traced memory are reported for both code paths, then the
+markup renderer alone is timed on unbalanced inline markers (one long line of
+openers without closers), which must stay linear too.
+"""
+import re
+import time
+import argparse
+import tracemalloc
+
+from markup import render_article_body
+
+
+def legacy_render_body(raw_article_content):
+    """The body formatting previously inlined in content_creator.main(), kept as the baseline."""
+    title_match = re.search(r"Title: (.*)", raw_article_content)
+    article_title = title_match.group(1).strip() if title_match else None
+    article_body = re.sub(r"Title: .*\n\n", "", raw_article_content, 1).strip()
+
+    processed_body = []
+    sections = re.split(r"(Introduction:|Body:|Conclusion:)", article_body)
+    i = 0
+    while i < len(sections):
+        section_title = sections[i].strip()
+        if section_title in ["Introduction:", "Body:", "Conclusion:"]:
+            processed_body.append(f"<h3>{section_title}</h3>")
+            i += 1
+            if i < len(sections):
+                content = sections[i].strip()
+                paragraphs = content.split('\n\n')
+                for p in paragraphs:
+                    if p.strip():
+                        processed_body.append(f"<p>{p.strip()}</p>")
+        elif section_title:
+            paragraphs = section_title.split('\n\n')
+            for p in paragraphs:
+                if p.strip():
+                    processed_body.append(f"<p>{p.strip()}</p>")
+        i += 1
+    return article_title, "\n".join(processed_body)
+
+
+PARAGRAPH = ("AI systems learn from data, and if that data reflects existing societal biases, "
+             "the AI will *perpetuate* and even **amplify** them. See [the report](https://example.com/r) "
+             "for `details` on hiring & lending.\n\n")
+
+
+def make_article(size_kb):
+    """Builds a synthetic generator output of roughly size_kb kilobytes."""
+    parts = ["Title: Benchmark Article\n\nIntroduction:\n", PARAGRAPH, "Body:\n"]
+    per_section = max(1, (size_kb * 1024) // len(PARAGRAPH))
+    parts.extend(PARAGRAPH for _ in range(per_section))
+    parts.extend(["Conclusion:\n", PARAGRAPH])
+    return "".join(parts)
+
+
+UNBALANCED_UNITS = ("*a ", "_a ", "**a ", "[a ", "[a](")
+
+
+def make_unbalanced(size_kb, unit):
+    """Builds a body that is one line of size_kb kilobytes of unit, an opening marker with no closer."""
+    return "Title: Unbalanced\n\n" + unit * max(1, (size_kb * 1024) // len(unit))
+
+
+def measure(func, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="2,20,200,2000", help="Comma-separated article sizes in KB.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'legacy ms':>10} {'markup ms':>10} {'legacy MB/s':>12} {'markup MB/s':>12} "
+          f"{'legacy peak':>12} {'markup peak':>12}")
+    for size_kb in (int(s) for s in args.sizes.split(",")):
+        text = make_article(size_kb)
+        mb = len(text) / 1e6
+        legacy_t, legacy_peak = measure(legacy_render_body, text, args.repeat)
+        markup_t, markup_peak = measure(render_article_body, text, args.repeat)
+        print(f"{len(text) // 1024:>6}KB {legacy_t * 1e3:>10.2f} {markup_t * 1e3:>10.2f} "
+              f"{mb / legacy_t:>12.1f} {mb / markup_t:>12.1f} "
+              f"{legacy_peak // 1024:>10}KB {markup_peak // 1024:>10}KB")
+
+    print(f"\n{'size':>8} {'marker':>8} {'markup ms':>10} {'markup MB/s':>12}")
+    for size_kb in (int(s) for s in args.sizes.split(",")):
+        for unit in UNBALANCED_UNITS:
+            text = make_unbalanced(size_kb, unit)
+            markup_t, _ = measure(render_article_body, text, args.repeat)
+            print(f"{len(text) // 1024:>6}KB {unit.strip():>8} {markup_t * 1e3:>10.2f} {len(text) / 1e6 / markup_t:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,147 +1,380 @@
 #!/usr/bin/env python3
 import os
-import datetime
 import re
-from bs4 import BeautifulSoup
+import sys
+import datetime
+import argparse
+import unicodedata
+
+from assets import FINGERPRINTED_ASSETS, fingerprint_assets, minify_html, optimize
+from article_store import ArticleStore, STORE_NAME, term_prefixes, write_search_index
+from feeds import build_archive, build_feed, build_sitemap
+from generation import (DEFAULT_CACHE_BYTES, GENERATORS, ResponseCache, article_prompt, ensure_title,
+                        generate_batch, load_topics, make_generator, pick_topics)
+from markup import article_tags, render_article_body
+from site_build import SiteBuilder
+from templates import TemplateLoader
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+import telemetry  # noqa: E402
+
+BASE_DIR = os.environ.get("AI_BASE_DIR", "/home/miki/AI")
+CONTENT_DIR = os.path.join(BASE_DIR, "content")
+LOGS_DIR = os.path.join(BASE_DIR, "logs")
+WEBSITE_DIR = os.path.join(BASE_DIR, "docs")
+ARTICLES_DIR = os.path.join(WEBSITE_DIR, "articles")
+CHANGED_FILES_PATH = os.path.join(LOGS_DIR, "changed_files.txt")
+ASSET_REPORT_PATH = os.path.join(LOGS_DIR, "asset_report.jsonl")
+STATUS_PATH = os.path.join(LOGS_DIR, "content_creator.status.json")
+GENERATION_CACHE_DIR = os.path.join(CONTENT_DIR, "generation_cache")
+TOPICS_PATH = os.path.join(BASE_DIR, "plans", "content_strategy.md")
+DEFAULT_TOPIC = "Artificial Intelligence"
+# Absolute URL of the published docs/ folder, used by the sitemap and feed.
+SITE_URL = os.environ.get("AI_SITE_URL", "https://magnicahustle.github.io/ai-content-website/")
+# Article file names keep at most this much of the title.
+KEY_SLUG_LENGTH = 80
+
+_KEY_RE = re.compile(r"[^a-z0-9]+")
+
+
+def render_article(raw_article_content, publish_date, article_template, page_context):
+    """Renders raw generator output into a full article page; returns (title, html)."""
+    # Extract the title and render the body in a single pass
+    article_title, html_article_body = render_article_body(raw_article_content)
+    if not article_title:
+        article_title = f"AI Generated Article {publish_date.strftime('%Y%m%d_%H%M%S')}"
+
+    # Populate the template
+    html_content = article_template.render(
+        **page_context,
+        page_title=article_title,
+        root="../",
+        article_title=article_title,
+        publish_date=publish_date.strftime("%B %d, %Y"),
+        article_body=html_article_body,
+    )
+
+    return article_title, html_content
+
+
+_worker_template = None
+_worker_context = None
+
+
+def _init_worker(article_template, page_context):
+    """Process pool initializer: keeps the template resident in each worker."""
+    global _worker_template, _worker_context
+    _worker_template = article_template
+    _worker_context = page_context
+
+
+def _render(raw_article_content, publish_date):
+    return render_article(raw_article_content, publish_date, _worker_template, _worker_context)
+
+
+def render_articles(raw_articles, workers, article_template, page_context, publish_date):
+    """Renders raw generator outputs, spread over a process pool when workers > 1; returns [(title, html)]."""
+    dates = [publish_date] * len(raw_articles)
+    if workers > 1 and len(raw_articles) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(article_template, page_context)) as pool:
+            return list(pool.map(_render, raw_articles, dates,
+                                 chunksize=max(1, len(raw_articles) // (workers * 4))))
+    _init_worker(article_template, page_context)
+    return [_render(raw, date) for raw, date in zip(raw_articles, dates)]
+
+
+def article_slug(title):
+    """The title reduced to lowercase ASCII letters, digits and dashes, safe in file names and URLs."""
+    ascii_title = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode("ascii")
+    return _KEY_RE.sub("-", ascii_title.lower()).strip("-")[:KEY_SLUG_LENGTH].rstrip("-") or "article"
+
+
+def generate_raw_articles(generator, cache, manifest, count):
+    """Picks count topics and generates their raw article texts concurrently.
+
+    Returns (raw texts, (topic, variant) picks). Topics rotate on the topic and
+    variant recorded for each published article, since generated titles rarely
+    repeat the topic verbatim.
+    """
+    topics = load_topics(TOPICS_PATH) or [DEFAULT_TOPIC]
+    records = sorted(manifest.articles.values(), key=lambda record: record["date"])
+    history = [(record["topic"], record.get("variant", 0)) for record in records if record.get("topic")]
+    picks = pick_topics(topics, history, count)
+    texts = generate_batch(generator, [article_prompt(topic, variant) for topic, variant in picks], cache)
+    return [ensure_title(text, topic) for text, (topic, _) in zip(texts, picks)], picks
+
+
+def write_log(log_lines):
+    logged_at = datetime.datetime.now()
+    log_path = os.path.join(LOGS_DIR, "content_creator.log")
+    with open(log_path, "a") as f:
+        f.write("".join(f"{logged_at}: {line}\n" for line in log_lines))
+    for line in log_lines:
+        telemetry.event("log", message=line)
+
+
+class ContentPipeline:
+    """Site state (manifest, compiled templates, article store) loaded once and reused across runs.
+
+    A one-shot cron run creates it for a single run(); the daemon keeps it
+    resident so each publish only pays for the actual rendering and writes.
+    """
+    def __init__(self, generator, cache=None, optimize_assets=True):
+        # Create directories if they don't exist
+        for directory in (CONTENT_DIR, LOGS_DIR, ARTICLES_DIR):
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+        self.generator = generator
+        self.cache = cache
+        self.optimize_assets = optimize_assets
+        self.builder = SiteBuilder(WEBSITE_DIR, CONTENT_DIR)
+        self.templates = TemplateLoader(WEBSITE_DIR)
+        self.store = ArticleStore(os.path.join(CONTENT_DIR, STORE_NAME))
+        if optimize_assets:
+            self.builder.minify_html = minify_html
+
+    def close(self):
+        self.store.close()
+
+    def run(self, count=1, workers=1, build=False):
+        """Generates count articles (or, with build, only rebuilds) and refreshes the site.
+
+        Returns the log lines describing the run.
+        """
+        builder, store = self.builder, self.store
+        builder.changed = []
+        with telemetry.span("assets"):
+            if self.optimize_assets:
+                builder.page_context["assets"] = fingerprint_assets(builder)
+            else:
+                builder.page_context["assets"] = dict(FINGERPRINTED_ASSETS)
+
+        # Compiled templates are cached and only recompiled when a file changed
+        with telemetry.span("templates"):
+            article_template = self.templates.get("article_template.html")
+            template_hash = builder.layout_hash(article_template)
+
+        def render(raw_article_content, publish_date):
+            return render_article(raw_article_content, publish_date, article_template, builder.page_context)
+
+        # A full derived-page build is needed on --build and whenever the store is new
+        full_build = build or len(store) == 0 or not store.tags()
+        if full_build:
+            with telemetry.span("manifest_sync"):
+                store.sync_manifest(builder, only_missing=False)
+
+        # Sources only need checking on an explicit build; a layout change is detected
+        # from a single stored hash so regular runs never touch old articles.
+        rerendered = 0
+        template_changed = builder.manifest.get_meta("template_hash") != template_hash
+        if build or template_changed:
+            with telemetry.span("rebuild"):
+                rerendered = builder.rebuild_articles(render, template_hash, check_sources=build)
+        if template_changed:
+            builder.manifest.set_meta("template_hash", template_hash)
+
+        if self.cache is not None:
+            self.cache.hits = self.cache.misses = 0
+        log_lines = []
+        search_prefixes, search_docs, new_tags = set(), [], set()
+        if build:
+            log_lines.append(f"Rebuilt site, re-rendered {rerendered} article(s)")
+        else:
+            # Generate content
+            now = datetime.datetime.now()
+            timestamp = now.strftime("%Y%m%d_%H%M%S")
+            with telemetry.span("generate", generator=self.generator.name):
+                raw_articles, picks = generate_raw_articles(self.generator, self.cache, builder.manifest, count)
+            with telemetry.span("render"):
+                rendered = render_articles(raw_articles, workers, article_template, builder.page_context, now)
+
+            # Save HTML articles; batch runs share a timestamp, so number them
+            with telemetry.span("publish"):
+                for seq, (raw_article_content, (article_title, html_content), pick) in enumerate(
+                        zip(raw_articles, rendered, picks)):
+                    article_key = f"{article_slug(article_title)}_{timestamp}"
+                    if count > 1:
+                        article_key += f"_{seq:03d}"
+                    article_path = builder.publish(article_key, raw_article_content, article_title, now,
+                                                   html_content, template_hash, topic=pick)
+                    tags = article_tags(raw_article_content, article_title)
+                    search_docs.append(store.upsert(article_key, article_title, raw_article_content,
+                                                    builder.manifest.articles[article_key]["output"],
+                                                    now.isoformat(timespec="seconds"), tags))
+                    new_tags.update(tags)
+                    search_prefixes |= term_prefixes(article_title, raw_article_content)
+                    log_lines.append(f"Generated HTML article '{article_title}' at '{article_path}'")
+            telemetry.count("articles_generated_total", len(rendered))
+
+        # Update index.html from the manifest, once for the whole run
+        with telemetry.span("index"):
+            index_updated = builder.build_index(self.templates.get("index_template.html"))
+
+        # Refresh archive/tag listings and search shards: everything on a full build,
+        # else only what the new articles touch. Unchanged pages are skipped either way.
+        archive_template = self.templates.get("archive_template.html")
+        with telemetry.span("archive"):
+            build_archive(builder, store, archive_template, None if full_build else new_tags)
+        with telemetry.span("search_index"):
+            if full_build:
+                write_search_index(store, builder)
+            else:
+                write_search_index(store, builder, search_prefixes, search_docs)
+        with telemetry.span("sitemap"):
+            build_sitemap(builder, store, SITE_URL)
+        with telemetry.span("feed"):
+            build_feed(builder, store, SITE_URL)
+
+        # Precompress everything this run wrote (the whole site on --build)
+        report = None
+        if self.optimize_assets:
+            with telemetry.span("optimize"):
+                report = optimize(builder, ASSET_REPORT_PATH, full=build)
+
+        with telemetry.span("finish"):
+            changed = builder.finish()
+            builder.write_changed_list(CHANGED_FILES_PATH)
+        telemetry.count("files_written_total", len(changed))
+        if telemetry.enabled():
+            telemetry.count("bytes_written_total", sum(os.path.getsize(path) for path in changed if os.path.exists(path)))
+
+        summary = f"{' and updated index.html' if index_updated else ''} ({len(changed)} file(s) written)"
+        if not log_lines:
+            log_lines.append("Nothing generated")
+        log_lines[-1] += summary
+        if self.cache is not None and not build:
+            telemetry.count("generation_cache_hits_total", self.cache.hits)
+            telemetry.count("generation_cache_misses_total", self.cache.misses)
+            telemetry.gauge("generation_cache_bytes", self.cache.size)
+            log_lines.append(f"Generation cache: {self.cache.hits} hit(s), {self.cache.misses} miss(es), "
+                             f"{self.cache.size // 1024}KB in {len(self.cache.entries)} entries")
+        if report:
+            log_lines.append(f"Precompressed {report['files']} file(s): {report['bytes']} -> "
+                             f"{report['gzip']} bytes gzipped in {report['seconds']}s")
+        return log_lines
+
+
+def make_pipeline(args):
+    if args.generator == "http":
+        generator = make_generator("http", endpoint=args.endpoint, model=args.model,
+                                   rate=args.rate, concurrency=args.concurrency)
+        cache = ResponseCache(GENERATION_CACHE_DIR, args.cache_mb * 1024 * 1024)
+    else:
+        # The sample backend is free, so there's nothing to cache.
+        generator, cache = make_generator(args.generator), None
+    return ContentPipeline(generator, cache, optimize_assets=not args.no_optimize)
+
+
+def git_publish(changed_list_path):
+    """Commits and pushes the files listed in changed_list_path; returns False if there was nothing to commit."""
+    import subprocess
+    if not os.path.exists(changed_list_path) or not os.path.getsize(changed_list_path):
+        return False
+    log_path = os.path.join(LOGS_DIR, "content_creator.log")
+    for command in (["git", "add", f"--pathspec-from-file={changed_list_path}", log_path],
+                    ["git", "commit", "-q", "-m", "feat: Add new article (automated)"],
+                    ["git", "push", "-q", "origin", "main"]):
+        with telemetry.span(f"git_{command[1]}"):
+            subprocess.run(command, cwd=BASE_DIR, check=True, capture_output=True)
+    return True
+
+
+def run_daemon(args):
+    """Keeps one ContentPipeline resident and publishes on the cron schedule in args.schedule."""
+    from scheduler import CronSchedule, Daemon
+
+    pipeline = make_pipeline(args)
+
+    def job(slot):
+        try:
+            with telemetry.span("run"):
+                log_lines = pipeline.run(count=args.count, workers=args.workers)
+            if args.git and git_publish(CHANGED_FILES_PATH):
+                log_lines.append("Committed and pushed changes")
+            write_log([f"[scheduled {slot:%Y-%m-%d %H:%M}] {line}" for line in log_lines])
+        finally:
+            telemetry.gauge("last_run_timestamp_seconds", datetime.datetime.now().timestamp())
+            telemetry.flush()
+
+    def report_error(slot, error):
+        write_log([f"[scheduled {slot:%Y-%m-%d %H:%M}] Run failed: {error!r}"])
+
+    daemon = Daemon(
+        CronSchedule(args.schedule),
+        job,
+        status_path=STATUS_PATH,
+        jitter_seconds=args.jitter,
+        max_catch_up=args.catch_up,
+        on_error=report_error,
+    )
+    write_log([f"Daemon started (pid {os.getpid()}), schedule '{args.schedule}', next run {daemon.next_run()}"])
+    try:
+        daemon.run_forever()
+    finally:
+        pipeline.close()
+        write_log(["Daemon stopped"])
+
 
 def main():
     """
-    Generates a piece of content and saves it to a file.
+    Generates content, publishes it and refreshes the site incrementally.
     """
-    content_dir = "/home/miki/AI/content"
-    logs_dir = "/home/miki/AI/logs"
-    website_dir = "/home/miki/AI/docs"
-    articles_dir = os.path.join(website_dir, "articles")
-    
-    # Create directories if they don't exist
-    if not os.path.exists(content_dir):
-        os.makedirs(content_dir)
-
-    if not os.path.exists(logs_dir):
-        os.makedirs(logs_dir)
-
-    if not os.path.exists(articles_dir):
-        os.makedirs(articles_dir)
-
-    # Read the article template
-    with open(os.path.join(website_dir, "article_template.html"), "r") as f:
-        article_template = f.read()
-
-    def generate_article_content():
-        import random
-        articles = [
-            {
-                "title": "The Ethics of Artificial Intelligence",
-                "content": """
-Introduction:
-As artificial intelligence becomes more sophisticated, it's crucial to consider the ethical implications of its use. This article delves into the moral questions surrounding AI, from algorithmic bias to the potential for autonomous decision-making.
-
-Body:
-One of the most pressing ethical concerns is algorithmic bias. AI systems learn from data, and if that data reflects existing societal biases, the AI will perpetuate and even amplify them. This can have serious consequences in areas like hiring, criminal justice, and loan applications.
-
-Another major ethical dilemma is the question of accountability. When an autonomous system makes a mistake, who is responsible? Is it the programmer, the owner of the system, or the AI itself? Establishing clear lines of responsibility is essential for building trust in AI.
-
-The development of autonomous weapons also raises profound ethical questions. The prospect of machines making life-or-death decisions without human intervention is a frightening one, and there is a growing movement to ban the development and use of such weapons.
-
-Conclusion:
-The ethical challenges of AI are complex and multifaceted. As we continue to develop and integrate AI into our society, it's essential to have a robust public discourse about these issues. By proactively addressing these challenges, we can ensure that AI is developed and used in a way that is beneficial to all of humanity.
-"""
-            },
-            {
-                "title": "AI in Healthcare: A Revolution in Medicine",
-                "content": """
-Introduction:
-Artificial intelligence is poised to revolutionize the healthcare industry, from diagnostics and treatment to drug discovery and personalized medicine. This article explores the many ways in which AI is transforming healthcare and improving patient outcomes.
-
-Body:
-AI-powered diagnostic tools can analyze medical images like X-rays and MRIs with a level of accuracy that often surpasses human radiologists. This can lead to earlier and more accurate diagnoses of diseases like cancer and Alzheimer's.
-
-In the realm of treatment, AI can help doctors create personalized treatment plans based on a patient's genetic makeup, lifestyle, and other factors. This can lead to more effective treatments with fewer side effects.
-
-AI is also accelerating the process of drug discovery. By analyzing vast datasets of biological and chemical information, AI can identify promising new drug candidates much faster than traditional methods.
-
-Conclusion:
-The potential of AI to improve healthcare is immense. From more accurate diagnoses to personalized treatments and faster drug discovery, AI is helping to create a future where healthcare is more effective, efficient, and accessible to all.
-"""
-            }
-        ]
-        
-        chosen_article = random.choice(articles)
-        return f"Title: {chosen_article['title']}\n\n{chosen_article['content']}"
-
-
-    # Generate content
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    raw_article_content = generate_article_content()
-    
-    # Extract title and body
-    title_match = re.search(r"Title: (.*)", raw_article_content)
-    article_title = title_match.group(1).strip() if title_match else f"AI Generated Article {timestamp}"
-    article_body = re.sub(r"Title: .*\n\n", "", raw_article_content, 1).strip()
-    
-    # Process article body for better HTML formatting
-    processed_body = []
-    sections = re.split(r"(Introduction:|Body:|Conclusion:)", article_body)
-    
-    # The split will result in an array like ['', 'Introduction:', '...', 'Body:', '...', 'Conclusion:', '...']
-    # We need to iterate through it and pair the section titles with their content
-    i = 0
-    while i < len(sections):
-        section_title = sections[i].strip()
-        if section_title in ["Introduction:", "Body:", "Conclusion:"]:
-            processed_body.append(f"<h3>{section_title}</h3>")
-            i += 1
-            if i < len(sections):
-                content = sections[i].strip()
-                paragraphs = content.split('\n\n')
-                for p in paragraphs:
-                    if p.strip():
-                        processed_body.append(f"<p>{p.strip()}</p>")
-        elif section_title: # Handle any leading text before the first section title
-            paragraphs = section_title.split('\n\n')
-            for p in paragraphs:
-                if p.strip():
-                    processed_body.append(f"<p>{p.strip()}</p>")
-        i += 1
-    
-    html_article_body = "\n".join(processed_body)
+    parser = argparse.ArgumentParser(description="Generate and publish AI articles.")
+    parser.add_argument("--build", action="store_true",
+                        help="Don't generate; re-render articles whose source or template changed and rebuild derived pages.")
+    parser.add_argument("--count", type=int, default=1, help="Number of articles to generate per run.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes used to render articles; generation runs concurrently on one event loop (see --concurrency).")
+    parser.add_argument("--no-optimize", action="store_true",
+                        help="Skip HTML/CSS minification, asset fingerprinting and precompression.")
+    parser.add_argument("--generator", choices=sorted(GENERATORS),
+                        default=os.environ.get("AI_GENERATOR", "http" if os.environ.get("AI_GENERATOR_URL") else "sample"),
+                        help="Text generation backend (default: http when AI_GENERATOR_URL is set, else sample).")
+    parser.add_argument("--endpoint", default=os.environ.get("AI_GENERATOR_URL"),
+                        help="Text generation endpoint for the http backend.")
+    parser.add_argument("--model", default=os.environ.get("AI_GENERATOR_MODEL"), help="Model name sent to the endpoint.")
+    parser.add_argument("--rate", type=float, default=1.0, help="Maximum generation requests per second.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum generation requests in flight.")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help="Size cap of the on-disk generation cache.")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Stay running and publish on --schedule instead of exiting after one run.")
+    parser.add_argument("--schedule", default="0 12 * * *", help="Cron expression for daemon runs (local time).")
+    parser.add_argument("--jitter", type=int, default=0, help="Random delay of up to this many seconds per daemon run.")
+    parser.add_argument("--catch-up", type=int, default=3,
+                        help="Maximum missed daemon slots to run on startup (older ones are only reported).")
+    parser.add_argument("--git", action="store_true", help="In daemon mode, commit and push after every run.")
+    parser.add_argument("--json-log", default=os.environ.get("AI_JSON_LOG"),
+                        help="Also write log lines and per-stage timings as JSON records to this file.")
+    parser.add_argument("--metrics-textfile", default=os.environ.get("AI_METRICS_TEXTFILE"),
+                        help="Write Prometheus metrics to this file after every run (node_exporter textfile collector).")
+    parser.add_argument("--metrics-port", type=int, default=0, help="Serve Prometheus metrics on this port.")
+    parser.add_argument("--profile", help="Profile the run into this file.")
+    parser.add_argument("--profile-mode", choices=("cprofile", "sample"), default="cprofile",
+                        help="cprofile: pstats of the main process; sample: stacks of all threads for a flame graph.")
+    args = parser.parse_args()
 
-    # Populate the template
-    formatted_date = datetime.datetime.now().strftime("%B %d, %Y")
-    html_content = article_template.replace("{{ article_title }}", article_title)
-    html_content = html_content.replace("{{ publish_date }}", formatted_date)
-    html_content = html_content.replace("{{ article_body }}", html_article_body)
-
-    # Save HTML article
-    article_filename = f"{article_title.replace(' ', '_').lower()}_{timestamp}.html"
-    article_path = os.path.join(articles_dir, article_filename)
-    with open(article_path, "w") as f:
-        f.write(html_content)
-
-    # Update index.html
-    index_path = os.path.join(website_dir, "index.html")
-    with open(index_path, "r") as f:
-        soup = BeautifulSoup(f.read(), 'html.parser')
-
-    article_list = soup.find(id="article-list")
-    if article_list:
-        new_li = soup.new_tag("li")
-        new_a = soup.new_tag("a", href=f"articles/{article_filename}")
-        new_a.string = article_title
-        new_li.append(new_a)
-        article_list.insert(0, new_li) # Add to the top of the list
-
-        # Limit the list to 10 articles
-        while len(article_list.find_all("li")) > 10:
-            article_list.find_all("li")[-1].decompose()
-
-    with open(index_path, "w") as f:
-        f.write(str(soup))
-
-    # Log action
-    log_path = os.path.join(logs_dir, "content_creator.log")
-    with open(log_path, "a") as f:
-        f.write(f"{datetime.datetime.now()}: Generated HTML article '{article_title}' at '{article_path}' and updated index.html\n")
+    telemetry.configure("content_creator", json_log=args.json_log, textfile=args.metrics_textfile,
+                        http_port=args.metrics_port)
+    try:
+        with telemetry.profile(args.profile, args.profile_mode):
+            if args.daemon:
+                run_daemon(args)
+                return
+
+            pipeline = make_pipeline(args)
+            try:
+                with telemetry.span("run", mode="build" if args.build else "generate"):
+                    log_lines = pipeline.run(count=args.count, workers=args.workers, build=args.build)
+            finally:
+                pipeline.close()
+
+        # Log action
+        write_log(log_lines)
+    finally:
+        telemetry.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,278 @@
+"""
+Derived listing pages, sitemap and feed, generated from the article store.
+
+    archive/index.html, archive/page-N.html        every article, paginated
+    tags/index.html, tags/<tag>/page-N.html        per-topic listings
+    sitemap.xml (+ sitemap-N.xml past 50k URLs)    for crawlers
+    feed.xml                                       RSS 2.0, newest articles
+
+Listings are numbered from the oldest article, so publishing only ever changes
+the last page (and the one before it when a new page starts). Each page is
+skipped when the signature of its inputs is unchanged, and the sitemap and feed
+are written through streaming outputs straight from the store cursor instead of
+being assembled in memory. Tag pages and sitemap parts that are no longer
+generated are deleted along with their manifest records.
+"""
+import re
+import html
+import json
+import math
+import datetime
+import itertools
+from collections import Counter
+
+from markup import parse_article
+from site_build import content_hash
+
+ARCHIVE_PAGE_SIZE = 50
+SITEMAP_URL_LIMIT = 50000
+FEED_ITEM_COUNT = 20
+SUMMARY_LENGTH = 280
+
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+_TAG_PAGE_RE = re.compile(r"^tags/[^/]+/page-\d+\.html$")
+_SITEMAP_PART_RE = re.compile(r"^sitemap-(\d+)\.xml$")
+
+
+def escape(text):
+    """XML text escaping (&, < and >), as xml.sax.saxutils.escape does, without importing the sax package."""
+    return html.escape(text, quote=False)
+
+
+def tag_slug(tag):
+    return _SLUG_RE.sub("-", tag.lower()).strip("-") or "untagged"
+
+
+def tag_slugs(tags):
+    """Returns {tag: directory slug}, unique per tag.
+
+    Tags whose plain slugs collide ("C++", "C#" and "C" are all "c", and so
+    are "AI" and "ai") get a short hash of the raw tag appended.
+    """
+    plain = {tag: tag_slug(tag) for tag in tags}
+    counts = Counter(plain.values())
+    return {tag: slug if counts[slug] == 1 else f"{slug}-{content_hash(tag)[:6]}" for tag, slug in plain.items()}
+
+
+def summarize(body):
+    """Returns the first paragraph of an article's text, trimmed to SUMMARY_LENGTH characters."""
+    _, lines = parse_article(body)
+    words = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            if words:
+                break
+            continue
+        if line.endswith(":") and not words:
+            continue
+        words.append(line)
+    text = " ".join(words)
+    return text if len(text) <= SUMMARY_LENGTH else text[:SUMMARY_LENGTH].rsplit(" ", 1)[0] + "..."
+
+
+def _signature(*parts):
+    return content_hash(json.dumps(parts, separators=(",", ":")))
+
+
+def page_count(total):
+    return max(1, math.ceil(total / ARCHIVE_PAGE_SIZE))
+
+
+def build_listing(builder, store, template, directory, heading, tag=None, latest_only=False):
+    """Builds directory/page-N.html for all articles (or one tag); returns the number of pages written."""
+    pages = page_count(store.count(tag))
+    root = "../" * (directory.count("/") + 1)
+    numbers = range(max(1, pages - 1), pages + 1) if latest_only else range(1, pages + 1)
+    written = 0
+    for number in numbers:
+        rows = list(store.iter_articles(tag=tag, offset=(number - 1) * ARCHIVE_PAGE_SIZE, limit=ARCHIVE_PAGE_SIZE))
+        rows.reverse()
+        rel_path = f"{directory}/page-{number}.html"
+        # Only whether a newer page exists goes into the page, not the page count:
+        # older pages are not re-rendered when a new page starts.
+        has_newer = number < pages
+        signature = _signature(builder.layout_hash(template), heading, number, has_newer,
+                               [(r[0], r[2], r[3], r[4]) for r in rows])
+        if builder.page_unchanged(rel_path, signature):
+            continue
+        builder.emit_page(rel_path, signature, builder.render_page(template,
+            page_title=f"{heading} - page {number}",
+            root=root,
+            heading=f"{heading} (page {number})",
+            articles=[{"url": root + url, "title": title, "date": published[:10]}
+                      for _, _, title, url, published in rows],
+            newer_url=f"page-{number + 1}.html" if has_newer else "",
+            older_url=f"page-{number - 1}.html" if number > 1 else "",
+        ))
+        written += 1
+    return written
+
+
+def build_archive(builder, store, template, tags=None):
+    """Builds the archive and tag listings.
+
+    With tags=None every page is considered; otherwise only the newest archive
+    pages and the newest pages of the given tags. Returns the number of pages written.
+    """
+    incremental = tags is not None
+    written = build_listing(builder, store, template, "archive", "All articles", latest_only=incremental)
+    all_tags = store.tags()
+    slugs = tag_slugs(tag for tag, _ in all_tags)
+    for tag, _ in all_tags:
+        directory = f"tags/{slugs[tag]}"
+        # A tag whose slug just changed (a colliding tag appeared) needs all its pages.
+        moved = f"{directory}/page-1.html" not in builder.manifest.pages
+        if incremental and tag not in tags and not moved:
+            continue
+        written += build_listing(builder, store, template, directory, tag, tag=tag,
+                                 latest_only=incremental and not moved)
+
+    pages = page_count(len(store))
+    signature = _signature(builder.layout_hash(template), pages)
+    if not builder.page_unchanged("archive/index.html", signature):
+        links = [{"url": "../tags/index.html", "label": "Browse by topic"}]
+        links += [{"url": f"page-{n}.html", "label": f"Page {n}"} for n in range(pages, 0, -1)]
+        builder.emit_page("archive/index.html", signature, builder.render_page(template,
+            page_title="Archive", root="../", heading="Archive", links=links))
+        written += 1
+
+    # Pages of a tag whose slug changed (or that has fewer pages now) are no longer linked.
+    current = {f"tags/{slugs[tag]}/page-{number}.html"
+               for tag, count in all_tags for number in range(1, page_count(count) + 1)}
+    builder.remove_pages([rel_path for rel_path in builder.manifest.pages
+                          if _TAG_PAGE_RE.match(rel_path) and rel_path not in current])
+
+    signature = _signature(builder.layout_hash(template), all_tags)
+    if not builder.page_unchanged("tags/index.html", signature):
+        links = [{"url": f"{slugs[tag]}/page-{page_count(count)}.html", "label": f"{tag} ({count})"}
+                 for tag, count in all_tags]
+        builder.emit_page("tags/index.html", signature, builder.render_page(template,
+            page_title="Topics", root="../", heading="Topics", links=links))
+        written += 1
+    return written
+
+
+def _page_urls(store):
+    """Yields (path, lastmod) for the site's listing pages."""
+    yield "index.html", None
+    yield "archive/index.html", None
+    for number in range(1, page_count(len(store)) + 1):
+        yield f"archive/page-{number}.html", None
+    yield "tags/index.html", None
+    all_tags = store.tags()
+    slugs = tag_slugs(tag for tag, _ in all_tags)
+    for tag, count in all_tags:
+        for number in range(1, page_count(count) + 1):
+            yield f"tags/{slugs[tag]}/page-{number}.html", None
+
+
+def _article_urls(store, offset=0, limit=-1):
+    for _, _, _, url, published in store.iter_articles(offset=offset, limit=limit):
+        yield url, published[:10]
+
+
+def _write_urlset(stream, site_url, urls):
+    stream.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                 '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    for path, lastmod in urls:
+        stream.write(f"<url><loc>{escape(site_url + path)}</loc>")
+        if lastmod:
+            stream.write(f"<lastmod>{lastmod}</lastmod>")
+        stream.write("</url>\n")
+    stream.write("</urlset>\n")
+
+
+def _chunk_signature(store, offset, limit):
+    """Cheap fingerprint of one slice of the article list, computed inside SQLite."""
+    return store.db.execute(
+        "SELECT count(*), total(id), max(published) FROM "
+        "(SELECT id, published FROM articles ORDER BY published, id LIMIT ? OFFSET ?)",
+        (limit, offset)).fetchone()
+
+
+def _remove_sitemap_parts(builder, first):
+    """Deletes sitemap-N.xml files numbered first or higher, left from a larger sitemap."""
+    stale = []
+    for rel_path in builder.manifest.pages:
+        match = _SITEMAP_PART_RE.match(rel_path)
+        if match and int(match.group(1)) >= first:
+            stale.append(rel_path)
+    builder.remove_pages(stale)
+
+
+def build_sitemap(builder, store, site_url):
+    """Writes sitemap.xml, switching to a sitemap index plus sitemap-N.xml files past SITEMAP_URL_LIMIT URLs.
+
+    Returns the number of sitemap files written.
+    """
+    page_urls = list(_page_urls(store))
+    article_total = len(store)
+    pages_signature = _signature(site_url, page_urls)
+    written = 0
+
+    if len(page_urls) + article_total <= SITEMAP_URL_LIMIT:
+        _remove_sitemap_parts(builder, 0)
+        signature = _signature(pages_signature, _chunk_signature(store, 0, -1))
+        if builder.page_unchanged("sitemap.xml", signature):
+            return 0
+        with builder.open_stream("sitemap.xml", signature) as stream:
+            _write_urlset(stream, site_url, itertools.chain(page_urls, _article_urls(store)))
+        return 1
+
+    parts = math.ceil(article_total / SITEMAP_URL_LIMIT)
+    _remove_sitemap_parts(builder, parts + 1)
+    files = []
+    if not builder.page_unchanged("sitemap-0.xml", pages_signature):
+        with builder.open_stream("sitemap-0.xml", pages_signature) as stream:
+            _write_urlset(stream, site_url, page_urls)
+        written += 1
+    files.append("sitemap-0.xml")
+    for number in range(1, parts + 1):
+        offset = (number - 1) * SITEMAP_URL_LIMIT
+        rel_path = f"sitemap-{number}.xml"
+        files.append(rel_path)
+        signature = _signature(site_url, _chunk_signature(store, offset, SITEMAP_URL_LIMIT))
+        if builder.page_unchanged(rel_path, signature):
+            continue
+        with builder.open_stream(rel_path, signature) as stream:
+            _write_urlset(stream, site_url, _article_urls(store, offset, SITEMAP_URL_LIMIT))
+        written += 1
+
+    signature = _signature(files)
+    if not builder.page_unchanged("sitemap.xml", signature):
+        index = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+                 '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+        index += [f"<sitemap><loc>{escape(site_url + name)}</loc></sitemap>\n" for name in files]
+        index.append("</sitemapindex>\n")
+        builder.emit_page("sitemap.xml", signature, "".join(index))
+        written += 1
+    return written
+
+
+def _rfc822(published):
+    # Imported here: email.utils pulls in most of the email package, which only the feed needs.
+    from email.utils import format_datetime
+    return format_datetime(datetime.datetime.fromisoformat(published).astimezone())
+
+
+def build_feed(builder, store, site_url, title="AI Generated Content"):
+    """Writes feed.xml (RSS 2.0) with the newest FEED_ITEM_COUNT articles; returns True if it changed."""
+    latest = [row[:5] for row in store.iter_articles(newest_first=True, limit=FEED_ITEM_COUNT)]
+    signature = _signature(site_url, title, latest)
+    if builder.page_unchanged("feed.xml", signature):
+        return False
+    with builder.open_stream("feed.xml", signature) as stream:
+        stream.write('<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0">\n<channel>\n')
+        stream.write(f"<title>{escape(title)}</title>\n<link>{escape(site_url)}</link>\n"
+                     f"<description>{escape(title)}</description>\n")
+        if latest:
+            stream.write(f"<lastBuildDate>{_rfc822(latest[0][4])}</lastBuildDate>\n")
+        for _, _, item_title, url, published, body in store.iter_articles(
+                newest_first=True, limit=FEED_ITEM_COUNT, with_body=True):
+            link = escape(site_url + url)
+            stream.write(f"<item><title>{escape(item_title)}</title><link>{link}</link>"
+                         f"<guid isPermaLink=\"true\">{link}</guid><pubDate>{_rfc822(published)}</pubDate>"
+                         f"<description>{escape(summarize(body))}</description></item>\n")
+        stream.write("</channel>\n</rss>\n")
+    return True
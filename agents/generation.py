@@ -0,0 +1,388 @@
+"""
+Article text generation backends.
+
+    SampleGenerator     offline backend returning built-in sample articles (the
+                        previous hard-coded behaviour), for development and
+                        when no endpoint is configured
+    HttpGenerator       POSTs prompts to an HTTP text-generation endpoint
+                        (plain {"text"}, completion {"choices": [{"text"}]},
+                        chat {"choices": [{"message": {"content"}}]} and
+                        {"response"} replies are understood)
+
+generate_batch() runs many prompts concurrently on an asyncio loop; blocking
+HTTP calls go through asyncio.to_thread. asyncio and urllib are only imported
+once something is generated, so CLI runs that never generate (--build, --help,
+the daemon between runs) don't pay for them. Requests are paced by a token bucket,
+retried with exponential backoff on timeouts, 429s and 5xx replies, and every
+response is stored in an on-disk cache keyed by a hash of the backend, its
+settings and the prompt, so re-runs and backfills never request the same prompt
+twice. The cache is capped in bytes and evicts least recently used entries.
+"""
+import os
+import re
+import json
+import time
+import random
+import hashlib
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+RETRYABLE_STATUS = (408, 425, 429, 500, 502, 503, 504)
+
+PROMPT_TEMPLATE = """Write an original blog article titled "{topic}" for readers interested in AI, automation and programming.
+Use this exact plain-text format:
+Title: {topic}
+Tags: two or three short comma-separated topics
+
+Introduction:
+one paragraph
+
+Body:
+several paragraphs (lists with "- " and `inline code` are allowed)
+
+Conclusion:
+one paragraph
+"""
+
+_TOPIC_RE = re.compile(r'^\s*(?:[-*]|\d+\.)\s+"?(.+?)"?\s*$')
+
+
+class GenerationError(RuntimeError):
+    pass
+
+
+def load_topics(path):
+    """Reads the article topics listed under the "Topics" headings of a strategy markdown file."""
+    topics = []
+    in_topics = False
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                if line.startswith("#"):
+                    in_topics = "topic" in line.lower()
+                    continue
+                match = _TOPIC_RE.match(line) if in_topics else None
+                if match:
+                    topics.append(match.group(1))
+    except FileNotFoundError:
+        pass
+    return topics
+
+
+def pick_topics(topics, history, count):
+    """Returns count (topic, variant) pairs, preferring topics never used, then the least recently used.
+
+    history holds the (topic, variant) pairs of earlier articles, oldest first.
+    A repeated topic gets the next unused variant, so it gets a new prompt (and
+    cache key) while re-running the same backfill reuses the cached replies.
+    """
+    last_used = {}
+    next_variant = {}
+    for index, (topic, variant) in enumerate(history):
+        last_used[topic] = index
+        next_variant[topic] = max(next_variant.get(topic, 0), variant + 1)
+    ranked = sorted(topics, key=lambda topic: last_used.get(topic, -1))
+    if not ranked:
+        return []
+    return [(ranked[i % len(ranked)], next_variant.get(ranked[i % len(ranked)], 0) + i // len(ranked))
+            for i in range(count)]
+
+
+def article_prompt(topic, variant=0):
+    prompt = PROMPT_TEMPLATE.format(topic=topic)
+    if variant:
+        prompt += f"\nEarlier articles already covered this title; take a fresh angle (take #{variant + 1}).\n"
+    return prompt
+
+
+def ensure_title(text, topic):
+    """Prefixes a Title: line when the backend's reply doesn't start with one."""
+    text = text.strip()
+    if not text.startswith("Title:"):
+        text = f"Title: {topic}\n\n{text}"
+    return text + "\n"
+
+
+class TokenBucket:
+    """Async token bucket: rate tokens per second, bursts of up to capacity."""
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = None
+
+    async def acquire(self, tokens=1):
+        import asyncio
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class ResponseCache:
+    """Generated texts on disk, one file per prompt hash, evicted least recently used past max_bytes.
+
+    Last use is tracked through file mtimes, so the order survives restarts.
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.entries = {}
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.endswith(".txt"):
+                    stat = entry.stat()
+                    self.entries[entry.name[:-4]] = [stat.st_size, stat.st_mtime]
+        self.size = sum(size for size, _ in self.entries.values())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def get(self, key):
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        try:
+            with open(self._path(key), "r") as f:
+                text = f.read()
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            self.size -= self.entries.pop(key)[0]
+            self.misses += 1
+            return None
+        self.entries[key][1] = time.time()
+        self.hits += 1
+        return text
+
+    def put(self, key, text):
+        path = self._path(key)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+        if key in self.entries:
+            self.size -= self.entries[key][0]
+        self.entries[key] = [size, time.time()]
+        self.size += size
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        for key, (size, _) in sorted(self.entries.items(), key=lambda item: item[1][1]):
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            del self.entries[key]
+            self.size -= size
+
+
+class Generator:
+    """Backend interface: generate(prompt, limiter) returns the article text for one prompt.
+
+    A backend that makes requests awaits limiter.acquire() (when given) before each
+    one, retries included, so generate_batch's rate holds while it retries.
+    """
+    name = "base"
+    # Concurrent requests and requests per second generate_batch allows this backend.
+    concurrency = 1
+    rate = None
+
+    def settings(self):
+        """Everything besides the prompt that changes the output; part of the cache key."""
+        return {}
+
+    def cache_key(self, prompt):
+        data = json.dumps([self.name, self.settings(), prompt], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    async def generate(self, prompt, limiter=None):
+        raise NotImplementedError
+
+
+class SampleGenerator(Generator):
+    """Returns one of the built-in sample articles, picked by prompt."""
+    name = "sample"
+    concurrency = 8
+
+    ARTICLES = [
+        {
+            "title": "The Ethics of Artificial Intelligence",
+            "content": """
+Introduction:
+As artificial intelligence becomes more sophisticated, it's crucial to consider the ethical implications of its use. This article delves into the moral questions surrounding AI, from algorithmic bias to the potential for autonomous decision-making.
+
+Body:
+One of the most pressing ethical concerns is algorithmic bias. AI systems learn from data, and if that data reflects existing societal biases, the AI will perpetuate and even amplify them. This can have serious consequences in areas like hiring, criminal justice, and loan applications.
+
+Another major ethical dilemma is the question of accountability. When an autonomous system makes a mistake, who is responsible? Is it the programmer, the owner of the system, or the AI itself? Establishing clear lines of responsibility is essential for building trust in AI.
+
+The development of autonomous weapons also raises profound ethical questions. The prospect of machines making life-or-death decisions without human intervention is a frightening one, and there is a growing movement to ban the development and use of such weapons.
+
+Conclusion:
+The ethical challenges of AI are complex and multifaceted. As we continue to develop and integrate AI into our society, it's essential to have a robust public discourse about these issues. By proactively addressing these challenges, we can ensure that AI is developed and used in a way that is beneficial to all of humanity.
+"""
+        },
+        {
+            "title": "AI in Healthcare: A Revolution in Medicine",
+            "content": """
+Introduction:
+Artificial intelligence is poised to revolutionize the healthcare industry, from diagnostics and treatment to drug discovery and personalized medicine. This article explores the many ways in which AI is transforming healthcare and improving patient outcomes.
+
+Body:
+AI-powered diagnostic tools can analyze medical images like X-rays and MRIs with a level of accuracy that often surpasses human radiologists. This can lead to earlier and more accurate diagnoses of diseases like cancer and Alzheimer's.
+
+In the realm of treatment, AI can help doctors create personalized treatment plans based on a patient's genetic makeup, lifestyle, and other factors. This can lead to more effective treatments with fewer side effects.
+
+AI is also accelerating the process of drug discovery. By analyzing vast datasets of biological and chemical information, AI can identify promising new drug candidates much faster than traditional methods.
+
+Conclusion:
+The potential of AI to improve healthcare is immense. From more accurate diagnoses to personalized treatments and faster drug discovery, AI is helping to create a future where healthcare is more effective, efficient, and accessible to all.
+"""
+        }
+    ]
+
+    def __init__(self, **_):
+        pass
+
+    async def generate(self, prompt, limiter=None):
+        if limiter:
+            await limiter.acquire()
+        article = self.ARTICLES[int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16) % len(self.ARTICLES)]
+        return f"Title: {article['title']}\n\n{article['content']}"
+
+
+def _reply_text(data):
+    if isinstance(data.get("text"), str):
+        return data["text"]
+    if isinstance(data.get("response"), str):
+        return data["response"]
+    choice = (data.get("choices") or [{}])[0]
+    text = choice.get("text") or (choice.get("message") or {}).get("content")
+    if not isinstance(text, str):
+        raise GenerationError(f"unrecognised reply: {json.dumps(data)[:200]}")
+    return text
+
+
+class HttpGenerator(Generator):
+    """Text generation over HTTP, with retries and backoff.
+
+    The request body is {"prompt", "max_tokens", "temperature"} plus "model"
+    when set; api_key (default: $AI_GENERATOR_KEY) is sent as a bearer token.
+    """
+    name = "http"
+
+    def __init__(self, endpoint, model=None, api_key=None, max_tokens=1200, temperature=0.8,
+                 timeout=120, retries=4, backoff=1.0, max_backoff=60.0, rate=1.0, concurrency=4):
+        if not endpoint:
+            raise GenerationError("the http generator needs an endpoint URL")
+        self.endpoint = endpoint
+        self.model = model
+        self.api_key = api_key if api_key is not None else os.environ.get("AI_GENERATOR_KEY")
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate = rate
+        self.concurrency = concurrency
+
+    def settings(self):
+        return {"endpoint": self.endpoint, "model": self.model,
+                "max_tokens": self.max_tokens, "temperature": self.temperature}
+
+    def _post(self, prompt):
+        import urllib.request
+        body = {"prompt": prompt, "max_tokens": self.max_tokens, "temperature": self.temperature}
+        if self.model:
+            body["model"] = self.model
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(self.endpoint, data=json.dumps(body).encode("utf-8"), headers=headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return _reply_text(json.load(response))
+
+    def _delay(self, attempt, error):
+        retry_after = getattr(error, "headers", None) and error.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        # Full jitter keeps concurrent retries from hitting the endpoint in lockstep.
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def generate(self, prompt, limiter=None):
+        import asyncio
+        import urllib.error
+        for attempt in range(self.retries + 1):
+            if limiter:
+                await limiter.acquire()
+            try:
+                return await asyncio.to_thread(self._post, prompt)
+            except urllib.error.HTTPError as error:
+                if error.code not in RETRYABLE_STATUS or attempt == self.retries:
+                    raise GenerationError(f"{self.endpoint} returned HTTP {error.code}") from error
+                delay = self._delay(attempt, error)
+            except (urllib.error.URLError, TimeoutError, ConnectionError) as error:
+                if attempt == self.retries:
+                    raise GenerationError(f"{self.endpoint} unreachable: {error}") from error
+                delay = self._delay(attempt, error)
+            await asyncio.sleep(delay)
+
+
+GENERATORS = {"sample": SampleGenerator, "http": HttpGenerator}
+
+
+def make_generator(name, **options):
+    try:
+        return GENERATORS[name](**options)
+    except KeyError:
+        raise GenerationError(f"unknown generator {name!r} (choose from {', '.join(GENERATORS)})") from None
+
+
+async def generate_all(generator, prompts, cache=None):
+    """Generates every prompt concurrently; returns the texts in prompt order.
+
+    Identical prompts in one batch are requested once.
+    """
+    import asyncio
+    limiter = TokenBucket(generator.rate) if generator.rate else None
+    slots = asyncio.Semaphore(generator.concurrency)
+    pending = {}
+
+    async def one(prompt):
+        key = generator.cache_key(prompt)
+        if cache is not None:
+            text = cache.get(key)
+            if text is not None:
+                return text
+        async with slots:
+            text = await generator.generate(prompt, limiter)
+        if cache is not None:
+            cache.put(key, text)
+        return text
+
+    for prompt in prompts:
+        if prompt not in pending:
+            pending[prompt] = asyncio.ensure_future(one(prompt))
+    return await asyncio.gather(*(pending[prompt] for prompt in prompts))
+
+
+def generate_batch(generator, prompts, cache=None):
+    """Synchronous entry point for generate_all."""
+    import asyncio
+    return asyncio.run(generate_all(generator, prompts, cache))
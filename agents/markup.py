@@ -0,0 +1,334 @@
+"""
+Single-pass renderer from raw generator output to article HTML.
+
+The raw text is walked line by line exactly once; block state (paragraph, list,
+code fence) is kept in a small state machine and HTML fragments are yielded as
+soon as each block closes, so rendering time is linear in the input and memory
+is bounded by the largest single block.
+
+Recognised markup:
+    Title: ... / Tags: a, b leading header lines
+    Introduction:           a short line ending in a colon is a section heading,
+                            unless a list or code block follows it
+    # / ## / ### Heading    explicit headings
+    - item / * item / 1. item
+    ``` ... ```             code block
+    **strong**, *em*, `code`, [text](url) inline
+All text is HTML-escaped.
+"""
+import re
+import html
+
+_SECTION_RE = re.compile(r"^([A-Z][\w ,'&/()-]{0,60}):$")
+_HEADING_RE = re.compile(r"^(#{1,4})\s+(.*?)\s*#*$")
+_BULLET_RE = re.compile(r"^[-*+]\s+(.*)$")
+_ORDERED_RE = re.compile(r"^\d{1,9}[.)]\s+(.*)$")
+
+# Inline markup is found by jumping between marker characters and looking up the
+# closer of the construct that starts with that character. Closers are searched
+# with _Finder, so an opener without a closer costs one scan per line, not one
+# scan per opener.
+_MARKER_RE = re.compile(r"[`\[*_]")
+_CLOSER_RES = {
+    "`": re.compile(r"`"),
+    "]": re.compile(r"\]"),
+    "url": re.compile(r"[)\s]"),
+    "**": re.compile(r"\*\*"),
+    "*": re.compile(r"(?<=[^\s*])\*"),
+    "__": re.compile(r"__(?!\w)"),
+    "_": re.compile(r"(?<=[^\s_])_(?!\w)"),
+    "\n": re.compile(r"\n"),
+}
+_SAFE_URL_RE = re.compile(r"^(https?://|mailto:|/|\.{0,2}/|#)|^[\w.-]+(/|$)", re.I)
+
+# Section headings render one level below the article's <h2> title.
+_HEADING_BASE = 3
+
+
+def iter_lines(text):
+    """Yields the lines of text without their line endings, without splitting the whole string up front."""
+    start = 0
+    length = len(text)
+    while start < length:
+        end = text.find("\n", start)
+        if end == -1:
+            end = length
+        yield text[start:end].rstrip("\r")
+        start = end + 1
+
+
+class _Finder:
+    """Position of the first match of a pattern at or after pos (len(text) if none).
+
+    The last answer is kept: render_inline only asks about positions that move
+    forward, so all its lookups together scan the text about once.
+    """
+    __slots__ = ("pattern", "text", "start", "found")
+
+    def __init__(self, pattern, text):
+        self.pattern = pattern
+        self.text = text
+        self.start = -1
+        self.found = -1
+
+    def __call__(self, pos):
+        if not self.start <= pos <= self.found:
+            match = self.pattern.search(self.text, pos)
+            self.start = pos
+            self.found = match.start() if match else len(self.text)
+        return self.found
+
+
+def _match_inline(text, pos, find):
+    """Returns (kind, content, url, end) for the inline construct opening at pos, or None.
+
+    The closer is the first possible one (for *em*, the first that leaves at
+    least two characters inside, if there is one); strong and em do not cross a
+    line break.
+    """
+    char = text[pos]
+    length = len(text)
+    if char == "`":
+        close = find("`", pos + 1)
+        if close == pos + 1 or close == length:
+            return None
+        return "code", text[pos + 1:close], None, close + 1
+    if char == "[":
+        close = find("]", pos + 1)
+        if close == pos + 1 or close + 1 >= length or text[close + 1] != "(":
+            return None
+        url_end = find("url", close + 2)
+        if url_end == close + 2 or url_end == length or text[url_end] != ")":
+            return None
+        return "link", text[pos + 1:close], text[close + 2:url_end], url_end + 1
+    if pos + 1 == length:
+        return None
+    if text[pos + 1] == char:
+        close = find(char * 2, pos + 3)
+        if close == length or find("\n", pos + 1) < close:
+            return None
+        return "strong", text[pos + 2:close], None, close + 2
+    if text[pos + 1].isspace():
+        return None
+    # A closer after two or more characters wins over one right after the first (*a**b* is one <em>).
+    close = find(char, pos + 3)
+    if close == length or find("\n", pos + 1) < close:
+        if not _CLOSER_RES[char].match(text, pos + 2):
+            return None
+        close = pos + 2
+    return "em", text[pos + 1:close], None, close + 1
+
+
+def _inline_token(kind, content, url):
+    if kind == "code":
+        return f"<code>{html.escape(content)}</code>"
+    if kind == "link":
+        if not _SAFE_URL_RE.match(url):
+            return None
+        return f'<a href="{html.escape(url)}">{render_inline(content)}</a>'
+    tag = "strong" if kind == "strong" else "em"
+    return f"<{tag}>{render_inline(content)}</{tag}>"
+
+
+def render_inline(text):
+    """Escapes a run of text and applies inline code, link, strong and emphasis markup."""
+    marker = _MARKER_RE.search(text)
+    if marker is None:
+        return html.escape(text, quote=False)
+    finders = {}
+
+    def find(key, pos):
+        finder = finders.get(key)
+        if finder is None:
+            finder = finders[key] = _Finder(_CLOSER_RES[key], text)
+        return finder(pos)
+
+    pieces = []
+    last = 0
+    while marker:
+        pos = marker.start()
+        char = text[pos]
+        found = None
+        # Underscores inside words (snake_case) are literal.
+        if char != "_" or pos == 0 or not (text[pos - 1].isalnum() or text[pos - 1] == "_"):
+            found = _match_inline(text, pos, find)
+        token = _inline_token(*found[:3]) if found else None
+        if token is None:
+            marker = _MARKER_RE.search(text, pos + 1)
+            continue
+        pieces.append(html.escape(text[last:pos], quote=False))
+        pieces.append(token)
+        last = found[3]
+        marker = _MARKER_RE.search(text, last)
+    pieces.append(html.escape(text[last:], quote=False))
+    return "".join(pieces)
+
+
+def render_blocks(lines):
+    """Yields HTML fragments, one per block, for an iterable of body lines."""
+    paragraph = []
+    list_tag = None
+    list_item = []
+    code = None
+
+    def close_paragraph():
+        if paragraph:
+            text = "\n".join(paragraph)
+            paragraph.clear()
+            return f"<p>{render_inline(text)}</p>"
+        return None
+
+    def close_item():
+        if list_item:
+            text = "\n".join(list_item)
+            list_item.clear()
+            return f"<li>{render_inline(text)}</li>"
+        return None
+
+    def close_list():
+        nonlocal list_tag
+        if list_tag:
+            item = close_item()
+            tag, list_tag = list_tag, None
+            return f"{item or ''}</{tag}>"
+        return None
+
+    def add_text(line, stripped):
+        """Adds a plain text line to the current list item or paragraph; returns the closed list, if any."""
+        if list_tag and line[:1].isspace() and list_item:
+            list_item.append(stripped)
+            return None
+        fragment = close_list()
+        paragraph.append(stripped)
+        return fragment
+
+    def settle_section(as_heading):
+        """Emits the pending "Heading:" line as a section heading or as plain text."""
+        nonlocal section
+        line, title = section
+        section = None
+        if as_heading:
+            fragments = (close_paragraph(), close_list(), f"<h{_HEADING_BASE}>{render_inline(title)}</h{_HEADING_BASE}>")
+        else:
+            fragments = (add_text(line, line.strip()),)
+        for fragment in fragments:
+            if fragment:
+                yield fragment
+
+    # A short line ending in a colon waits here for the next line: it is a
+    # section heading when a blank line or text follows, but a lead-in sentence
+    # ("Here are the key points:") when a list or code block does.
+    section = None
+    for line in lines:
+        if code is not None:
+            if line.strip().startswith("```"):
+                yield f"<pre><code>{html.escape(chr(10).join(code))}</code></pre>"
+                code = None
+            else:
+                code.append(line)
+            continue
+
+        stripped = line.strip()
+        if section is not None:
+            yield from settle_section(not (stripped.startswith("```") or _BULLET_RE.match(stripped)
+                                           or _ORDERED_RE.match(stripped)))
+
+        if not stripped:
+            if paragraph:
+                yield close_paragraph()
+            # A blank line inside a list only ends the current item.
+            if list_tag and list_item:
+                yield close_item()
+            continue
+
+        if stripped.startswith("```"):
+            for fragment in (close_paragraph(), close_list()):
+                if fragment:
+                    yield fragment
+            code = []
+            continue
+
+        heading = _HEADING_RE.match(stripped)
+        if heading:
+            for fragment in (close_paragraph(), close_list()):
+                if fragment:
+                    yield fragment
+            level = min(_HEADING_BASE + len(heading.group(1)) - 1, 6)
+            yield f"<h{level}>{render_inline(heading.group(2))}</h{level}>"
+            continue
+        match = _SECTION_RE.match(stripped)
+        if match:
+            section = (line, match.group(1))
+            continue
+
+        bullet = _BULLET_RE.match(stripped)
+        ordered = None if bullet else _ORDERED_RE.match(stripped)
+        if bullet or ordered:
+            tag = "ul" if bullet else "ol"
+            fragment = close_paragraph()
+            if fragment:
+                yield fragment
+            if list_tag != tag:
+                fragment = close_list()
+                if fragment:
+                    yield fragment
+                list_tag = tag
+                yield f"<{tag}>"
+            else:
+                fragment = close_item()
+                if fragment:
+                    yield fragment
+            list_item.append((bullet or ordered).group(1))
+            continue
+
+        fragment = add_text(line, stripped)
+        if fragment:
+            yield fragment
+
+    if section is not None:
+        yield from settle_section(False)
+    if code is not None:
+        yield f"<pre><code>{html.escape(chr(10).join(code))}</code></pre>"
+    for fragment in (close_paragraph(), close_list()):
+        if fragment:
+            yield fragment
+
+
+def parse_article(raw_text):
+    """Splits raw generator output into (headers, iterator over the body lines).
+
+    Leading "Title:" and "Tags:" lines are headers; headers holds "title" (str)
+    and "tags" (list of str) when present.
+    """
+    headers = {}
+    lines = iter_lines(raw_text)
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            continue
+        name, _, value = stripped.partition(":")
+        if name in ("Title", "Tags") and name.lower() not in headers:
+            value = value.strip()
+            if name == "Title":
+                headers["title"] = value
+            else:
+                headers["tags"] = [tag.strip() for tag in value.split(",") if tag.strip()]
+            continue
+
+        def body(first=line, rest=lines):
+            yield first
+            yield from rest
+        return headers, body()
+    return headers, iter(())
+
+
+def article_tags(raw_text, title):
+    """Returns the article's tags: its Tags: header, or else the topic part of the title."""
+    headers, _ = parse_article(raw_text)
+    return headers.get("tags") or [title.split(":", 1)[0].strip()]
+
+
+def render_article_body(raw_text):
+    """Returns (title or None, body HTML) for raw generator output."""
+    headers, lines = parse_article(raw_text)
+    return headers.get("title") or None, "\n".join(render_blocks(lines))
@@ -0,0 +1,261 @@
+"""
+In-process scheduler for running the content pipeline as a long-lived daemon.
+
+    CronSchedule("0 12 * * *")   standard 5-field cron expressions (minute, hour,
+                                 day of month, month, day of week) with *, lists,
+                                 ranges and */steps, evaluated in local time
+    Daemon(schedule, job, ...)   runs job(slot) at every slot, with optional
+                                 random jitter, and catches up slots missed while
+                                 the process was down
+
+The daemon persists its state to a JSON status file after every transition, so
+the last run, the next run, failures and missed slots can be checked (or
+alerted on) without reading the logs. The file is also what lets a restarted
+daemon find the slots it missed.
+"""
+import os
+import json
+import random
+import signal
+import datetime
+import threading
+
+_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day of month", 1, 31),
+    ("month", 1, 12),
+    ("day of week", 0, 7),
+)
+_NAMES = {
+    "month": ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"],
+    "day of week": ["sun", "mon", "tue", "wed", "thu", "fri", "sat"],
+}
+_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+}
+# Far enough to cover "29 February on a Monday"-style expressions.
+_SEARCH_YEARS = 8
+
+
+def _parse_value(name, text, offset):
+    text = text.lower()
+    if name in _NAMES and text in _NAMES[name]:
+        return _NAMES[name].index(text) + offset
+    if not text.isdigit():
+        raise ValueError(f"invalid {name} value {text!r}")
+    return int(text)
+
+
+def _parse_field(name, text, low, high):
+    """Returns the set of values a cron field matches."""
+    offset = 1 if name == "month" else 0
+    values = set()
+    for part in text.split(","):
+        spec, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if step < 1:
+            raise ValueError(f"invalid step in {name} field {text!r}")
+        if spec == "*":
+            start, end = low, high
+        elif "-" in spec:
+            first, _, last = spec.partition("-")
+            start, end = _parse_value(name, first, offset), _parse_value(name, last, offset)
+        else:
+            start = _parse_value(name, spec, offset)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high:
+            raise ValueError(f"{name} field {text!r} out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    if name == "day of week" and 7 in values:
+        values.discard(7)
+        values.add(0)
+    return values
+
+
+class CronSchedule:
+    """A 5-field cron expression evaluated in local time."""
+    def __init__(self, expression):
+        self.expression = expression
+        fields = _ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields, got {expression!r}")
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_field(name, text, low, high) for (name, low, high), text in zip(_FIELDS, fields))
+        # As in cron, a restricted day of month and day of week match if either does.
+        self._days_any = fields[2] == "*" or fields[2].startswith("*/")
+        self._weekdays_any = fields[4] == "*" or fields[4].startswith("*/")
+
+    def _day_matches(self, day):
+        in_month = day.day in self.days
+        in_week = (day.weekday() + 1) % 7 in self.weekdays
+        if self._days_any or self._weekdays_any:
+            return in_month and in_week
+        return in_month or in_week
+
+    def next_after(self, moment):
+        """Returns the first slot strictly after moment (a naive local datetime)."""
+        start = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        day = start.date()
+        last_day = day + datetime.timedelta(days=366 * _SEARCH_YEARS)
+        hours, minutes = sorted(self.hours), sorted(self.minutes)
+        while day <= last_day:
+            if day.month not in self.months:
+                # Skip straight to the first of next month.
+                day = (day.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+                continue
+            if self._day_matches(day):
+                for hour in hours:
+                    for minute in minutes:
+                        slot = datetime.datetime.combine(day, datetime.time(hour, minute))
+                        if slot >= start:
+                            return slot
+            day += datetime.timedelta(days=1)
+        raise ValueError(f"cron expression {self.expression!r} never matches")
+
+    def slots_between(self, after, until):
+        """Yields every slot in (after, until]."""
+        slot = self.next_after(after)
+        while slot <= until:
+            yield slot
+            slot = self.next_after(slot)
+
+
+def write_status(path, status):
+    """Atomically replaces the JSON status file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(status, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(temp_path, path)
+
+
+def read_status(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _iso(moment):
+    return moment.isoformat(timespec="seconds") if moment else None
+
+
+class Daemon:
+    """Runs job(slot) on a CronSchedule until stopped.
+
+    On startup, slots missed since the last recorded slot are run once each,
+    oldest first, up to max_catch_up of the most recent ones; older ones are
+    counted as skipped in the status file. A job that raises is reported
+    through on_error(slot, error) and the daemon carries on with the next slot.
+    """
+    def __init__(self, schedule, job, status_path, jitter_seconds=0, max_catch_up=3, on_error=None):
+        self.schedule = schedule
+        self.job = job
+        self.status_path = status_path
+        self.jitter_seconds = jitter_seconds
+        self.max_catch_up = max_catch_up
+        self.on_error = on_error
+        self.stopping = threading.Event()
+        previous = read_status(status_path)
+        self.status = {
+            "pid": os.getpid(),
+            "schedule": schedule.expression,
+            "started": _iso(datetime.datetime.now()),
+            "state": "starting",
+            "last_slot": previous.get("last_slot"),
+            "last_run": previous.get("last_run"),
+            "last_success": previous.get("last_success"),
+            "last_error": previous.get("last_error"),
+            "last_duration": previous.get("last_duration"),
+            "next_run": None,
+            "runs": 0,
+            "failures": 0,
+            "missed_recovered": 0,
+            "missed_skipped": 0,
+        }
+
+    def next_run(self, now=None):
+        return self.schedule.next_after(now or datetime.datetime.now())
+
+    def stop(self, *_):
+        self.stopping.set()
+
+    def _save(self, **changes):
+        self.status.update(changes)
+        write_status(self.status_path, self.status)
+
+    def missed_slots(self, now=None):
+        """Returns (slots to catch up, number of older missed slots that are dropped)."""
+        if not self.status["last_slot"]:
+            return [], 0
+        last_slot = datetime.datetime.fromisoformat(self.status["last_slot"])
+        missed = list(self.schedule.slots_between(last_slot, now or datetime.datetime.now()))
+        keep = missed[-self.max_catch_up:] if self.max_catch_up > 0 else []
+        return keep, len(missed) - len(keep)
+
+    def run_slot(self, slot):
+        started = datetime.datetime.now()
+        self._save(state="running", last_run=_iso(started))
+        try:
+            self.job(slot)
+        except Exception as error:
+            self.status["failures"] += 1
+            self.status["last_error"] = f"{_iso(slot)}: {error!r}"
+            if self.on_error:
+                self.on_error(slot, error)
+        else:
+            self.status["last_success"] = _iso(datetime.datetime.now())
+        self.status["runs"] += 1
+        self._save(state="idle", last_slot=_iso(slot),
+                   last_duration=round((datetime.datetime.now() - started).total_seconds(), 3))
+
+    def run_forever(self):
+        """Runs until SIGTERM/SIGINT (or stop()); the job in progress is always allowed to finish."""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        started = datetime.datetime.now()
+        catch_up, skipped = self.missed_slots(started)
+        self.status["missed_skipped"] += skipped
+        for slot in catch_up:
+            if self.stopping.is_set():
+                break
+            self.status["missed_recovered"] += 1
+            self.run_slot(slot)
+
+        while not self.stopping.is_set():
+            now = datetime.datetime.now()
+            # Slots that passed while a run was still going are run straight away (only
+            # the latest of them: several back-to-back runs would publish duplicates).
+            last_slot = self.status["last_slot"]
+            after = max(datetime.datetime.fromisoformat(last_slot), started) if last_slot else started
+            overdue = list(self.schedule.slots_between(after, now))
+            if overdue:
+                self.status["missed_recovered"] += 1
+                self.status["missed_skipped"] += len(overdue) - 1
+                slot, due = overdue[-1], now
+            else:
+                slot = self.schedule.next_after(now)
+                jitter = random.uniform(0, self.jitter_seconds) if self.jitter_seconds else 0
+                due = slot + datetime.timedelta(seconds=jitter)
+            self._save(state="idle", next_run=_iso(due))
+            # Sleep in short steps so suspend/resume and clock changes are noticed quickly.
+            while not self.stopping.is_set():
+                remaining = (due - datetime.datetime.now()).total_seconds()
+                if remaining <= 0:
+                    break
+                self.stopping.wait(min(remaining, 60))
+            if self.stopping.is_set():
+                break
+            self.run_slot(slot)
+        self._save(state="stopped", next_run=None)
@@ -0,0 +1,397 @@
+"""
+Incremental site build for the AI content website.
+
+A persistent manifest records, for every article, the hash of its source text,
+the hash of the template it was rendered with, the hash of the written output
+and its title/date. Builds only re-render articles whose inputs changed, derived
+pages are rebuilt from the manifest instead of by parsing the published HTML,
+and outputs are never rewritten when their bytes are unchanged.
+"""
+import os
+import re
+import json
+import glob
+import html
+import hashlib
+import datetime
+
+MANIFEST_NAME = "manifest.jsonl"
+INDEX_ARTICLE_COUNT = 10
+
+_TITLE_RE = re.compile(r"<title>(.*?)</title>", re.S)
+_STAMP_RE = re.compile(r"_(\d{8}_\d{6})\.html$")
+
+
+def content_hash(data):
+    """Returns the hex SHA-256 digest of a bytes or str payload."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_if_changed(path, data):
+    """Writes data to path atomically, unless the file already holds exactly those bytes.
+
+    Returns True if the file was written.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+class StreamingOutput:
+    """Writable text stream for one output file.
+
+    Chunks go to a temporary file while being hashed; on close the target is only
+    replaced when the hash differs from the existing file's, so large generated
+    files are neither held in memory nor rewritten when unchanged.
+    """
+    def __init__(self, path, previous_hash=None, on_close=None):
+        self.path = path
+        self.previous_hash = previous_hash
+        self.on_close = on_close
+        self.changed = False
+        self.hash = None
+        self._digest = hashlib.sha256()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self._digest.update(data)
+        self._file.write(data)
+
+    def close(self):
+        self._file.close()
+        self.hash = self._digest.hexdigest()
+        if not os.path.exists(self.path) or self.previous_hash != self.hash:
+            os.replace(self._tmp_path, self.path)
+            self.changed = True
+        else:
+            os.remove(self._tmp_path)
+        if self.on_close:
+            self.on_close(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+
+class Manifest:
+    """Append-only JSON-lines journal of article, page and build records.
+
+    Each change appends one line, so a publish costs O(1) disk I/O no matter
+    how many articles exist. The journal is compacted once superseded lines
+    outnumber live records.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.articles = {}
+        self.pages = {}
+        self.meta = {}
+        self.assets = {}
+        self._pending = []
+        self._journal_lines = 0
+        self.exists = os.path.exists(path)
+        if self.exists:
+            self._load()
+
+    def _tables(self):
+        return {"article": self.articles, "page": self.pages, "meta": self.meta, "asset": self.assets}
+
+    def _load(self):
+        tables = self._tables()
+        with open(self.path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                table = tables[entry.pop("type")]
+                key = entry.pop("key")
+                if entry.get("deleted"):
+                    table.pop(key, None)
+                else:
+                    table[key] = entry
+                self._journal_lines += 1
+
+    def _put(self, kind, key, record):
+        self._tables()[kind][key] = record
+        self._pending.append({"type": kind, "key": key, **record})
+
+    def put_article(self, key, record):
+        self._put("article", key, record)
+
+    def put_page(self, key, record):
+        self._put("page", key, record)
+
+    def put_asset(self, key, record):
+        self._put("asset", key, record)
+
+    def set_meta(self, key, value):
+        self._put("meta", key, {"value": value})
+
+    def get_meta(self, key, default=None):
+        return self.meta.get(key, {}).get("value", default)
+
+    def _delete(self, kind, key):
+        self._tables()[kind].pop(key, None)
+        self._pending.append({"type": kind, "key": key, "deleted": True})
+
+    def delete_article(self, key):
+        self._delete("article", key)
+
+    def delete_page(self, key):
+        self._delete("page", key)
+
+    def delete_asset(self, key):
+        self._delete("asset", key)
+
+    def flush(self):
+        """Persists pending changes, compacting the journal when it has grown stale.
+
+        Returns True if the journal file was written.
+        """
+        if not self._pending:
+            return False
+        live = sum(len(table) for table in self._tables().values())
+        if self._journal_lines + len(self._pending) > 2 * live + 100:
+            self.compact()
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(e, separators=(",", ":")) + "\n" for e in self._pending))
+        self._journal_lines += len(self._pending)
+        self._pending = []
+        self.exists = True
+        return True
+
+    def compact(self):
+        """Rewrites the journal with one line per live record."""
+        lines = []
+        for kind, table in self._tables().items():
+            for key, record in table.items():
+                lines.append(json.dumps({"type": kind, "key": key, **record}, separators=(",", ":")) + "\n")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("".join(lines))
+        os.replace(tmp_path, self.path)
+        self._journal_lines = len(lines)
+        self._pending = []
+        self.exists = True
+
+
+class SiteBuilder:
+    """Renders articles and derived pages into the website directory using a Manifest."""
+    def __init__(self, website_dir, content_dir):
+        self.website_dir = website_dir
+        self.content_dir = content_dir
+        self.sources_dir = os.path.join(content_dir, "articles")
+        self.manifest = Manifest(os.path.join(content_dir, MANIFEST_NAME))
+        self.changed = []
+        # Variables shared by every page render (e.g. fingerprinted asset names)
+        self.page_context = {}
+        # Optional str -> str transform applied to every HTML page before it is written
+        self.minify_html = None
+        if not self.manifest.exists:
+            self.import_legacy_articles()
+
+    def _site_path(self, rel_path):
+        return os.path.join(self.website_dir, rel_path)
+
+    def layout_hash(self, template):
+        """Hash of everything besides page data that affects rendered output."""
+        return content_hash(json.dumps([template.hash, self.page_context, self.minify_html is not None],
+                                       sort_keys=True))
+
+    def render_page(self, template, **context):
+        return template.render(**self.page_context, **context)
+
+    def emit(self, rel_path, data):
+        """Writes one output file if its bytes changed; returns the new output hash."""
+        if self.minify_html is not None and rel_path.endswith(".html"):
+            data = self.minify_html(data)
+        path = self._site_path(rel_path)
+        if write_if_changed(path, data):
+            self.changed.append(path)
+        return content_hash(data)
+
+    def open_stream(self, rel_path, signature=None):
+        """Returns a StreamingOutput for a derived page, recorded in the manifest when closed."""
+        previous = self.manifest.pages.get(rel_path, {})
+
+        def record(stream):
+            if stream.changed:
+                self.changed.append(stream.path)
+            entry = {"signature": signature, "output_hash": stream.hash}
+            if entry != previous:
+                self.manifest.put_page(rel_path, entry)
+
+        return StreamingOutput(self._site_path(rel_path), previous.get("output_hash"), record)
+
+    def page_unchanged(self, rel_path, signature):
+        """True if rel_path exists and was last built from inputs with this signature."""
+        return self.manifest.pages.get(rel_path, {}).get("signature") == signature \
+            and os.path.exists(self._site_path(rel_path))
+
+    def emit_page(self, rel_path, signature, data):
+        """Writes a derived page and records the signature of the inputs it was built from."""
+        self.manifest.put_page(rel_path, {"signature": signature, "output_hash": self.emit(rel_path, data)})
+
+    def remove_pages(self, rel_paths):
+        """Deletes derived pages that are no longer generated, with their precompressed copies and records.
+
+        The deleted paths are added to the changed list, so the publish step commits the removal.
+        """
+        for rel_path in rel_paths:
+            path = self._site_path(rel_path)
+            for candidate in (path, f"{path}.gz", f"{path}.br"):
+                if os.path.exists(candidate):
+                    os.remove(candidate)
+                    self.changed.append(candidate)
+            if rel_path in self.manifest.pages:
+                self.manifest.delete_page(rel_path)
+            if rel_path in self.manifest.assets:
+                self.manifest.delete_asset(rel_path)
+
+    def import_legacy_articles(self):
+        """Seeds the manifest from articles that were published before it existed.
+
+        These have no stored source text, so they are listed on derived pages but
+        never re-rendered.
+        """
+        for path in sorted(glob.glob(os.path.join(self.website_dir, "articles", "*.html"))):
+            with open(path, "r") as f:
+                page = f.read()
+            stamp = _STAMP_RE.search(path)
+            title = _TITLE_RE.search(page)
+            date = (datetime.datetime.strptime(stamp.group(1), "%Y%m%d_%H%M%S") if stamp
+                    else datetime.datetime.fromtimestamp(os.path.getmtime(path)))
+            key = os.path.splitext(os.path.basename(path))[0]
+            self.manifest.put_article(key, {
+                "source": None,
+                "source_hash": None,
+                "template_hash": None,
+                "output": os.path.relpath(path, self.website_dir),
+                "output_hash": content_hash(page),
+                "title": html.unescape(title.group(1).strip()) if title else key,
+                "date": date.isoformat(timespec="seconds"),
+            })
+
+    def publish(self, key, raw_content, title, date, html_content, template_hash, topic=None):
+        """Stores the source text, writes the rendered article and records it in the manifest.
+
+        topic is the (topic, variant) the article was generated from, kept for topic rotation.
+        """
+        os.makedirs(self.sources_dir, exist_ok=True)
+        source_path = os.path.join(self.sources_dir, f"{key}.txt")
+        if write_if_changed(source_path, raw_content):
+            self.changed.append(source_path)
+        output = f"articles/{key}.html"
+        stat = os.stat(source_path)
+        record = {
+            "source": os.path.relpath(source_path, self.content_dir),
+            "source_hash": content_hash(raw_content),
+            "source_stat": [stat.st_mtime_ns, stat.st_size],
+            "template_hash": template_hash,
+            "output": output,
+            "output_hash": self.emit(output, html_content),
+            "title": title,
+            "date": date.isoformat(timespec="seconds"),
+        }
+        if topic:
+            record["topic"], record["variant"] = topic
+        self.manifest.put_article(key, record)
+        return self._site_path(output)
+
+    def rebuild_articles(self, render, template_hash, check_sources=True):
+        """Re-renders every article whose source or template hash differs from the manifest.
+
+        render(raw_content, date) must return (title, html_content). When
+        check_sources is False only the template hash is compared, which avoids
+        touching every source file when just the layout changed.
+        """
+        rendered = 0
+        for key, record in list(self.manifest.articles.items()):
+            if not record.get("source"):
+                continue
+            source_path = os.path.join(self.content_dir, record["source"])
+            template_changed = record.get("template_hash") != template_hash
+            if not template_changed and not check_sources:
+                continue
+            try:
+                stat = os.stat(source_path)
+            except FileNotFoundError:
+                continue
+            source_stat = [stat.st_mtime_ns, stat.st_size]
+            if not template_changed and record.get("source_stat") == source_stat:
+                continue
+            with open(source_path, "r") as f:
+                raw_content = f.read()
+            source_hash = content_hash(raw_content)
+            if not template_changed and source_hash == record["source_hash"]:
+                self.manifest.put_article(key, {**record, "source_stat": source_stat})
+                continue
+            date = datetime.datetime.fromisoformat(record["date"])
+            title, html_content = render(raw_content, date)
+            self.manifest.put_article(key, {
+                **record,
+                "source_hash": source_hash,
+                "source_stat": source_stat,
+                "template_hash": template_hash,
+                "output_hash": self.emit(record["output"], html_content),
+                "title": title,
+            })
+            rendered += 1
+        return rendered
+
+    def latest_articles(self, count):
+        """Returns the newest count (key, record) pairs, newest first."""
+        items = sorted(self.manifest.articles.items(), key=lambda kv: kv[1]["date"], reverse=True)
+        return items[:count]
+
+    def build_index(self, template):
+        """Rebuilds index.html from the manifest when its inputs changed."""
+        latest = self.latest_articles(INDEX_ARTICLE_COUNT)
+        signature = content_hash(json.dumps([self.layout_hash(template),
+                                             [(k, r["title"], r["output"]) for k, r in latest]]))
+        if self.page_unchanged("index.html", signature):
+            return False
+        self.emit_page("index.html", signature, self.render_page(template,
+            page_title="AI Generated Content",
+            root="",
+            articles=[{"url": r["output"], "title": r["title"]} for _, r in latest],
+        ))
+        return True
+
+    def finish(self):
+        """Flushes the manifest; returns the list of files written by this build."""
+        if self.manifest.flush():
+            self.changed.append(self.manifest.path)
+        return self.changed
+
+    def write_changed_list(self, path):
+        """Writes the paths touched by this build, one per line, for `git add --pathspec-from-file`."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write("".join(f"{p}\n" for p in self.changed))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a text-generation endpoint, for trying the http generator backend.
+
+Usage: python3 agents/stub_generator.py [--port 8765] [--delay 0.5] [--fail-rate 0.2]
+then:  python3 agents/content_creator.py --generator http --endpoint http://127.0.0.1:8765/
+
+Every POST gets a {"text": ...} article built from the prompt's Title: line
+after --delay seconds; a --fail-rate fraction of requests is answered with 429
+or 503 instead, to exercise the retry path. Request counts are printed on exit.
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_TITLE_RE = re.compile(r"^Title: (.+)$", re.M)
+
+counts = {"requests": 0, "failed": 0}
+counts_lock = threading.Lock()
+
+
+def stub_article(prompt):
+    match = _TITLE_RE.search(prompt)
+    title = match.group(1) if match else "Untitled"
+    return (f"Title: {title}\nTags: Stub, Testing\n\nIntroduction:\nA generated article about {title}.\n\n"
+            f"Body:\nThis text came from the local stub endpoint.\n\n- prompt length: {len(prompt)}\n\n"
+            f"Conclusion:\nNothing more to say about {title}.\n")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    fail_rate = 0.0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.delay)
+        failed = random.random() < self.fail_rate
+        with counts_lock:
+            counts["requests"] += 1
+            counts["failed"] += failed
+        if failed:
+            self.send_response(random.choice((429, 503)))
+            self.send_header("Retry-After", "1")
+            self.end_headers()
+            return
+        reply = json.dumps({"text": stub_article(body.get("prompt", ""))}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *_):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.5, help="Seconds to wait before answering.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 429/503.")
+    args = parser.parse_args()
+    StubHandler.delay = args.delay
+    StubHandler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"{counts['requests']} request(s), {counts['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
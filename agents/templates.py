@@ -0,0 +1,175 @@
+"""
+A small compiled template engine for the site's HTML pages.
+
+Templates are parsed once into a flat list of literal strings and slots, and a
+render is a single "".join over the produced pieces. Supported syntax:
+
+    {{ name }} / {{ item.title }}    value, HTML-escaped
+    {{ name|safe }}                   value inserted verbatim (pre-rendered HTML)
+    {% include "_partials/x.html" %}  partial, inlined at compile time
+    {% for item in items %}...{% endfor %}
+    {% if name %}...{% else %}...{% endif %}
+
+Compiled templates are cached per path and invalidated when the mtime or size
+of the template or any partial it includes changes.
+"""
+import os
+import re
+import html
+import hashlib
+
+_TOKEN_RE = re.compile(r"(\{\{.*?\}\}|\{%.*?%\})", re.S)
+_INCLUDE_RE = re.compile(r"""include\s+["'](.+?)["']$""")
+_FOR_RE = re.compile(r"for\s+(\w+)\s+in\s+([\w.]+)$")
+_IF_RE = re.compile(r"if\s+([\w.]+)$")
+
+_VAR = 0
+_FOR = 1
+_IF = 2
+
+
+class TemplateError(ValueError):
+    """Raised when a template cannot be parsed."""
+
+
+def _lookup(context, path):
+    value = context.get(path[0], "")
+    for part in path[1:]:
+        if isinstance(value, dict):
+            value = value.get(part, "")
+        else:
+            value = getattr(value, part, "")
+    return value
+
+
+def _render(nodes, context, out):
+    append = out.append
+    for node in nodes:
+        if node.__class__ is str:
+            append(node)
+        elif node[0] == _VAR:
+            value = _lookup(context, node[1])
+            append(str(value) if node[2] else html.escape(str(value)))
+        elif node[0] == _FOR:
+            scope = dict(context)
+            name, body = node[1], node[3]
+            for item in _lookup(context, node[2]) or ():
+                scope[name] = item
+                _render(body, scope, out)
+        else:
+            _render(node[2] if _lookup(context, node[1]) else node[3], context, out)
+
+
+class Template:
+    """A parsed template. Render with keyword arguments; returns a str."""
+    def __init__(self, name, nodes, dependencies, source_hash):
+        self.name = name
+        self.nodes = nodes
+        self.dependencies = dependencies
+        self.hash = source_hash
+
+    def render(self, **context):
+        out = []
+        _render(self.nodes, context, out)
+        return "".join(out)
+
+
+class TemplateLoader:
+    """Loads and caches templates relative to a root directory."""
+    def __init__(self, root):
+        self.root = root
+        self._cache = {}
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def _stamp(self, name):
+        stat = os.stat(self._path(name))
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, name):
+        """Returns the compiled template, recompiling only if it or one of its partials changed."""
+        cached = self._cache.get(name)
+        if cached:
+            stamps, template = cached
+            try:
+                if all(self._stamp(dep) == stamp for dep, stamp in stamps.items()):
+                    return template
+            except FileNotFoundError:
+                pass
+        template = self._compile(name)
+        self._cache[name] = ({dep: self._stamp(dep) for dep in template.dependencies}, template)
+        return template
+
+    def _compile(self, name):
+        dependencies = {}
+        nodes = self._parse(name, dependencies, ())
+        digest = hashlib.sha256()
+        for dep in sorted(dependencies):
+            digest.update(dep.encode("utf-8") + b"\0" + dependencies[dep] + b"\0")
+        return Template(name, nodes, sorted(dependencies), digest.hexdigest())
+
+    def _parse(self, name, dependencies, include_stack):
+        if name in include_stack:
+            raise TemplateError(f"{name}: recursive include via {' -> '.join(include_stack)}")
+        with open(self._path(name), "rb") as f:
+            source = f.read()
+        dependencies[name] = source
+
+        root = []
+        stack = [(None, root)]  # (open block node, list currently being filled)
+        for piece in _TOKEN_RE.split(source.decode("utf-8")):
+            body = stack[-1][1]
+            if not piece:
+                continue
+            if piece.startswith("{{"):
+                expr = piece[2:-2].strip()
+                safe = expr.endswith("|safe")
+                if safe:
+                    expr = expr[:-5].strip()
+                if not re.fullmatch(r"[\w.]+", expr):
+                    raise TemplateError(f"{name}: bad expression {piece!r}")
+                body.append((_VAR, tuple(expr.split(".")), safe))
+            elif piece.startswith("{%"):
+                tag = piece[2:-2].strip()
+                include = _INCLUDE_RE.match(tag)
+                loop = _FOR_RE.match(tag)
+                cond = _IF_RE.match(tag)
+                if include:
+                    body.extend(self._parse(include.group(1), dependencies, include_stack + (name,)))
+                elif loop:
+                    node = [_FOR, loop.group(1), tuple(loop.group(2).split(".")), []]
+                    body.append(node)
+                    stack.append((node, node[3]))
+                elif cond:
+                    node = [_IF, tuple(cond.group(1).split(".")), [], []]
+                    body.append(node)
+                    stack.append((node, node[2]))
+                elif tag == "else" and stack[-1][0] and stack[-1][0][0] == _IF:
+                    stack[-1] = (stack[-1][0], stack[-1][0][3])
+                elif tag in ("endfor", "endif") and stack[-1][0] \
+                        and stack[-1][0][0] == (_FOR if tag == "endfor" else _IF):
+                    stack.pop()
+                else:
+                    raise TemplateError(f"{name}: unexpected tag {piece!r}")
+            else:
+                body.append(piece)
+        if len(stack) > 1:
+            raise TemplateError(f"{name}: unclosed block")
+        return self._merge(root)
+
+    def _merge(self, nodes):
+        """Joins adjacent literals (e.g. across inlined partials) so rendering appends fewer pieces."""
+        merged = []
+        for node in nodes:
+            if isinstance(node, list):
+                if node[0] == _FOR:
+                    node[3] = self._merge(node[3])
+                else:
+                    node[2], node[3] = self._merge(node[2]), self._merge(node[3])
+                node = tuple(node)
+            if node.__class__ is str and merged and merged[-1].__class__ is str:
+                merged[-1] += node
+            else:
+                merged.append(node)
+        return merged
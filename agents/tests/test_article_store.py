@@ -0,0 +1,94 @@
+import os
+import json
+import datetime
+
+import pytest
+
+from article_store import ArticleStore, DOC_BLOCK_SIZE, term_prefixes, tokenize, write_search_index
+from site_build import SiteBuilder
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ArticleStore(str(tmp_path / "content" / "articles.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def builder(tmp_path):
+    return SiteBuilder(str(tmp_path / "docs"), str(tmp_path / "content"))
+
+
+def read_json(builder, rel_path):
+    with open(os.path.join(builder.website_dir, rel_path)) as f:
+        return json.load(f)
+
+
+def add(store, key, title, body, published, tags=()):
+    return store.upsert(key, title, body, f"articles/{key}.html", published, tags)
+
+
+def test_tokenize_folds_case_and_diacritics():
+    assert tokenize("Café NAÏVE snake_case x2") == {"cafe", "naive", "snake", "case", "x2"}
+    assert term_prefixes("Ethics", "a") == {"et", "a"}
+
+
+def test_upsert_updates_in_place_and_replaces_tags(store):
+    first = add(store, "k", "Old", "old body", "2025-01-01T00:00:00", ["a", "b"])
+    second = add(store, "k", "New", "new body", "2025-01-01T00:00:00", ["b"])
+    assert first == second
+    assert len(store) == 1
+    assert store.tags() == [("b", 1)]
+    assert store.search("old") == []
+    assert [row[1] for row in store.search("new")] == ["New"]
+
+
+def test_postings_come_from_the_fts_vocabulary(store):
+    one = add(store, "one", "Ethics of AI", "ethical questions", "2025-01-01T00:00:00")
+    two = add(store, "two", "Ethics again", "more ethics", "2025-01-02T00:00:00")
+    assert store.postings("et") == {"ethical": [one], "ethics": [two, one]}
+    assert store.postings("a") == {}
+    assert "ai" in store.prefixes() and "et" in store.prefixes()
+
+
+def test_short_terms_get_their_own_shard(store):
+    doc = add(store, "one", "C is a language", "x", "2025-01-01T00:00:00")
+    assert store.postings("c") == {"c": [doc]}
+    assert store.postings("x") == {"x": [doc]}
+
+
+def test_deleted_terms_leave_the_shards(store):
+    add(store, "one", "Quantum", "body", "2025-01-01T00:00:00")
+    add(store, "one", "Classical", "body", "2025-01-01T00:00:00")
+    assert store.postings("qu") == {}
+
+
+def test_write_search_index_full_and_incremental(store, builder):
+    one = add(store, "one", "Ethics", "robots", "2025-01-01T00:00:00")
+    assert write_search_index(store, builder) == len(store.prefixes()) + 1
+    assert read_json(builder, "search/t/et.json") == {"ethics": [one]}
+    assert read_json(builder, "search/d/0.json") == {str(one): ["Ethics", "articles/one.html", "2025-01-01"]}
+    assert read_json(builder, "search/meta.json") == {"prefix": 2, "block": DOC_BLOCK_SIZE}
+
+    builder.changed.clear()
+    two = add(store, "two", "Ethical robots", "", "2025-01-02T00:00:00")
+    written = write_search_index(store, builder, term_prefixes("Ethical robots"), [two])
+    assert written == 3
+    assert read_json(builder, "search/t/ro.json") == {"robots": [two, one]}
+    assert sorted(os.path.relpath(p, builder.website_dir) for p in builder.changed) == [
+        "search/d/0.json", "search/t/et.json", "search/t/ro.json"]
+
+
+def test_sync_manifest_reads_sources_and_legacy_pages(store, builder, tmp_path):
+    date = datetime.datetime(2025, 1, 1)
+    builder.publish("fresh", "Title: Fresh\nTags: news\n\nBody words", "Fresh", date, "<p>x</p>", "t")
+    legacy = tmp_path / "docs" / "articles" / "legacy.html"
+    legacy.write_text('<div class="main-content"><p>Old &amp; gold</p></div>')
+    builder.manifest.put_article("legacy", {"source": None, "output": "articles/legacy.html",
+                                            "title": "Legacy: post", "date": "2024-01-01T00:00:00"})
+    store.sync_manifest(builder)
+    assert len(store) == 2
+    assert store.tags() == [("Legacy", 1), ("news", 1)]
+    assert [row[1] for row in store.search("gold")] == ["Legacy: post"]
+    assert [row[1] for row in store.iter_articles(newest_first=True)] == ["fresh", "legacy"]
@@ -0,0 +1,98 @@
+import pytest
+
+import markup
+from markup import article_tags, iter_lines, parse_article, render_article_body, render_blocks, render_inline
+
+
+def blocks(text):
+    return list(render_blocks(text.split("\n")))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("plain & <b>", "plain &amp; &lt;b&gt;"),
+    ("*em* and **strong**", "<em>em</em> and <strong>strong</strong>"),
+    ("_em_ and __strong__", "<em>em</em> and <strong>strong</strong>"),
+    ("`a *b* <c>`", "<code>a *b* &lt;c&gt;</code>"),
+    ("[link *x*](https://example.com/a?b=1&c=2)",
+     '<a href="https://example.com/a?b=1&amp;c=2">link <em>x</em></a>'),
+    ("snake_case_name", "snake_case_name"),
+    ("*a**b*", "<em>a**b</em>"),
+    ("2 * 3 * 4", "2 * 3 * 4"),
+    ("**open\nclose**", "**open\nclose**"),
+    ("[x](javascript:alert(1))", "[x](javascript:alert(1))"),
+    ("unclosed ` and [ and *", "unclosed ` and [ and *"),
+])
+def test_render_inline(text, expected):
+    assert render_inline(text) == expected
+
+
+class _CountingPattern:
+    """Wraps a compiled closer pattern and counts the characters its searches cover."""
+    def __init__(self, pattern, counter):
+        self.pattern = pattern
+        self.counter = counter
+
+    def search(self, text, pos):
+        match = self.pattern.search(text, pos)
+        self.counter[0] += (match.end() if match else len(text)) - pos
+        return match
+
+    def match(self, text, pos):
+        return self.pattern.match(text, pos)
+
+
+@pytest.mark.parametrize("unit", ["*a ", "_b ", "[c ", "**d\n", "[e](f "])
+def test_closer_search_is_linear(monkeypatch, unit):
+    counter = [0]
+    monkeypatch.setattr(markup, "_CLOSER_RES",
+                        {key: _CountingPattern(p, counter) for key, p in markup._CLOSER_RES.items()})
+    text = unit * 5000
+    render_inline(text)
+    # Every closer pattern scans the line at most about once.
+    assert counter[0] <= len(markup._CLOSER_RES) * 2 * len(text)
+
+
+def test_blocks():
+    html = blocks("# Title\n\nFirst line\nsecond line\n\n- one\n- two\n  more\n\n1. x\n2. y\n\n```\n<tag>\n```")
+    assert html == [
+        "<h3>Title</h3>",
+        "<p>First line\nsecond line</p>",
+        "<ul>", "<li>one</li>", "<li>two\nmore</li>", "</ul>",
+        "<ol>", "<li>x</li>", "<li>y</li>", "</ol>",
+        "<pre><code>&lt;tag&gt;</code></pre>",
+    ]
+
+
+def test_unclosed_code_fence_is_flushed():
+    assert blocks("```\ncode") == ["<pre><code>code</code></pre>"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Introduction:\nText", ["<h3>Introduction</h3>", "<p>Text</p>"]),
+    ("Introduction:\n\nText", ["<h3>Introduction</h3>", "<p>Text</p>"]),
+    ("Here are the points:\n- one", ["<p>Here are the points:</p>", "<ul>", "<li>one</li></ul>"]),
+    ("Example:\n```\nx\n```", ["<p>Example:</p>", "<pre><code>x</code></pre>"]),
+    ("Steps:\n1. go", ["<p>Steps:</p>", "<ol>", "<li>go</li></ol>"]),
+    ("Text\nConclusion:", ["<p>Text\nConclusion:</p>"]),
+])
+def test_section_heading_lookahead(text, expected):
+    assert blocks(text) == expected
+
+
+def test_iter_lines_strips_line_endings():
+    assert list(iter_lines("a\r\nb\n\nc")) == ["a", "b", "", "c"]
+    assert list(iter_lines("")) == []
+
+
+def test_parse_article_headers():
+    headers, body = parse_article("\nTitle: Hello\nTags: ai, , ethics\n\nBody text")
+    assert headers == {"title": "Hello", "tags": ["ai", "ethics"]}
+    assert list(body) == ["Body text"]
+    assert article_tags("Body only", "AI in Healthcare: A Revolution") == ["AI in Healthcare"]
+
+
+def test_render_article_body():
+    title, html = render_article_body("Title: Hello\n\nSome **bold** text")
+    assert title == "Hello"
+    assert html == "<p>Some <strong>bold</strong> text</p>"
+    assert render_article_body("No header")[0] is None
@@ -0,0 +1,93 @@
+import datetime
+
+import pytest
+
+from scheduler import CronSchedule, Daemon, read_status
+
+T = datetime.datetime
+
+
+@pytest.mark.parametrize("expression, moment, expected", [
+    ("0 12 * * *", T(2025, 11, 12, 11, 59, 30), T(2025, 11, 12, 12, 0)),
+    ("0 12 * * *", T(2025, 11, 12, 12, 0), T(2025, 11, 13, 12, 0)),
+    ("*/15 * * * *", T(2025, 11, 12, 10, 7), T(2025, 11, 12, 10, 15)),
+    ("5,35 9-10 * * *", T(2025, 11, 12, 10, 40), T(2025, 11, 13, 9, 5)),
+    ("0 0 1 * *", T(2025, 12, 15), T(2026, 1, 1)),
+    ("0 0 29 2 *", T(2025, 3, 1), T(2028, 2, 29)),
+    ("0 9 * * mon-fri", T(2025, 11, 14, 10), T(2025, 11, 17, 9)),
+    ("0 9 * * 7", T(2025, 11, 12), T(2025, 11, 16, 9)),
+    ("0 0 * jan *", T(2025, 2, 1), T(2026, 1, 1)),
+    ("@daily", T(2025, 11, 12, 1), T(2025, 11, 13)),
+    ("30 6 */10 * *", T(2025, 11, 12), T(2025, 11, 21, 6, 30)),
+])
+def test_next_after(expression, moment, expected):
+    assert CronSchedule(expression).next_after(moment) == expected
+
+
+def test_restricted_day_of_month_and_week_match_either():
+    # 13th of the month or any Friday.
+    schedule = CronSchedule("0 0 13 * 5")
+    assert schedule.next_after(T(2025, 11, 12)) == T(2025, 11, 13)
+    assert schedule.next_after(T(2025, 11, 13)) == T(2025, 11, 14)
+
+
+def test_slots_between_is_half_open():
+    slots = list(CronSchedule("0 * * * *").slots_between(T(2025, 1, 1, 1), T(2025, 1, 1, 4)))
+    assert slots == [T(2025, 1, 1, 2), T(2025, 1, 1, 3), T(2025, 1, 1, 4)]
+
+
+@pytest.mark.parametrize("expression", [
+    "0 12 * *", "60 * * * *", "* 24 * * *", "*/0 * * * *", "0 0 0 * *", "0 0 * 13 *", "0 0 * * fun",
+])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_never_matching_expression():
+    with pytest.raises(ValueError, match="never matches"):
+        CronSchedule("0 0 31 2 *").next_after(T(2025, 1, 1))
+
+
+def test_daemon_catches_up_recent_missed_slots(tmp_path):
+    status_path = str(tmp_path / "status.json")
+    ran = []
+    daemon = Daemon(CronSchedule("0 * * * *"), ran.append, status_path, max_catch_up=2)
+    daemon.status["last_slot"] = T(2025, 1, 1, 0).isoformat()
+    keep, skipped = daemon.missed_slots(T(2025, 1, 1, 4, 30))
+    assert keep == [T(2025, 1, 1, 3), T(2025, 1, 1, 4)]
+    assert skipped == 2
+
+    for slot in keep:
+        daemon.run_slot(slot)
+    assert ran == keep
+    status = read_status(status_path)
+    assert status["last_slot"] == "2025-01-01T04:00:00"
+    assert status["runs"] == 2 and status["state"] == "idle"
+    # A restarted daemon resumes from the recorded slot.
+    restarted = Daemon(CronSchedule("0 * * * *"), ran.append, status_path)
+    assert restarted.missed_slots(T(2025, 1, 1, 4, 30)) == ([], 0)
+
+
+def test_daemon_reports_failures_and_continues(tmp_path):
+    errors = []
+
+    def job(slot):
+        raise RuntimeError("boom")
+
+    daemon = Daemon(CronSchedule("@hourly"), job, str(tmp_path / "status.json"),
+                    on_error=lambda slot, error: errors.append((slot, str(error))))
+    daemon.run_slot(T(2025, 1, 1, 1))
+    assert errors == [(T(2025, 1, 1, 1), "boom")]
+    status = read_status(daemon.status_path)
+    assert status["failures"] == 1
+    assert status["last_error"].startswith("2025-01-01T01:00:00: RuntimeError")
+    assert status["last_success"] is None
+
+
+def test_stopped_daemon_returns_without_running(tmp_path):
+    ran = []
+    daemon = Daemon(CronSchedule("* * * * *"), ran.append, str(tmp_path / "status.json"))
+    daemon.stop()
+    daemon.run_forever()
+    assert ran == []
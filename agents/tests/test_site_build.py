@@ -0,0 +1,176 @@
+import os
+import json
+import datetime
+
+from site_build import Manifest, SiteBuilder, content_hash, write_if_changed
+
+DATE = datetime.datetime(2025, 11, 12, 11, 36, 32)
+
+
+def journal_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_builder(tmp_path):
+    return SiteBuilder(str(tmp_path / "docs"), str(tmp_path / "content"))
+
+
+def render(raw_content, date):
+    title = raw_content.splitlines()[0]
+    return title, f"<h2>{title}</h2>\n<p>{raw_content}</p>\n"
+
+
+def test_manifest_appends_one_line_per_change(tmp_path):
+    path = str(tmp_path / "manifest.jsonl")
+    manifest = Manifest(path)
+    assert not manifest.exists
+    manifest.put_article("a", {"title": "A"})
+    manifest.set_meta("topic", 3)
+    assert manifest.flush()
+    assert not manifest.flush()
+
+    manifest.put_article("a", {"title": "A2"})
+    manifest.flush()
+    assert len(journal_lines(path)) == 3
+
+    reloaded = Manifest(path)
+    assert reloaded.articles == {"a": {"title": "A2"}}
+    assert reloaded.get_meta("topic") == 3
+    assert reloaded.get_meta("missing", "default") == "default"
+
+
+def test_manifest_replays_deletions(tmp_path):
+    path = str(tmp_path / "manifest.jsonl")
+    manifest = Manifest(path)
+    manifest.put_page("tags/a/page-1.html", {"signature": "s"})
+    manifest.put_asset("tags/a/page-1.html", {"hash": "h"})
+    manifest.put_page("index.html", {"signature": "t"})
+    manifest.flush()
+    manifest.delete_page("tags/a/page-1.html")
+    manifest.delete_asset("tags/a/page-1.html")
+    manifest.flush()
+
+    reloaded = Manifest(path)
+    assert reloaded.pages == {"index.html": {"signature": "t"}}
+    assert reloaded.assets == {}
+
+
+def test_manifest_compacts_superseded_lines(tmp_path):
+    path = str(tmp_path / "manifest.jsonl")
+    manifest = Manifest(path)
+    for version in range(150):
+        manifest.set_meta("counter", version)
+        manifest.flush()
+    lines = journal_lines(path)
+    assert len(lines) < 150
+    assert Manifest(path).get_meta("counter") == 149
+
+
+def test_write_if_changed_skips_identical_bytes(tmp_path):
+    path = str(tmp_path / "out" / "page.html")
+    assert write_if_changed(path, "one")
+    assert not write_if_changed(path, "one")
+    assert write_if_changed(path, "two")
+    with open(path) as f:
+        assert f.read() == "two"
+
+
+def test_publish_records_article_and_survives_reload(tmp_path):
+    builder = make_builder(tmp_path)
+    title, page = render("Hello\nworld", DATE)
+    path = builder.publish("hello", "Hello\nworld", title, DATE, page, "t1")
+    builder.finish()
+    with open(path) as f:
+        assert f.read() == page
+
+    reloaded = make_builder(tmp_path)
+    record = reloaded.manifest.articles["hello"]
+    assert record["output"] == "articles/hello.html"
+    assert record["source_hash"] == content_hash("Hello\nworld")
+    assert record["template_hash"] == "t1"
+    assert record["date"] == DATE.isoformat()
+
+
+def test_rebuild_only_renders_changed_inputs(tmp_path):
+    builder = make_builder(tmp_path)
+    for key in ("one", "two"):
+        title, page = render(f"{key}\nbody", DATE)
+        builder.publish(key, f"{key}\nbody", title, DATE, page, "t1")
+    builder.finish()
+
+    builder = make_builder(tmp_path)
+    assert builder.rebuild_articles(render, "t1") == 0
+    assert builder.finish() == []
+
+    # Same bytes with a new mtime: the stat is refreshed, nothing is rendered.
+    source = os.path.join(builder.sources_dir, "one.txt")
+    os.utime(source, ns=(1, 1))
+    builder = make_builder(tmp_path)
+    assert builder.rebuild_articles(render, "t1") == 0
+    assert builder.manifest.articles["one"]["source_stat"][0] == 1
+
+    with open(source, "w") as f:
+        f.write("One edited\nbody")
+    builder = make_builder(tmp_path)
+    assert builder.rebuild_articles(render, "t1") == 1
+    assert builder.manifest.articles["one"]["title"] == "One edited"
+
+    # A template change re-renders everything, even without looking at the sources.
+    builder = make_builder(tmp_path)
+    assert builder.rebuild_articles(render, "t2", check_sources=False) == 2
+    assert builder.rebuild_articles(render, "t2", check_sources=False) == 0
+
+
+class _Template:
+    hash = "layout"
+
+    def render(self, **context):
+        return "".join(f"{a['title']}\n" for a in context["articles"])
+
+
+def test_build_index_skips_unchanged_inputs(tmp_path):
+    builder = make_builder(tmp_path)
+    title, page = render("First\nbody", DATE)
+    builder.publish("first", "First\nbody", title, DATE, page, "t1")
+    assert builder.build_index(_Template())
+    builder.finish()
+
+    builder = make_builder(tmp_path)
+    assert not builder.build_index(_Template())
+    title, page = render("Second\nbody", DATE + datetime.timedelta(days=1))
+    builder.publish("second", "Second\nbody", title, DATE + datetime.timedelta(days=1), page, "t1")
+    assert builder.build_index(_Template())
+    with open(os.path.join(builder.website_dir, "index.html")) as f:
+        assert f.read() == "Second\nFirst\n"
+
+
+def test_remove_pages_deletes_outputs_and_records(tmp_path):
+    builder = make_builder(tmp_path)
+    builder.emit_page("tags/old/page-1.html", "sig", "<p>old</p>")
+    gz = os.path.join(builder.website_dir, "tags/old/page-1.html.gz")
+    with open(gz, "wb") as f:
+        f.write(b"gz")
+    builder.manifest.put_asset("tags/old/page-1.html", {"hash": "h"})
+    builder.finish()
+
+    builder = make_builder(tmp_path)
+    builder.remove_pages(["tags/old/page-1.html"])
+    assert not os.path.exists(gz)
+    assert gz in builder.changed
+    builder.finish()
+    reloaded = Manifest(builder.manifest.path)
+    assert "tags/old/page-1.html" not in reloaded.pages
+    assert "tags/old/page-1.html" not in reloaded.assets
+
+
+def test_legacy_articles_are_listed_but_not_rerendered(tmp_path):
+    articles = tmp_path / "docs" / "articles"
+    articles.mkdir(parents=True)
+    (articles / "old_post_20251112_113632.html").write_text("<title>Old &amp; Gold</title>")
+    builder = make_builder(tmp_path)
+    record = builder.manifest.articles["old_post_20251112_113632"]
+    assert record["title"] == "Old & Gold"
+    assert record["date"] == "2025-11-12T11:36:32"
+    assert record["source"] is None
+    assert builder.rebuild_articles(render, "t1") == 0
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from templates import TemplateError, TemplateLoader
+
+
+@pytest.fixture
+def loader(tmp_path):
+    return TemplateLoader(str(tmp_path))
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+def test_values_are_escaped_unless_safe(tmp_path, loader):
+    write(tmp_path, "page.html", "<h1>{{ title }}</h1>{{ body|safe }}{{ missing }}")
+    page = loader.get("page.html").render(title="A & <B>", body="<p>x</p>")
+    assert page == "<h1>A &amp; &lt;B&gt;</h1><p>x</p>"
+
+
+def test_dotted_lookup_on_dicts_and_attributes(tmp_path, loader):
+    class Article:
+        title = "attr"
+
+    write(tmp_path, "page.html", "{{ a.title }}/{{ b.title }}/{{ b.nope }}")
+    assert loader.get("page.html").render(a={"title": "dict"}, b=Article()) == "dict/attr/"
+
+
+def test_loops_and_conditionals(tmp_path, loader):
+    write(tmp_path, "page.html",
+          "{% for item in items %}[{{ item.name }}{% if item.new %}*{% else %}-{% endif %}]{% endfor %}"
+          "{% if empty %}yes{% else %}no{% endif %}")
+    template = loader.get("page.html")
+    assert template.render(items=[{"name": "a", "new": True}, {"name": "b"}], empty=[]) == "[a*][b-]no"
+    assert template.render() == "no"
+
+
+def test_loop_variable_does_not_leak(tmp_path, loader):
+    write(tmp_path, "page.html", "{% for x in items %}{{ x }}{% endfor %}{{ x }}")
+    assert loader.get("page.html").render(items=[1, 2], x="outer") == "12outer"
+
+
+def test_includes_are_inlined_and_tracked(tmp_path, loader):
+    write(tmp_path, "_partials/head.html", "<head>{{ title }}</head>")
+    write(tmp_path, "page.html", '{% include "_partials/head.html" %}<body></body>')
+    template = loader.get("page.html")
+    assert template.render(title="T") == "<head>T</head><body></body>"
+    assert template.dependencies == ["_partials/head.html", "page.html"]
+    # Adjacent literals from the partial and the page are merged into one piece.
+    assert template.nodes[-1] == "</head><body></body>"
+
+
+def test_cache_is_invalidated_when_a_partial_changes(tmp_path, loader):
+    partial = write(tmp_path, "_partials/footer.html", "old")
+    write(tmp_path, "page.html", '{% include "_partials/footer.html" %}')
+    first = loader.get("page.html")
+    assert loader.get("page.html") is first
+
+    with open(partial, "w") as f:
+        f.write("newer")
+    second = loader.get("page.html")
+    assert second is not first
+    assert second.render() == "newer"
+    assert second.hash != first.hash
+
+
+def test_hash_is_stable_across_loaders(tmp_path):
+    write(tmp_path, "page.html", "{{ x }}")
+    assert TemplateLoader(str(tmp_path)).get("page.html").hash == TemplateLoader(str(tmp_path)).get("page.html").hash
+
+
+@pytest.mark.parametrize("source", [
+    "{% for x in items %}",
+    "{% endif %}",
+    "{% if a %}{% endfor %}",
+    "{{ a + b }}",
+    "{% while x %}",
+])
+def test_malformed_templates_raise(tmp_path, loader, source):
+    write(tmp_path, "page.html", source)
+    with pytest.raises(TemplateError):
+        loader.get("page.html")
+
+
+def test_recursive_include_raises(tmp_path, loader):
+    write(tmp_path, "a.html", '{% include "b.html" %}')
+    write(tmp_path, "b.html", '{% include "a.html" %}')
+    with pytest.raises(TemplateError, match="recursive include"):
+        loader.get("a.html")
+
+
+def test_site_templates_compile():
+    docs = os.path.join(os.path.dirname(__file__), "..", "..", "docs")
+    loader = TemplateLoader(docs)
+    for name in ("article_template.html", "index_template.html", "archive_template.html"):
+        assert loader.get(name).render(page_title="x", articles=[]).strip()
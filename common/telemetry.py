@@ -0,0 +1,355 @@
+"""
+Timing spans, counters and metric export shared by the content pipeline and the uploader.
+
+    span(stage)         context manager that times a stage into the
+                        <namespace>_stage_seconds histogram (and, with a JSON
+                        log, writes one record per span)
+    count / gauge / observe
+                        counters, gauges and histograms with optional labels
+    event(name, ...)    one structured JSON log record; JsonLogHandler turns
+                        logging records into such records too
+    configure(...)      turns it on: a JSON-lines log, a Prometheus textfile
+                        (rewritten by flush()) and/or a /metrics HTTP endpoint
+    profile(path)       opt-in cProfile, or a sampling profiler that also sees
+                        worker threads, around a single run
+
+Until configure() is called everything is disabled: each call returns after a
+single flag check and span() hands back one shared no-op context manager, so
+instrumented code costs next to nothing when nobody is collecting.
+"""
+import os
+import sys
+import json
+import time
+import bisect
+import logging
+import threading
+import contextlib
+from collections import Counter
+
+# Seconds; spans range from a template render to a multi-GB upload.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# MB/s.
+RATE_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SAMPLE_INTERVAL = 0.005
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Histogram:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Span:
+    __slots__ = ('telemetry', 'stage', 'labels', 'fields', 'start')
+
+    def __init__(self, telemetry, stage, labels):
+        self.telemetry = telemetry
+        self.stage = stage
+        self.labels = labels
+        self.fields = {}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        telemetry = self.telemetry
+        telemetry.observe('stage_seconds', seconds, stage=self.stage, **self.labels)
+        if exc_type is not None:
+            telemetry.count('stage_errors_total', stage=self.stage, **self.labels)
+        if telemetry.json_log:
+            record = dict(self.labels, **self.fields)
+            if exc_type is not None:
+                record['error'] = repr(exc)
+            telemetry.event('span', stage=self.stage, seconds=round(seconds, 6), **record)
+        return False
+
+    def set(self, **fields):
+        """Adds fields (e.g. bytes handled) to this span's JSON record."""
+        self.fields.update(fields)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Telemetry:
+    """Metric registry and outputs of one process; use the module-level functions."""
+    def __init__(self):
+        self.enabled = False
+        self.namespace = ''
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.help = {}
+        self.json_log = None
+        self.textfile = None
+        self.server = None
+
+    def configure(self, namespace, json_log=None, textfile=None, http_port=None, http_host='127.0.0.1'):
+        self.namespace = namespace
+        if json_log:
+            os.makedirs(os.path.dirname(os.path.abspath(json_log)), exist_ok=True)
+            self.json_log = open(json_log, 'a', buffering=1)
+        self.textfile = textfile or None
+        if http_port:
+            self.serve(http_port, http_host)
+        self.enabled = bool(json_log or textfile or http_port)
+        return self.enabled
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def span(self, stage, **labels):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage, labels)
+
+    def event(self, name, **fields):
+        if not self.json_log:
+            return
+        record = {'ts': round(time.time(), 6), 'source': self.namespace, 'event': name, **fields}
+        line = json.dumps(record, default=str) + '\n'
+        with self.lock:
+            self.json_log.write(line)
+
+    def render(self):
+        """The registry in the Prometheus text exposition format."""
+        prefix = f"{self.namespace}_" if self.namespace else ''
+        with self.lock:
+            families = {}
+            for kind, metrics in (('counter', self.counters), ('gauge', self.gauges), ('histogram', self.histograms)):
+                for (name, key), value in metrics.items():
+                    families.setdefault((name, kind), []).append((key, value))
+            lines = []
+            for (name, kind), series in sorted(families.items()):
+                full_name = prefix + name
+                if name in self.help:
+                    lines.append(f"# HELP {full_name} {self.help[name]}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for key, value in sorted(series, key=lambda item: item[0]):
+                    if kind != 'histogram':
+                        lines.append(f"{full_name}{_format_labels(key)} {_format_number(value)}")
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(value.bounds + (float('inf'),), value.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{full_name}_bucket{_format_labels(key, ('le', _format_number(bound)))} {cumulative}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {_format_number(value.sum)}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {value.count}")
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        """Rewrites the textfile (atomically, as the node_exporter textfile collector expects)."""
+        if not self.enabled or not self.textfile:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.textfile)), exist_ok=True)
+        temp_path = f"{self.textfile}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(temp_path, self.textfile)
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serves GET /metrics from a daemon thread."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = telemetry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True).start()
+
+    def close(self):
+        self.flush()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.json_log:
+            self.json_log.close()
+            self.json_log = None
+        self.enabled = False
+
+
+class JsonLogHandler(logging.Handler):
+    """Copies log records into the JSON log."""
+    def emit(self, record):
+        try:
+            fields = {'level': record.levelname, 'message': record.getMessage(), 'thread': record.threadName}
+            if record.exc_info:
+                fields['exception'] = logging.Formatter().formatException(record.exc_info)
+            TELEMETRY.event('log', **fields)
+        except Exception:
+            self.handleError(record)
+
+
+def _collapsed_stack(frame, thread_name):
+    # Only the innermost frame keeps its line number, so callers aggregate per function.
+    code = frame.f_code
+    names = [f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"]
+    frame = frame.f_back
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ';'.join(reversed(names))
+
+
+class _Sampler:
+    """Samples the stacks of all threads every interval seconds (cProfile only sees the calling thread)."""
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stopping.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.stacks[_collapsed_stack(frame, names.get(ident, str(ident)))] += 1
+            self.samples += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+
+    def write(self, path):
+        """Writes collapsed stacks ("frame;frame;frame count"), the input format of flamegraph tools."""
+        with open(path, 'w') as f:
+            for stack, samples in self.stacks.most_common():
+                f.write(f"{stack} {samples}\n")
+
+
+@contextlib.contextmanager
+def profile(path, mode='cprofile'):
+    """Profiles the enclosed block into path.
+
+    cprofile: deterministic profile of the calling thread; path gets pstats data
+    and path.txt the top functions by cumulative time. sample: all threads are
+    sampled every few milliseconds; path gets collapsed stacks for a flame graph.
+    """
+    if not path:
+        yield
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if mode == 'sample':
+        sampler = _Sampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.write(path)
+        return
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        with open(f"{path}.txt", 'w') as f:
+            pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(40)
+
+
+TELEMETRY = Telemetry()
+configure = TELEMETRY.configure
+describe = TELEMETRY.describe
+count = TELEMETRY.count
+gauge = TELEMETRY.gauge
+observe = TELEMETRY.observe
+span = TELEMETRY.span
+event = TELEMETRY.event
+flush = TELEMETRY.flush
+close = TELEMETRY.close
+
+
+def enabled():
+    return TELEMETRY.enabled
@@ -0,0 +1,84 @@
+// Client-side search over the prefix-sharded index in search/.
+// Only the term shard for each typed word and the metadata blocks of the hits are fetched.
+(function () {
+    var input = document.getElementById('search-input');
+    var results = document.getElementById('search-results');
+    if (!input || !results) {
+        return;
+    }
+    var cache = {};
+    var meta = null;
+    var timer = null;
+    // Number of the latest search; responses of older searches are dropped.
+    var latest = 0;
+
+    function load(path) {
+        if (!cache[path]) {
+            cache[path] = fetch('search/' + path).then(function (r) {
+                return r.ok ? r.json() : {};
+            }).catch(function () { return {}; });
+        }
+        return cache[path];
+    }
+
+    function words(text) {
+        var folded = text.toLowerCase().normalize('NFKD').replace(/[\u0300-\u036f]/g, '');
+        return (folded.match(/[\p{L}\p{N}]+/gu) || []).filter(function (w) { return w.length >= 2; });
+    }
+
+    function matches(word) {
+        return load('t/' + encodeURIComponent(word.slice(0, meta.prefix)) + '.json').then(function (shard) {
+            var ids = new Set();
+            Object.keys(shard).forEach(function (term) {
+                if (term.lastIndexOf(word, 0) === 0) {
+                    shard[term].forEach(function (id) { ids.add(id); });
+                }
+            });
+            return ids;
+        });
+    }
+
+    function render(hits) {
+        results.textContent = '';
+        hits.forEach(function (doc) {
+            var li = document.createElement('li');
+            var a = document.createElement('a');
+            a.href = doc[1];
+            a.textContent = doc[0];
+            li.appendChild(a);
+            li.appendChild(document.createTextNode(' (' + doc[2] + ')'));
+            results.appendChild(li);
+        });
+    }
+
+    function search() {
+        var seq = ++latest;
+        var query = words(input.value);
+        if (!query.length) {
+            render([]);
+            return;
+        }
+        load('meta.json').then(function (m) {
+            meta = m;
+            return Promise.all(query.map(matches));
+        }).then(function (sets) {
+            var ids = Array.from(sets[0]).filter(function (id) {
+                return sets.every(function (s) { return s.has(id); });
+            }).sort(function (a, b) { return b - a; }).slice(0, 20);
+            return Promise.all(ids.map(function (id) {
+                return load('d/' + Math.floor(id / meta.block) + '.json').then(function (block) {
+                    return block[id];
+                });
+            }));
+        }).then(function (hits) {
+            if (seq === latest) {
+                render(hits.filter(Boolean));
+            }
+        });
+    }
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(search, 120);
+    });
+})();
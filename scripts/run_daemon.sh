@@ -0,0 +1,8 @@
+#!/bin/bash
+# Long-running alternative to the cron entry for run_pipeline.sh: one warm
+# process publishes on the schedule below, catches up slots missed while it was
+# down, and commits/pushes after each run. Health: logs/content_creator.status.json
+cd /home/miki/AI
+source /home/miki/AI/venv/bin/activate
+exec python3 /home/miki/AI/agents/content_creator.py --daemon --schedule "0 12 * * *" --jitter 300 --git \
+    >> /home/miki/AI/logs/cron.log 2>&1
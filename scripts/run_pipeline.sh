@@ -2,6 +2,9 @@
 cd /home/miki/AI
 source /home/miki/AI/venv/bin/activate
 python3 /home/miki/AI/agents/content_creator.py
-git add .
-git commit -m "feat: Add new article (automated)"
-git push origin main
+# Stage only what this run wrote instead of re-scanning the whole tree.
+if [ -s logs/changed_files.txt ]; then
+    git add --pathspec-from-file=logs/changed_files.txt logs/content_creator.log
+    git commit -m "feat: Add new article (automated)"
+    git push origin main
+fi
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark for youtube_uploader.py against fake_youtube.py.
+
+Usage: python3 bench_uploader.py [--files 40] [--size-mb 8] [--folders 4] [--workers 2]
+                                 [--chunk-mb 4] [--latency 0.02] [--bandwidth-mb 0]
+                                 [--error-rate 0] [--quota 1000000] [--per-folder]
+
+A synthetic library (--files videos of about --size-mb MB each, spread over
+--folders subfolders, with unique content and old mtimes so they are picked up
+by the startup scan) is written to a scratch directory. The uploader runs there
+as a subprocess, with a generated config.ini pointing it at an in-process fake
+API, until every video is uploaded and in a playlist (or --timeout passes).
+
+Reported: files/s and MB/s (from start to the last upload), time to first
+upload, the uploader's peak RSS and the quota units and HTTP requests the
+fake API saw. Each run is appended to --results together with the git version,
+and earlier runs of the same workload are shown for comparison.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import signal
+import argparse
+import tempfile
+import subprocess
+
+from fake_youtube import FakeYouTube
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+UPLOADER = os.path.join(HERE, 'youtube_uploader.py')
+BLOCK_SIZE = 64 * 1024
+# Parameters that define a workload; runs are only compared when all of them match.
+WORKLOAD_KEYS = ('files', 'size_mb', 'folders', 'workers', 'chunk_mb', 'latency', 'bandwidth_mb',
+                 'error_rate', 'quota', 'per_folder')
+
+
+def make_library(root, files, size_mb, folders, seed=1):
+    """Writes the synthetic videos; returns their total size in bytes."""
+    rng = random.Random(seed)
+    total = 0
+    for index in range(files):
+        folder = os.path.join(root, f"folder-{index % folders:02d}")
+        os.makedirs(folder, exist_ok=True)
+        size = int(size_mb * 1e6 * rng.uniform(0.5, 1.5))
+        # One random block per file, repeated: cheap to write, and every sampled block differs between files.
+        block = rng.randbytes(BLOCK_SIZE)
+        path = os.path.join(folder, f"video-{index:04d}.mp4")
+        with open(path, 'wb') as f:
+            for _ in range(size // BLOCK_SIZE):
+                f.write(block)
+            f.write(block[:size % BLOCK_SIZE])
+        old = time.time() - 3600
+        os.utime(path, (old, old))
+        total += size
+    return total
+
+
+def write_config(workdir, library, endpoint, args):
+    config = f"""[YouTube]
+privacy_status = private
+category_id = 22
+api_endpoint = {endpoint}
+anonymous = true
+playlist_per_folder = {str(args.per_folder).lower()}
+
+[Paths]
+watch_folder = {library}
+log_file = uploader.log
+
+[Files]
+client_secrets = client_secret.json
+token = token.json
+
+[Uploader]
+stable_seconds = 2
+workers = {args.workers}
+chunk_size_mb = {args.chunk_mb}
+max_attempts = 20
+retry_backoff_seconds = 1
+max_backoff_seconds = 5
+playlist_batch_seconds = 1
+
+[Quota]
+daily_limit = {args.quota}
+"""
+    with open(os.path.join(workdir, 'config.ini'), 'w') as f:
+        f.write(config)
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='bench_uploader_', dir=args.workdir)
+    library = os.path.join(workdir, 'library')
+    total_bytes = make_library(library, args.files, args.size_mb, args.folders)
+    api = FakeYouTube(latency=args.latency, bandwidth=args.bandwidth_mb * 1e6, error_rate=args.error_rate,
+                      quota=args.quota).start()
+    write_config(workdir, library, api.endpoint, args)
+
+    started = time.time()
+    process = subprocess.Popen([sys.executable, UPLOADER], cwd=workdir,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = started + args.timeout
+    stats = api.snapshot()
+    while time.time() < deadline and process.poll() is None:
+        stats = api.snapshot()
+        if stats['uploads_completed'] >= args.files and stats['playlist_items'] >= args.files:
+            break
+        time.sleep(0.1)
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+    try:
+        _, _, usage = os.wait4(process.pid, 0)
+        peak_rss_mb = usage.ru_maxrss / 1024
+    except ChildProcessError:
+        peak_rss_mb = None
+    process.returncode = process.returncode if process.returncode is not None else 0
+    stats = api.snapshot()
+    api.stop()
+
+    last = stats['last_upload_at'] or time.time()
+    seconds = max(last - started, 1e-6)
+    result = {
+        'version': git_version(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'files': args.files, 'size_mb': args.size_mb, 'folders': args.folders, 'workers': args.workers,
+        'chunk_mb': args.chunk_mb, 'latency': args.latency, 'bandwidth_mb': args.bandwidth_mb,
+        'error_rate': args.error_rate, 'quota': args.quota, 'per_folder': args.per_folder,
+        'completed': stats['uploads_completed'] >= args.files and stats['playlist_items'] >= args.files,
+        'uploaded': stats['uploads_completed'],
+        'playlist_items': stats['playlist_items'],
+        'seconds': round(seconds, 3),
+        'files_per_s': round(stats['uploads_completed'] / seconds, 3),
+        'mb_per_s': round(stats['upload_bytes'] / 1e6 / seconds, 2),
+        'first_upload_s': round(stats['first_upload_at'] - started, 3) if stats['first_upload_at'] else None,
+        'peak_rss_mb': round(peak_rss_mb, 1) if peak_rss_mb is not None else None,
+        'quota_units': stats['quota_used'],
+        'quota_per_video': round(stats['quota_used'] / max(stats['uploads_completed'], 1), 1),
+        'http_requests': stats['http_requests'],
+        'api_calls': stats['api_calls'],
+        'errors_injected': stats['errors_injected'],
+        'input_mb': round(total_bytes / 1e6, 1),
+    }
+    if args.keep:
+        print(f"Kept scratch directory {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=40)
+    parser.add_argument('--size-mb', type=float, default=8, help='Average video size in MB (sizes vary +/-50%%).')
+    parser.add_argument('--folders', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--chunk-mb', type=float, default=4)
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds added to every API request.')
+    parser.add_argument('--bandwidth-mb', type=float, default=0, help='Upload bandwidth cap in MB/s (0: none).')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of API requests answered with 503.')
+    parser.add_argument('--quota', type=int, default=1000000, help='Daily quota of both the fake API and the uploader.')
+    parser.add_argument('--per-folder', action='store_true', help='One playlist per folder.')
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--workdir', default=None, help='Where to create the scratch directory.')
+    parser.add_argument('--keep', action='store_true', help="Don't delete the scratch directory (for its uploader.log).")
+    parser.add_argument('--results', default=os.path.join(HERE, 'bench_results.jsonl'),
+                        help='JSON lines file each run is appended to.')
+    args = parser.parse_args()
+
+    result = run(args)
+    previous = [r for r in load_results(args.results) if all(r.get(k) == result[k] for k in WORKLOAD_KEYS)]
+    with open(args.results, 'a') as f:
+        f.write(json.dumps(result) + '\n')
+
+    print(f"{'version':<16} {'date':<19} {'done':>5} {'files/s':>8} {'MB/s':>8} {'first s':>8} "
+          f"{'RSS MB':>7} {'quota':>8} {'q/video':>8} {'requests':>9}")
+    for r in previous[-5:] + [result]:
+        first = f"{r['first_upload_s']:.2f}" if r['first_upload_s'] is not None else '-'
+        rss = f"{r['peak_rss_mb']:.1f}" if r['peak_rss_mb'] is not None else '-'
+        print(f"{r['version']:<16} {r['date']:<19} {r['uploaded']:>5} {r['files_per_s']:>8.2f} {r['mb_per_s']:>8.2f} "
+              f"{first:>8} {rss:>7} {r['quota_units']:>8} {r['quota_per_video']:>8.1f} {r['http_requests']:>9}")
+    if not result['completed']:
+        print(f"Only {result['uploaded']} of {result['files']} videos were uploaded before the run ended.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the part of the YouTube Data API the uploader uses.
+
+Usage: python3 fake_youtube.py [--port 8766] [--latency 0.05] [--bandwidth-mb 50]
+                               [--error-rate 0.05] [--quota 10000]
+then set, in config.ini:  [YouTube] api_endpoint = http://127.0.0.1:8766/
+                                     anonymous = true
+
+Implemented: resumable videos.insert (session start, chunk PUTs, status
+queries), playlists.list (paginated), playlists.insert, playlistItems.insert
+and batch requests. Quota units are charged per call like the real API and a
+403 quotaExceeded is returned once --quota is spent. Every request waits
+--latency seconds, upload bodies are read no faster than --bandwidth-mb MB/s
+(shared by all connections, like one uplink) and an --error-rate fraction of
+requests gets a 503 backendError. Nothing is stored but counters and IDs.
+GET /_fake/stats returns the counters as JSON; they are also printed on exit.
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.parse
+from email.parser import Parser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUOTA_COSTS = {
+    "videos.insert": 1600,
+    "playlistItems.insert": 50,
+    "playlists.list": 1,
+    "playlists.insert": 50,
+}
+READ_BLOCK = 64 * 1024
+_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+)|bytes \*/(\d+)")
+
+
+class ApiError(Exception):
+    def __init__(self, status, reason, message=""):
+        super().__init__(message or reason)
+        self.status = status
+        self.reason = reason
+
+    def body(self):
+        return {"error": {"code": self.status, "message": str(self),
+                          "errors": [{"reason": self.reason, "message": str(self)}]}}
+
+
+class FakeYouTube:
+    """The fake API's state and fault settings; start() serves it from a background thread."""
+    def __init__(self, port=0, latency=0.0, bandwidth=0.0, error_rate=0.0, quota=10000, page_size_limit=50):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.quota = quota
+        self.page_size_limit = page_size_limit
+        self.lock = threading.Lock()
+        self.uplink_free_at = 0.0
+        self.sessions = {}
+        self.videos = {}
+        self.playlists = {}
+        self.playlist_items = []
+        self.counter = 0
+        self.stats = {
+            "http_requests": 0, "api_calls": {}, "quota_used": 0, "errors_injected": 0, "quota_rejected": 0,
+            "uploads_completed": 0, "upload_bytes": 0, "playlist_items": 0, "first_upload_at": None,
+            "last_upload_at": None, "started_at": time.time(),
+        }
+        handler = type("Handler", (FakeYouTubeHandler,), {"api": self})
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-youtube", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+    def _new_id(self, prefix):
+        self.counter += 1
+        return f"{prefix}{self.counter:06d}"
+
+    def pace(self, length):
+        """Sleeps so that upload bytes arrive no faster than the configured bandwidth."""
+        if not self.bandwidth:
+            return
+        with self.lock:
+            start = max(time.monotonic(), self.uplink_free_at)
+            self.uplink_free_at = start + length / self.bandwidth
+            done_at = self.uplink_free_at
+        time.sleep(max(0.0, done_at - time.monotonic()))
+
+    def inject_fault(self):
+        if self.error_rate and random.random() < self.error_rate:
+            with self.lock:
+                self.stats["errors_injected"] += 1
+            raise ApiError(503, "backendError", "Injected backend error.")
+
+    def charge(self, call):
+        cost = QUOTA_COSTS[call]
+        with self.lock:
+            calls = self.stats["api_calls"]
+            calls[call] = calls.get(call, 0) + 1
+            if self.stats["quota_used"] + cost > self.quota:
+                self.stats["quota_rejected"] += 1
+                raise ApiError(403, "quotaExceeded", "The request cannot be completed because you have exceeded your quota.")
+            self.stats["quota_used"] += cost
+
+    # --- API methods: each returns (status, headers, body dict) ---
+
+    def playlists_list(self, query):
+        self.charge("playlists.list")
+        size = min(int(query.get("maxResults", 5)), self.page_size_limit)
+        offset = int(query.get("pageToken") or 0)
+        with self.lock:
+            items = [{"kind": "youtube#playlist", "id": playlist_id, "snippet": {"title": title}}
+                     for playlist_id, title in self.playlists.items()]
+        body = {"kind": "youtube#playlistListResponse", "items": items[offset:offset + size],
+                "pageInfo": {"totalResults": len(items), "resultsPerPage": size}}
+        if offset + size < len(items):
+            body["nextPageToken"] = str(offset + size)
+        return 200, {}, body
+
+    def playlists_insert(self, body):
+        self.charge("playlists.insert")
+        title = body["snippet"]["title"]
+        with self.lock:
+            playlist_id = self._new_id("PL")
+            self.playlists[playlist_id] = title
+        return 200, {}, {"kind": "youtube#playlist", "id": playlist_id, "snippet": body["snippet"]}
+
+    def playlist_items_insert(self, body):
+        self.charge("playlistItems.insert")
+        snippet = body["snippet"]
+        with self.lock:
+            if snippet["playlistId"] not in self.playlists:
+                raise ApiError(404, "playlistNotFound", "Playlist not found.")
+            if snippet["resourceId"]["videoId"] not in self.videos:
+                raise ApiError(404, "videoNotFound", "Video not found.")
+            item_id = self._new_id("PLI")
+            self.playlist_items.append((snippet["playlistId"], snippet["resourceId"]["videoId"]))
+            self.stats["playlist_items"] += 1
+        return 200, {}, {"kind": "youtube#playlistItem", "id": item_id, "snippet": snippet}
+
+    def videos_insert_start(self, headers, body):
+        self.charge("videos.insert")
+        size = int(headers.get("X-Upload-Content-Length", 0))
+        with self.lock:
+            upload_id = self._new_id("UP")
+            self.sessions[upload_id] = {"size": size, "received": 0, "body": body}
+        location = f"{self.endpoint}upload/youtube/v3/videos?uploadType=resumable&upload_id={upload_id}"
+        return 200, {"Location": location}, {}
+
+    def videos_insert_chunk(self, upload_id, content_range, read_body):
+        """Takes one chunk (or a status query) for an upload session."""
+        with self.lock:
+            session = self.sessions.get(upload_id)
+        if session is None:
+            raise ApiError(404, "notFound", "Upload session not found.")
+        match = _RANGE_RE.match(content_range or "")
+        if not match:
+            raise ApiError(400, "badRequest", f"Bad Content-Range '{content_range}'.")
+        if match.group(1) is not None:
+            start = int(match.group(1))
+            if start != session["received"]:
+                # Out of order; tell the client where to continue, like the real service.
+                read_body()
+                return self._session_status(session)
+            length = read_body()
+            with self.lock:
+                session["received"] = start + length
+                self.stats["upload_bytes"] += length
+        return self._session_status(session)
+
+    def _session_status(self, session):
+        if session["received"] < session["size"]:
+            headers = {"Range": f"bytes=0-{session['received'] - 1}"} if session["received"] else {}
+            return 308, headers, None
+        with self.lock:
+            if "video_id" not in session:
+                session["video_id"] = self._new_id("VID")
+                self.videos[session["video_id"]] = session["body"].get("snippet", {}).get("title")
+                now = time.time()
+                self.stats["uploads_completed"] += 1
+                self.stats["first_upload_at"] = self.stats["first_upload_at"] or now
+                self.stats["last_upload_at"] = now
+        return 200, {}, {"kind": "youtube#video", "id": session["video_id"], "snippet": session["body"].get("snippet")}
+
+    def dispatch(self, method, path, headers, read_body):
+        """Routes one API request (also used for each part of a batch)."""
+        parsed = urllib.parse.urlparse(path)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        route = parsed.path.rstrip("/")
+        self.inject_fault()
+
+        def json_body():
+            raw = read_body(buffered=True)
+            return json.loads(raw or b"{}")
+
+        if route == "/youtube/v3/playlists" and method == "GET":
+            return self.playlists_list(query)
+        if route == "/youtube/v3/playlists" and method == "POST":
+            return self.playlists_insert(json_body())
+        if route == "/youtube/v3/playlistItems" and method == "POST":
+            return self.playlist_items_insert(json_body())
+        if route == "/upload/youtube/v3/videos" and method == "POST" and query.get("uploadType") == "resumable":
+            return self.videos_insert_start(headers, json_body())
+        if route == "/upload/youtube/v3/videos" and method == "PUT" and "upload_id" in query:
+            return self.videos_insert_chunk(query["upload_id"], headers.get("Content-Range"), read_body)
+        raise ApiError(404, "notFound", f"{method} {parsed.path} is not implemented by the fake server.")
+
+    def call(self, method, path, headers, read_body):
+        try:
+            return self.dispatch(method, path, headers, read_body)
+        except ApiError as e:
+            return e.status, {}, e.body()
+
+    def batch(self, content_type, payload):
+        """Runs every part of a multipart/mixed batch request; returns the multipart response."""
+        message = Parser().parsestr(f"Content-Type: {content_type}\r\n\r\n{payload}")
+        boundary = f"batch_{random.getrandbits(64):016x}"
+        parts = []
+        for part in message.get_payload():
+            request_line, rest = part.get_payload().split("\n", 1)
+            method, path, _ = request_line.strip().split(" ", 2)
+            inner = Parser().parsestr(rest)
+            body = (inner.get_payload() or "").encode("utf-8")
+            status, _, reply = self.call(method, path, inner, lambda buffered=False: body)
+            reply_text = json.dumps(reply) if reply is not None else ""
+            parts.append(f"--{boundary}\r\nContent-Type: application/http\r\n"
+                         f"Content-ID: <response-{part['Content-ID'][1:-1]}>\r\n\r\n"
+                         f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                         f"Content-Type: application/json; charset=UTF-8\r\n\r\n{reply_text}\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(parts) + f"--{boundary}--\r\n"
+
+
+class FakeYouTubeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    api = None
+
+    def _read_body(self, buffered=False):
+        """Reads the request body; returns it (buffered) or just its length, pacing uploads to the bandwidth cap."""
+        remaining = int(self.headers.get("Content-Length", 0))
+        chunks, total = [], 0
+        while remaining:
+            block = self.rfile.read(min(READ_BLOCK, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            total += len(block)
+            if buffered:
+                chunks.append(block)
+            else:
+                self.api.pace(len(block))
+        return b"".join(chunks) if buffered else total
+
+    def _reply(self, status, headers, body, content_type="application/json; charset=UTF-8"):
+        data = body.encode("utf-8") if isinstance(body, str) else (json.dumps(body).encode("utf-8") if body is not None else b"")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        api = self.api
+        with api.lock:
+            api.stats["http_requests"] += 1
+        if api.latency:
+            time.sleep(api.latency)
+        if self.path == "/_fake/stats":
+            self._reply(200, {}, api.snapshot())
+            return
+        if self.path.rstrip("/") == "/batch" and self.command == "POST":
+            payload = self._read_body(buffered=True).decode("utf-8")
+            content_type, reply = api.batch(self.headers["Content-Type"], payload)
+            self._reply(200, {}, reply, content_type=content_type)
+            return
+        read = []
+
+        def read_body(buffered=False):
+            read.append(True)
+            return self._read_body(buffered)
+
+        status, headers, body = api.call(self.command, self.path, self.headers, read_body)
+        if not read:
+            # Keep the connection usable when a request was rejected before its body was read.
+            self._read_body()
+        self._reply(status, headers, body)
+
+    do_GET = do_POST = do_PUT = _handle
+
+    def log_message(self, *_):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request.")
+    parser.add_argument("--bandwidth-mb", type=float, default=0.0, help="Upload bandwidth cap in MB/s (0: none).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503.")
+    parser.add_argument("--quota", type=int, default=10000, help="Quota units before quotaExceeded.")
+    args = parser.parse_args()
+    api = FakeYouTube(args.port, args.latency, args.bandwidth_mb * 1e6, args.error_rate, args.quota)
+    print(f"Fake YouTube API listening on {api.endpoint}")
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.server.server_close()
+        print(json.dumps(api.snapshot(), indent=1))
+
+
+if __name__ == "__main__":
+    main()
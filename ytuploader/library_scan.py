@@ -0,0 +1,124 @@
+"""
+Incremental, parallel scan of the video library.
+
+Directories are listed with os.scandir, whose entries already say whether they
+are directories (no extra syscall) and, for video files, carry the one stat
+call the scan needs. Subtrees are walked concurrently on a thread pool, since
+on network and WSL mounts each directory listing is dominated by latency.
+
+The entries of every directory are cached on disk together with the
+directory's mtime. On the next start a directory whose mtime is unchanged costs
+a single stat: its cached file list is reused and only its subdirectories are
+visited. Adding, removing or renaming a file changes its directory's mtime, so
+new videos are always found; a file rewritten in place is picked up by the
+watcher instead.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Stat-like record for a scanned video, so it can be passed wherever a stat result is used.
+ScannedFile = namedtuple('ScannedFile', 'path st_size st_mtime_ns st_ctime')
+
+
+class ScanResult:
+    def __init__(self):
+        self.files = []
+        self.directories = 0
+        self.rescanned = 0
+        self.seconds = 0.0
+
+    def describe(self):
+        return (f"{len(self.files)} videos in {self.directories} directories "
+                f"({self.rescanned} listed, {self.directories - self.rescanned} from cache) in {self.seconds:.2f}s")
+
+
+class LibraryScanner:
+    """Finds video files under a root directory, reusing the cached listing of unchanged directories."""
+    def __init__(self, cache_path, extensions, excluded_dirs=('unsorted',), workers=8):
+        self.cache_path = cache_path
+        self.extensions = {ext.lower() for ext in extensions}
+        self.excluded_dirs = set(excluded_dirs)
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.cache = {}
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    self.cache = json.load(f)
+            except (OSError, ValueError):
+                logging.warning(f"Ignoring unreadable scan cache '{cache_path}'.")
+
+    def _is_video(self, name):
+        return os.path.splitext(name)[1].lower() in self.extensions
+
+    def _list(self, directory):
+        """Returns (subdirectory paths, [[name, size, mtime_ns, ctime]], listed) for one directory."""
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return [], [], False
+        cached = self.cache.get(directory)
+        if cached and cached['mtime_ns'] == mtime_ns:
+            return [os.path.join(directory, name) for name in cached['dirs']], cached['files'], False
+
+        dirs, files = [], []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in self.excluded_dirs:
+                                dirs.append(entry.name)
+                        elif self._is_video(entry.name):
+                            stat = entry.stat()
+                            files.append([entry.name, stat.st_size, stat.st_mtime_ns, stat.st_ctime])
+                    except OSError:
+                        continue
+        except OSError as e:
+            logging.warning(f"Could not list '{directory}': {e}")
+            return [], [], True
+        with self.lock:
+            self.cache[directory] = {'mtime_ns': mtime_ns, 'dirs': dirs, 'files': files}
+        return [os.path.join(directory, name) for name in dirs], files, True
+
+    def scan(self, root):
+        """Walks root; returns a ScanResult whose files are ScannedFile records."""
+        start = time.perf_counter()
+        result = ScanResult()
+        seen = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {pool.submit(self._list, root): root}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    directory = pending.pop(future)
+                    seen.add(directory)
+                    subdirs, files, listed = future.result()
+                    result.directories += 1
+                    result.rescanned += listed
+                    result.files.extend(ScannedFile(os.path.join(directory, name), size, mtime_ns, ctime)
+                                        for name, size, mtime_ns, ctime in files)
+                    for subdir in subdirs:
+                        pending[pool.submit(self._list, subdir)] = subdir
+
+        # Drop directories that no longer exist under this root.
+        prefix = os.path.join(root, '')
+        with self.lock:
+            for directory in [d for d in self.cache if (d == root or d.startswith(prefix)) and d not in seen]:
+                del self.cache[directory]
+        self.save()
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def save(self):
+        if not self.cache_path:
+            return
+        temp_path = f"{self.cache_path}.tmp"
+        with self.lock, open(temp_path, 'w') as f:
+            json.dump(self.cache, f, separators=(',', ':'))
+        os.replace(temp_path, self.cache_path)
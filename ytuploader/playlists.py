@@ -0,0 +1,154 @@
+"""
+Playlist lookups and batched playlist inserts.
+
+    PlaylistCache      playlist title -> ID, kept in a JSON file. The channel's
+                       playlists are listed (every page of them) only when a
+                       title is missing from the cache and the last listing is
+                       older than max_age, so a normal start costs no API calls
+                       and an existing playlist is never created twice.
+    PlaylistItemQueue  uploaded videos waiting to be added to their playlist.
+                       They are handed out in batches of up to batch_size, or
+                       sooner once the oldest has waited max_delay seconds, and
+                       each batch is sent as one batch HTTP request.
+"""
+import os
+import json
+import time
+import logging
+import threading
+
+DEFAULT_MAX_AGE = 24 * 3600
+# The largest page playlists.list returns.
+PAGE_SIZE = 50
+# YouTube accepts at most 50 calls in one batch request.
+MAX_BATCH_SIZE = 50
+
+
+class PlaylistCache:
+    """Thread-safe title -> playlist ID map, refreshed from the API on a miss."""
+    def __init__(self, path, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        # Held across API calls, so two workers never create the same playlist.
+        self.lock = threading.RLock()
+        self.titles = {}
+        self.refreshed = 0.0
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    state = json.load(f)
+                self.titles = state.get('titles', {})
+                self.refreshed = state.get('refreshed', 0.0)
+            except (OSError, ValueError):
+                logging.warning(f"Ignoring unreadable playlist cache '{path}'.")
+
+    def _save(self):
+        if not self.path:
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'refreshed': self.refreshed, 'titles': self.titles}, f, indent=1)
+        os.replace(temp_path, self.path)
+
+    def get(self, title):
+        with self.lock:
+            return self.titles.get(title)
+
+    def list_pages(self):
+        """How many playlists.list pages a refresh is expected to take."""
+        with self.lock:
+            return len(self.titles) // PAGE_SIZE + 1
+
+    def forget(self, playlist_id):
+        """Drops a playlist that turned out not to exist any more, so it is looked up again."""
+        with self.lock:
+            for title in [t for t, i in self.titles.items() if i == playlist_id]:
+                del self.titles[title]
+            self.refreshed = 0.0
+            self._save()
+
+    def refresh(self, youtube, charge=None):
+        """Lists all of the channel's playlists, page by page; returns the number of pages fetched."""
+        titles, page_token, pages = {}, None, 0
+        with self.lock:
+            while True:
+                response = youtube.playlists().list(part='snippet', mine=True, maxResults=PAGE_SIZE,
+                                                    pageToken=page_token).execute()
+                pages += 1
+                if charge:
+                    charge('playlists.list')
+                for playlist in response.get('items', []):
+                    # With duplicate titles, the first listed playlist wins.
+                    titles.setdefault(playlist['snippet']['title'], playlist['id'])
+                page_token = response.get('nextPageToken')
+                if not page_token:
+                    break
+            self.titles = titles
+            self.refreshed = time.time()
+            self._save()
+        logging.info(f"Listed {len(titles)} playlists ({pages} page(s)).")
+        return pages
+
+    def get_or_create(self, youtube, title, privacy_status, charge=None):
+        """Returns the ID of the playlist called title, creating it if the channel has none."""
+        with self.lock:
+            playlist_id = self.titles.get(title)
+            if playlist_id:
+                return playlist_id
+            if time.time() - self.refreshed > self.max_age:
+                self.refresh(youtube, charge)
+                playlist_id = self.titles.get(title)
+                if playlist_id:
+                    logging.info(f"Found existing playlist: '{title}' (ID: {playlist_id})")
+                    return playlist_id
+
+            logging.info(f"Creating new playlist: '{title}'")
+            playlist_body = {
+                'snippet': {'title': title, 'description': f'A playlist for {title}'},
+                'status': {'privacyStatus': privacy_status}
+            }
+            new_playlist = youtube.playlists().insert(part='snippet,status', body=playlist_body).execute()
+            if charge:
+                charge('playlists.insert')
+            self.titles[title] = new_playlist['id']
+            self._save()
+            logging.info(f"Successfully created playlist: '{title}' (ID: {new_playlist['id']})")
+            return new_playlist['id']
+
+
+class PlaylistItemQueue:
+    """Uploaded videos not yet added to a playlist, handed out in batches."""
+    def __init__(self, batch_size=MAX_BATCH_SIZE, max_delay=60.0):
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.items = {}
+        self.oldest = None
+
+    def __len__(self):
+        with self.lock:
+            return len(self.items)
+
+    def add(self, video_id, path):
+        with self.lock:
+            if not self.items:
+                self.oldest = time.monotonic()
+            self.items.setdefault(video_id, path)
+
+    def take_batches(self, force=False):
+        """Returns the waiting items as lists of {'video_id', 'path'} dicts.
+
+        Full batches are always returned; the remainder only once the oldest item
+        has waited max_delay seconds (or when force is set).
+        """
+        with self.lock:
+            items = [{'video_id': video_id, 'path': path} for video_id, path in self.items.items()]
+            due = force or (items and time.monotonic() - self.oldest >= self.max_delay)
+            count = len(items) if due else len(items) - len(items) % self.batch_size
+            if not count:
+                return []
+            batches = [items[start:start + self.batch_size] for start in range(0, count, self.batch_size)]
+            for item in items[:count]:
+                del self.items[item['video_id']]
+            self.oldest = time.monotonic() if self.items else None
+            return batches
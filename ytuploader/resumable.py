@@ -0,0 +1,169 @@
+"""
+Chunked resumable uploads that survive restarts.
+
+    ChunkedFileUpload   MediaUpload that reads each chunk with readinto() into
+                        one reused buffer and hands it to the HTTP layer as a
+                        memoryview, so a multi-GB upload allocates one chunk's
+                        worth of memory in total
+    UploadJournal       on-disk record of every upload in progress: session
+                        URI, bytes acknowledged by the server and the identity
+                        of the file, written after every acknowledged chunk
+    query_upload_status asks the server how much of a session it already has
+    UploadProgress      per-upload byte counts and throughput for logging
+
+A session URI stays valid for about a week, so a restart, a network drop or a
+wait for the quota reset continues from the last acknowledged byte instead of
+starting over.
+"""
+import os
+import json
+import time
+import threading
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaUpload
+
+# Resumable chunks must be a multiple of 256 KiB (except the last one).
+CHUNK_GRANULARITY = 256 * 1024
+DEFAULT_CHUNK_SIZE = 32 * 1024 * 1024
+# Sessions expire after a week on the server side; don't try ones close to that.
+SESSION_MAX_AGE = 6 * 24 * 3600
+
+
+def chunk_size_from_mb(megabytes):
+    """Rounds a chunk size in MB to a valid resumable chunk size."""
+    size = int(megabytes * 1024 * 1024)
+    return max(CHUNK_GRANULARITY, size - size % CHUNK_GRANULARITY)
+
+
+def file_identity(path):
+    """Cheap identity of a file's current content: size, modification time and inode."""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'inode': stat.st_ino}
+
+
+class ChunkedFileUpload(MediaUpload):
+    """Resumable upload of a file in fixed-size chunks, read into a caller-provided reusable buffer."""
+    def __init__(self, path, chunksize, mimetype='application/octet-stream', buffer=None):
+        super().__init__()
+        self._fd = open(path, 'rb')
+        self._size = os.fstat(self._fd.fileno()).st_size
+        self._chunksize = chunksize
+        self._mimetype = mimetype
+        if buffer is None or len(buffer) < chunksize:
+            buffer = bytearray(chunksize)
+        self._view = memoryview(buffer)
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        return self._size
+
+    def resumable(self):
+        return True
+
+    def has_stream(self):
+        return False
+
+    def getbytes(self, begin, length):
+        self._fd.seek(begin)
+        read = self._fd.readinto(self._view[:length])
+        return self._view[:read]
+
+    def close(self):
+        self._fd.close()
+
+
+class UploadJournal:
+    """Uploads in progress, keyed by file path, persisted as one JSON file."""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.sessions = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.sessions = json.load(f)
+            except (OSError, ValueError):
+                self.sessions = {}
+
+    def _save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.sessions, f, indent=1)
+        os.replace(temp_path, self.path)
+
+    def get(self, file_path, identity):
+        """Returns the session record for a file if it is still usable (same file content, not expired)."""
+        with self.lock:
+            record = self.sessions.get(file_path)
+            if not record:
+                return None
+            if record['identity'] != identity or time.time() - record['started'] > SESSION_MAX_AGE:
+                del self.sessions[file_path]
+                self._save()
+                return None
+            return dict(record)
+
+    def update(self, file_path, identity, session_uri, acknowledged, started=None):
+        with self.lock:
+            record = self.sessions.get(file_path) or {'started': started or time.time()}
+            record.update(identity=identity, uri=session_uri, acknowledged=acknowledged, updated=time.time())
+            self.sessions[file_path] = record
+            self._save()
+
+    def remove(self, file_path):
+        with self.lock:
+            if self.sessions.pop(file_path, None) is not None:
+                self._save()
+
+
+def query_upload_status(http, session_uri, size):
+    """Asks the server how far a resumable session got.
+
+    Returns ('incomplete', bytes acknowledged), ('complete', response body) or
+    ('expired', None) when the session no longer exists.
+    """
+    headers = {'Content-Range': f'bytes */{size}', 'Content-Length': '0'}
+    response, content = http.request(session_uri, 'PUT', headers=headers)
+    if response.status in (200, 201):
+        return 'complete', json.loads(content)
+    if response.status == 308:
+        if 'range' not in response:
+            return 'incomplete', 0
+        return 'incomplete', int(response['range'].rsplit('-', 1)[1]) + 1
+    if response.status in (404, 410):
+        return 'expired', None
+    raise HttpError(response, content, uri=session_uri)
+
+
+class UploadProgress:
+    """Throughput bookkeeping for one upload."""
+    def __init__(self, total, resumed_from=0):
+        self.total = total
+        self.resumed_from = resumed_from
+        self.acknowledged = resumed_from
+        self.started = time.monotonic()
+
+    def update(self, acknowledged):
+        self.acknowledged = acknowledged
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        """Bytes per second sent in this run (bytes from an earlier run don't count)."""
+        return (self.acknowledged - self.resumed_from) / max(self.elapsed, 1e-6)
+
+    def describe(self):
+        percent = 100 * self.acknowledged / self.total if self.total else 100
+        rate = self.rate
+        eta = (self.total - self.acknowledged) / rate if rate else 0
+        return (f"{percent:.0f}% ({self.acknowledged / 1e6:.1f}/{self.total / 1e6:.1f} MB) "
+                f"at {rate / 1e6:.2f} MB/s, ETA {eta:.0f}s")
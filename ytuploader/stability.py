@@ -0,0 +1,177 @@
+"""
+Detects when new files have finished being written.
+
+A file is released to the upload queue once its size and mtime have stayed the
+same for `quiet_seconds`. One poller thread tracks any number of files, each
+with its own adaptive interval:
+
+    still growing       the interval doubles (up to max_interval), since a
+                        big copy won't finish in the next second
+    unchanged           the next check is when the quiet period ends
+    closed / renamed    an inotify close-after-write or a rename from a
+                        temporary name usually means the copy is done, so the
+                        file is checked again right away
+
+Watcher events keep the state current between polls: modifications restart the
+quiet period, and renames move the tracking to the new name. Files still under
+a partial-copy temporary name (see TEMP_PATTERNS) are never released.
+"""
+import os
+import time
+import heapq
+import fnmatch
+import logging
+import threading
+
+TEMP_PATTERNS = ('*.part', '*.partial', '*.crdownload', '*.download', '*.tmp', '*.temp', '*~',
+                 '.~*', '.*.??????', '*.!sync', '*.filepart')
+
+
+def is_temporary_name(path):
+    name = os.path.basename(path)
+    return any(fnmatch.fnmatch(name, pattern) for pattern in TEMP_PATTERNS)
+
+
+class _Tracked:
+    __slots__ = ('size', 'mtime_ns', 'quiet_since', 'interval', 'due', 'generation')
+
+    def __init__(self, stat, now, interval):
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.quiet_since = now
+        self.interval = interval
+        self.due = now
+        self.generation = 0
+
+
+class StabilityTracker:
+    """Calls on_stable(path) from its own thread once a tracked file stops changing."""
+    def __init__(self, on_stable, quiet_seconds=5.0, initial_interval=1.0, max_interval=30.0):
+        self.on_stable = on_stable
+        self.quiet_seconds = quiet_seconds
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.condition = threading.Condition()
+        self.files = {}
+        self.schedule = []
+        self.stopping = False
+        self.thread = None
+        self.released = 0
+
+    def __len__(self):
+        with self.condition:
+            return len(self.files)
+
+    def _schedule(self, path, entry, due):
+        entry.due = due
+        entry.generation += 1
+        heapq.heappush(self.schedule, (due, entry.generation, path))
+        self.condition.notify()
+
+    def track(self, path, stat=None):
+        """Starts watching path; a file untouched for quiet_seconds already is released straight away."""
+        if is_temporary_name(path):
+            return
+        try:
+            stat = stat or os.stat(path)
+        except OSError:
+            return
+        now = time.time()
+        if now - stat.st_mtime >= self.quiet_seconds:
+            self._release(path)
+            return
+        with self.condition:
+            if path in self.files:
+                return
+            entry = self.files[path] = _Tracked(stat, now, self.initial_interval)
+            # Count the quiet period from the last write, not from when we noticed the file.
+            entry.quiet_since = min(now, stat.st_mtime)
+            self._schedule(path, entry, entry.quiet_since + self.quiet_seconds)
+
+    def touched(self, path):
+        """A write was seen: the quiet period starts over."""
+        with self.condition:
+            entry = self.files.get(path)
+            if entry:
+                entry.quiet_since = time.time()
+
+    def closed(self, path):
+        """The writer closed the file; confirm with a quick re-check instead of waiting out the interval."""
+        with self.condition:
+            entry = self.files.get(path)
+            if entry:
+                entry.interval = self.initial_interval
+                self._schedule(path, entry, time.time() + min(self.initial_interval, self.quiet_seconds))
+
+    def moved(self, src_path, dest_path, is_video):
+        """Follows a rename. A tracked file renamed to a non-video name is dropped; a rename to a
+        video name (typically from a temporary copy name) is checked right away."""
+        with self.condition:
+            entry = self.files.pop(src_path, None)
+        if not is_video or is_temporary_name(dest_path):
+            return
+        if entry is None:
+            self.track(dest_path)
+            return
+        with self.condition:
+            self.files[dest_path] = entry
+            self._schedule(dest_path, entry, time.time())
+
+    def forget(self, path):
+        with self.condition:
+            self.files.pop(path, None)
+
+    def _release(self, path):
+        self.released += 1
+        try:
+            self.on_stable(path)
+        except Exception as e:
+            logging.error(f"Failed to queue stable file '{path}': {e}", exc_info=True)
+
+    def _check(self, path, entry, now):
+        """Returns True if the file is stable; otherwise reschedules it (or drops it if it is gone)."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            logging.info(f"'{path}' disappeared while waiting for it to settle.")
+            del self.files[path]
+            return False
+        if stat.st_size != entry.size or stat.st_mtime_ns != entry.mtime_ns:
+            entry.size, entry.mtime_ns = stat.st_size, stat.st_mtime_ns
+            entry.quiet_since = now
+            entry.interval = min(entry.interval * 2, self.max_interval)
+            self._schedule(path, entry, now + entry.interval)
+            return False
+        stable_at = entry.quiet_since + self.quiet_seconds
+        if now >= stable_at:
+            del self.files[path]
+            return True
+        self._schedule(path, entry, min(stable_at, now + entry.interval))
+        return False
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.stopping and (not self.schedule or self.schedule[0][0] > time.time()):
+                    self.condition.wait(self.schedule[0][0] - time.time() if self.schedule else None)
+                if self.stopping:
+                    return
+                due, generation, path = heapq.heappop(self.schedule)
+                entry = self.files.get(path)
+                # Entries rescheduled since this was queued have a newer heap item.
+                if entry is None or entry.generation != generation:
+                    continue
+                stable = self._check(path, entry, time.time())
+            if stable:
+                self._release(path)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='stability-tracker', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join()
@@ -0,0 +1,168 @@
+import os
+import time
+import configparser
+
+import pytest
+
+import youtube_uploader
+from fake_youtube import FakeYouTube
+from resumable import (CHUNK_GRANULARITY, ChunkedFileUpload, SESSION_MAX_AGE, UploadJournal, chunk_size_from_mb,
+                       file_identity, query_upload_status)
+from upload_scheduler import QuotaBucket
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(os.urandom(4 * CHUNK_GRANULARITY + 1000))
+    return str(path)
+
+
+def test_chunk_size_is_a_multiple_of_the_granularity():
+    assert chunk_size_from_mb(1) == 1024 * 1024
+    assert chunk_size_from_mb(0.3) == CHUNK_GRANULARITY
+    assert chunk_size_from_mb(0) == CHUNK_GRANULARITY
+
+
+def test_chunked_upload_reuses_one_buffer(video):
+    buffer = bytearray(CHUNK_GRANULARITY)
+    media = ChunkedFileUpload(video, CHUNK_GRANULARITY, buffer=buffer)
+    try:
+        with open(video, 'rb') as f:
+            data = f.read()
+        assert media.size() == len(data)
+        first = media.getbytes(0, CHUNK_GRANULARITY)
+        assert bytes(first) == data[:CHUNK_GRANULARITY]
+        last = media.getbytes(4 * CHUNK_GRANULARITY, CHUNK_GRANULARITY)
+        assert bytes(last) == data[4 * CHUNK_GRANULARITY:]
+        assert first.obj is buffer and last.obj is buffer
+    finally:
+        media.close()
+
+
+def test_journal_persists_sessions(tmp_path, video):
+    journal_path = str(tmp_path / 'sessions.json')
+    identity = file_identity(video)
+    journal = UploadJournal(journal_path)
+    journal.update(video, identity, 'https://upload/1', CHUNK_GRANULARITY)
+    journal.update(video, identity, 'https://upload/1', 2 * CHUNK_GRANULARITY)
+
+    record = UploadJournal(journal_path).get(video, identity)
+    assert record['uri'] == 'https://upload/1'
+    assert record['acknowledged'] == 2 * CHUNK_GRANULARITY
+
+    journal.remove(video)
+    assert UploadJournal(journal_path).get(video, identity) is None
+
+
+def test_journal_drops_sessions_for_changed_files(tmp_path, video):
+    journal = UploadJournal(str(tmp_path / 'sessions.json'))
+    journal.update(video, file_identity(video), 'https://upload/1', CHUNK_GRANULARITY)
+    with open(video, 'ab') as f:
+        f.write(b'more')
+    assert journal.get(video, file_identity(video)) is None
+    assert video not in UploadJournal(journal.path).sessions
+
+
+def test_journal_drops_expired_sessions(tmp_path, video):
+    journal = UploadJournal(str(tmp_path / 'sessions.json'))
+    identity = file_identity(video)
+    journal.update(video, identity, 'https://upload/1', 0, started=time.time() - SESSION_MAX_AGE - 1)
+    assert journal.get(video, identity) is None
+
+
+def test_unreadable_journal_starts_empty(tmp_path):
+    path = tmp_path / 'sessions.json'
+    path.write_text('{not json')
+    assert UploadJournal(str(path)).sessions == {}
+
+
+class _Response(dict):
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+        self.reason = ''
+
+
+class _Http:
+    def __init__(self, response, content=b''):
+        self.response = response
+        self.content = content
+        self.requests = []
+
+    def request(self, uri, method, headers=None):
+        self.requests.append((uri, method, headers))
+        return self.response, self.content
+
+
+@pytest.mark.parametrize('response, content, expected', [
+    (_Response(308, {'range': 'bytes=0-524287'}), b'', ('incomplete', 524288)),
+    (_Response(308), b'', ('incomplete', 0)),
+    (_Response(200), b'{"id": "VID1"}', ('complete', {'id': 'VID1'})),
+    (_Response(404), b'', ('expired', None)),
+    (_Response(410), b'', ('expired', None)),
+])
+def test_query_upload_status(response, content, expected):
+    http = _Http(response, content)
+    assert query_upload_status(http, 'https://upload/1', 1000) == expected
+    assert http.requests[0][2]['Content-Range'] == 'bytes */1000'
+
+
+@pytest.fixture
+def fake_api(tmp_path, monkeypatch):
+    api = FakeYouTube().start()
+    config = configparser.ConfigParser()
+    config.read_dict({
+        'YouTube': {'api_endpoint': api.endpoint, 'anonymous': 'true'},
+        'Uploader': {'chunk_size_mb': '0.25'},
+    })
+    monkeypatch.setattr(youtube_uploader, 'CONFIG', config)
+    monkeypatch.setattr(youtube_uploader, 'QUOTA', QuotaBucket())
+    monkeypatch.setattr(youtube_uploader, 'CREDENTIALS', None)
+    yield api
+    api.stop()
+
+
+class _Crash(Exception):
+    pass
+
+
+def test_interrupted_upload_resumes_from_the_journal(tmp_path, video, fake_api, monkeypatch):
+    journal_path = str(tmp_path / 'sessions.json')
+    journal = UploadJournal(journal_path)
+    update = journal.update
+
+    def crash_after_two_chunks(*args):
+        update(*args)
+        if args[3] >= 2 * CHUNK_GRANULARITY:
+            raise _Crash()
+
+    monkeypatch.setattr(journal, 'update', crash_after_two_chunks)
+    monkeypatch.setattr(youtube_uploader, 'UPLOAD_JOURNAL', journal)
+    youtube_uploader.QUOTA.try_spend('videos.insert')
+    youtube = youtube_uploader.get_authenticated_service()
+    with pytest.raises(_Crash):
+        youtube_uploader.upload_video(youtube, video)
+    assert fake_api.snapshot()['upload_bytes'] == 2 * CHUNK_GRANULARITY
+
+    # A restart reads the session back from disk and sends only the rest of the file.
+    monkeypatch.setattr(youtube_uploader, 'UPLOAD_JOURNAL', UploadJournal(journal_path))
+    youtube_uploader.QUOTA.try_spend('videos.insert')
+    video_id = youtube_uploader.upload_video(youtube, video)
+    stats = fake_api.snapshot()
+    assert video_id in fake_api.videos
+    assert stats['upload_bytes'] == os.path.getsize(video)
+    assert stats['api_calls'] == {'videos.insert': 1}
+    assert stats['uploads_completed'] == 1
+    # The resumed session was paid for by the first attempt.
+    assert youtube_uploader.QUOTA.used == 1600
+    assert UploadJournal(journal_path).sessions == {}
+
+
+def test_expired_session_starts_over(tmp_path, video, fake_api, monkeypatch):
+    journal = UploadJournal(str(tmp_path / 'sessions.json'))
+    journal.update(video, file_identity(video), f'{fake_api.endpoint}upload/youtube/v3/videos?upload_id=gone', 0)
+    monkeypatch.setattr(youtube_uploader, 'UPLOAD_JOURNAL', journal)
+    youtube = youtube_uploader.get_authenticated_service()
+    assert youtube_uploader.upload_video(youtube, video) in fake_api.videos
+    assert fake_api.snapshot()['upload_bytes'] == os.path.getsize(video)
@@ -0,0 +1,192 @@
+import json
+import datetime
+import threading
+
+import pytest
+
+import upload_scheduler
+from upload_scheduler import (CallLimitReached, QuotaBucket, QuotaExhausted, RetryableError, UploadJob,
+                              UploadScheduler)
+
+
+def test_bucket_charges_and_refunds():
+    bucket = QuotaBucket(daily_quota=2000)
+    assert bucket.try_spend('videos.insert')
+    assert bucket.remaining() == 400
+    assert not bucket.try_spend('videos.insert')
+    assert bucket.affordable('playlistItems.insert', 8)
+    assert not bucket.affordable('playlistItems.insert', 9)
+    bucket.refund('videos.insert')
+    assert bucket.remaining() == 2000
+    bucket.refund('videos.insert')
+    assert bucket.used == 0
+
+
+def test_bucket_spends_all_or_nothing():
+    bucket = QuotaBucket(daily_quota=100)
+    assert not bucket.try_spend_all([('playlistItems.insert', 1), ('playlists.insert', 1), ('playlists.list', 1)])
+    assert bucket.used == 0
+    assert bucket.try_spend_all([('playlistItems.insert', 1), ('playlists.insert', 1)])
+    assert bucket.remaining() == 0
+
+
+def test_bucket_charge_and_exhaust_ignore_the_limit():
+    bucket = QuotaBucket(daily_quota=10, costs={'playlists.list': 20})
+    bucket.charge('playlists.list')
+    assert bucket.used == 20 and bucket.remaining() == 0
+    bucket = QuotaBucket(daily_quota=10)
+    bucket.exhaust()
+    assert not bucket.try_spend('playlists.list')
+
+
+def test_bucket_state_survives_restarts_within_the_day(tmp_path):
+    state_path = str(tmp_path / 'quota.json')
+    QuotaBucket(state_path=state_path).try_spend('videos.insert', 2)
+    assert QuotaBucket(state_path=state_path).used == 3200
+
+    with open(state_path, 'w') as f:
+        json.dump({'day': '2000-01-01', 'used': 9000}, f)
+    assert QuotaBucket(state_path=state_path).used == 0
+
+    with open(state_path, 'w') as f:
+        f.write('{broken')
+    assert QuotaBucket(state_path=state_path).used == 0
+
+
+def test_bucket_refills_when_the_quota_day_changes(monkeypatch):
+    day = datetime.date(2025, 11, 12)
+    monkeypatch.setattr(upload_scheduler, 'quota_day', lambda now=None: day)
+    bucket = QuotaBucket(daily_quota=1600)
+    assert bucket.try_spend('videos.insert')
+    assert not bucket.affordable('videos.insert')
+    day = datetime.date(2025, 11, 13)
+    assert bucket.try_spend('videos.insert')
+
+
+def test_seconds_until_reset_counts_to_pacific_midnight():
+    # 2025-11-12 23:00 in Los Angeles (PST, UTC-8).
+    now = datetime.datetime(2025, 11, 13, 7, 0, tzinfo=datetime.timezone.utc).timestamp()
+    assert upload_scheduler.seconds_until_reset(now) == 3600
+    assert upload_scheduler.quota_day(now) == datetime.date(2025, 11, 12)
+
+
+def test_job_order_by_priority():
+    old = UploadJob('b', size=10, created=1.0)
+    new = UploadJob('a', size=5, created=2.0)
+    follow_up = UploadJob('c', call='playlistItems.insert', created=3.0, rank=0)
+    jobs = [old, new, follow_up]
+    assert sorted(jobs, key=lambda j: j.sort_key('oldest')) == [follow_up, old, new]
+    assert sorted(jobs, key=lambda j: j.sort_key('newest')) == [follow_up, new, old]
+    assert sorted(jobs, key=lambda j: j.sort_key('smallest')) == [follow_up, new, old]
+    assert sorted(jobs, key=lambda j: j.sort_key('largest')) == [follow_up, old, new]
+    assert UploadJob('x', call='playlistItems.insert', count=3, extra={'playlists.list': 1}).calls() == [
+        ('playlistItems.insert', 3), ('playlists.list', 1)]
+
+
+def run(scheduler, timeout=10):
+    scheduler.start()
+    try:
+        return scheduler.wait_idle(timeout)
+    finally:
+        scheduler.stop(timeout=5)
+
+
+def test_scheduler_runs_jobs_and_follow_ups():
+    done = []
+    lock = threading.Lock()
+
+    def handler(job):
+        with lock:
+            done.append(job.key)
+        if job.call == 'videos.insert':
+            return [UploadJob(job.path, call='playlistItems.insert', rank=0)]
+        return None
+
+    bucket = QuotaBucket()
+    scheduler = UploadScheduler(handler, bucket, workers=3)
+    for name in ('a', 'b', 'c'):
+        assert scheduler.submit(UploadJob(name, created=1.0))
+    assert not scheduler.submit(UploadJob('a'))
+    assert run(scheduler)
+    assert sorted(done) == sorted([(n, c) for n in 'abc' for c in ('videos.insert', 'playlistItems.insert')])
+    assert bucket.used == 3 * 1600 + 3 * 50
+    assert scheduler.stats['completed'] == 6
+
+
+def test_scheduler_only_starts_jobs_the_quota_covers():
+    done = []
+    bucket = QuotaBucket(daily_quota=3300)
+    scheduler = UploadScheduler(lambda job: done.append(job.path), bucket, workers=2)
+    for index in range(3):
+        scheduler.submit(UploadJob(f'file{index}', created=float(index)))
+    scheduler.submit(UploadJob('small', call='playlistItems.insert', created=9.0))
+    assert not run(scheduler, timeout=1)
+    assert sorted(done) == ['file0', 'file1', 'small']
+    assert bucket.used == 3250
+    assert scheduler.pending() == 1
+
+
+def test_retryable_errors_back_off_then_give_up():
+    attempts = []
+
+    def handler(job):
+        attempts.append(job.attempts)
+        raise RetryableError('503')
+
+    scheduler = UploadScheduler(handler, QuotaBucket(), workers=1, max_attempts=3, backoff_seconds=0.01)
+    scheduler.submit(UploadJob('a'))
+    assert run(scheduler)
+    assert attempts == [0, 1, 2]
+    assert scheduler.stats == {'completed': 0, 'failed': 1, 'retried': 2, 'quota_waits': 0}
+
+
+def test_quota_exhausted_holds_every_job():
+    calls = []
+
+    def handler(job):
+        calls.append(job.path)
+        raise QuotaExhausted('quotaExceeded')
+
+    bucket = QuotaBucket()
+    scheduler = UploadScheduler(handler, bucket, workers=1)
+    scheduler.submit(UploadJob('a', created=1.0))
+    scheduler.submit(UploadJob('b', call='playlistItems.insert', created=2.0))
+    assert not run(scheduler, timeout=0.5)
+    assert calls == ['a']
+    assert bucket.remaining() == 0
+    assert scheduler.pending() == 2
+
+
+def test_call_limit_pauses_only_that_call():
+    calls = []
+
+    def handler(job):
+        calls.append(job.key)
+        if job.call == 'videos.insert':
+            raise CallLimitReached('uploadLimitExceeded')
+
+    scheduler = UploadScheduler(handler, QuotaBucket(), workers=1)
+    scheduler.submit(UploadJob('a', created=1.0))
+    scheduler.submit(UploadJob('b', created=2.0))
+    scheduler.submit(UploadJob('c', call='playlistItems.insert', created=3.0))
+    assert not run(scheduler, timeout=0.5)
+    assert calls == [('a', 'videos.insert'), ('c', 'playlistItems.insert')]
+    assert scheduler.stats['quota_waits'] == 1
+    assert scheduler.pending() == 2
+
+
+def test_other_errors_drop_the_job():
+    def handler(job):
+        raise ValueError('bad file')
+
+    scheduler = UploadScheduler(handler, QuotaBucket(), workers=1)
+    scheduler.submit(UploadJob('a'))
+    assert run(scheduler)
+    assert scheduler.stats['failed'] == 1
+    # A dropped job can be submitted again.
+    assert scheduler.submit(UploadJob('a'))
+
+
+def test_unknown_priority():
+    with pytest.raises(ValueError):
+        UploadScheduler(lambda job: None, QuotaBucket(), priority='random')
@@ -0,0 +1,107 @@
+import os
+import json
+import hashlib
+
+import pytest
+
+import video_store
+from video_store import LEGACY_PREFIX, SAMPLE_BLOCK_SIZE, SAMPLE_BLOCKS, VideoStore, fingerprint, full_hash
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = VideoStore(str(tmp_path / 'videos.db'))
+    yield store
+    store.close()
+
+
+def make_file(tmp_path, name, size, seed=0):
+    path = tmp_path / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(bytes((i * 7 + seed) % 251 for i in range(size)))
+    return str(path)
+
+
+def test_fingerprint_survives_renames_and_sees_sampled_changes(tmp_path):
+    size = SAMPLE_BLOCK_SIZE * SAMPLE_BLOCKS * 4
+    path = make_file(tmp_path, 'a.mp4', size)
+    value = fingerprint(path)
+    assert value.startswith(f'{size}:')
+    os.rename(path, tmp_path / 'b.mp4')
+    assert fingerprint(str(tmp_path / 'b.mp4')) == value
+
+    with open(tmp_path / 'b.mp4', 'r+b') as f:
+        f.seek(size - 1)
+        f.write(b'\xff')
+    assert fingerprint(str(tmp_path / 'b.mp4')) != value
+
+
+def test_full_hash_streams_the_whole_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_store, 'FULL_HASH_BUFFER', 1000)
+    path = make_file(tmp_path, 'a.mp4', 4321)
+    with open(path, 'rb') as f:
+        assert full_hash(path) == hashlib.blake2b(f.read()).hexdigest()
+
+
+def test_fingerprints_are_cached_by_size_and_mtime(tmp_path, store, monkeypatch):
+    path = make_file(tmp_path, 'a.mp4', 1000)
+    value = store.fingerprint_of(path)
+    monkeypatch.setattr(video_store, 'fingerprint', lambda *args: pytest.fail('file was read again'))
+    assert store.fingerprint_of(path) == value
+
+
+def test_moved_uploads_are_recognised(tmp_path, store):
+    path = make_file(tmp_path, 'a/clip.mp4', 1000)
+    assert not store.is_uploaded(path)
+    value = store.record_upload(path, 'VID1')
+    moved = str(tmp_path / 'b' / 'clip.mp4')
+    os.makedirs(os.path.dirname(moved))
+    os.rename(path, moved)
+    row = store.find(moved)
+    assert row['video_id'] == 'VID1' and row['fingerprint'] == value and row['full_hash'] is None
+    store.update_path(value, moved)
+    assert store.find(moved)['path'] == moved
+    assert not store.is_uploaded(make_file(tmp_path, 'other.mp4', 1000, seed=1))
+
+
+def test_playlist_bookkeeping(tmp_path, store):
+    first = make_file(tmp_path, 'a.mp4', 100, seed=1)
+    second = make_file(tmp_path, 'b.mp4', 100, seed=2)
+    store.record_upload(first, 'VID1')
+    store.record_upload(second, 'VID2', playlist_id='PL1')
+    assert store.without_playlist() == [('VID1', first)]
+    store.set_playlist('VID1', 'PL1')
+    assert store.without_playlist() == []
+
+
+def test_migrate_json_imports_once(tmp_path, store):
+    present = make_file(tmp_path, 'present.mp4', 1000)
+    missing = str(tmp_path / 'missing.mp4')
+    json_path = tmp_path / 'uploaded_videos.json'
+    json_path.write_text(json.dumps([present, missing, present]))
+
+    assert store.migrate_json(str(json_path)) == 3
+    assert len(store) == 2
+    assert not json_path.exists()
+    assert (tmp_path / 'uploaded_videos.json.migrated').exists()
+    assert store.migrate_json(str(json_path)) == 0
+
+    assert store.find(present)['fingerprint'] == fingerprint(present)
+    # A file that was gone at migration time is still skipped if it reappears at its old path.
+    make_file(tmp_path, 'missing.mp4', 500)
+    assert store.find(missing)['fingerprint'] == LEGACY_PREFIX + missing
+
+
+def test_migrated_rows_survive_reopening(tmp_path):
+    path = make_file(tmp_path, 'a.mp4', 1000)
+    json_path = tmp_path / 'uploaded_videos.json'
+    json_path.write_text(json.dumps([path]))
+    db_path = str(tmp_path / 'videos.db')
+    store = VideoStore(db_path)
+    store.migrate_json(str(json_path))
+    store.close()
+    reopened = VideoStore(db_path)
+    try:
+        assert reopened.is_uploaded(path)
+    finally:
+        reopened.close()
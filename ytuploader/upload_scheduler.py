@@ -0,0 +1,376 @@
+"""
+Quota-aware upload scheduling.
+
+    QuotaBucket       YouTube Data API quota units spent today, charged per
+                      call type and refilled at midnight Pacific time, when
+                      Google resets the daily quota. The day's spend is kept in
+                      a small state file so restarts don't forget it.
+    UploadScheduler   priority queue of jobs (one API call each) drained by a
+                      pool of worker threads. A job only starts when the quota
+                      for its call is available; a failure backs off only that
+                      job, only a real quota error pauses all work until reset,
+                      and a per-call limit (the channel's upload limit) pauses
+                      only calls of that kind.
+"""
+import os
+import json
+import time
+import heapq
+import random
+import logging
+import datetime
+import threading
+from zoneinfo import ZoneInfo
+
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+DEFAULT_DAILY_QUOTA = 10000
+DEFAULT_QUOTA_COSTS = {
+    "videos.insert": 1600,
+    "playlistItems.insert": 50,
+    "playlists.list": 1,
+    "playlists.insert": 50,
+}
+PRIORITIES = ("oldest", "newest", "smallest", "largest")
+
+
+class QuotaExhausted(Exception):
+    """The API reported the project's daily quota as used up."""
+
+
+class CallLimitReached(Exception):
+    """The API refuses one kind of call for now (e.g. the channel's upload limit); the quota is unaffected."""
+
+
+class RetryableError(Exception):
+    """A transient failure; the job is retried after a backoff."""
+
+
+def quota_day(now=None):
+    return datetime.datetime.fromtimestamp(now or time.time(), QUOTA_TIMEZONE).date()
+
+
+def seconds_until_reset(now=None):
+    """Seconds until the next midnight in the quota time zone."""
+    now = now or time.time()
+    today = datetime.datetime.fromtimestamp(now, QUOTA_TIMEZONE).date()
+    midnight = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time(), QUOTA_TIMEZONE)
+    return max(0.0, midnight.timestamp() - now)
+
+
+class QuotaBucket:
+    """Thread-safe count of the quota units left today."""
+    def __init__(self, daily_quota=DEFAULT_DAILY_QUOTA, costs=None, state_path=None):
+        self.daily_quota = daily_quota
+        self.costs = dict(DEFAULT_QUOTA_COSTS, **(costs or {}))
+        self.state_path = state_path
+        self.lock = threading.Lock()
+        self.day = quota_day()
+        self.used = 0
+        if state_path and os.path.exists(state_path):
+            try:
+                with open(state_path, 'r') as f:
+                    state = json.load(f)
+                if state.get('day') == self.day.isoformat():
+                    self.used = state.get('used', 0)
+            except (OSError, ValueError):
+                logging.warning(f"Ignoring unreadable quota state file '{state_path}'.")
+
+    def _roll_over(self):
+        today = quota_day()
+        if today != self.day:
+            logging.info(f"Quota day {today} started; {self.daily_quota} units available.")
+            self.day = today
+            self.used = 0
+
+    def _save(self):
+        if not self.state_path:
+            return
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'day': self.day.isoformat(), 'used': self.used}, f)
+        os.replace(temp_path, self.state_path)
+
+    def cost(self, call, count=1):
+        return self.costs[call] * count
+
+    def remaining(self):
+        with self.lock:
+            self._roll_over()
+            return max(0, self.daily_quota - self.used)
+
+    def affordable(self, call, count=1):
+        with self.lock:
+            self._roll_over()
+            return self.used + self.cost(call, count) <= self.daily_quota
+
+    def try_spend(self, call, count=1):
+        """Charges the call if today's quota still covers it; returns whether it did."""
+        return self.try_spend_all([(call, count)])
+
+    def try_spend_all(self, calls):
+        """Charges every (call, count) pair if today's quota covers them all, else none; returns whether it did."""
+        with self.lock:
+            self._roll_over()
+            cost = sum(self.cost(call, count) for call, count in calls)
+            if self.used + cost > self.daily_quota:
+                return False
+            self.used += cost
+            self._save()
+            return True
+
+    def charge(self, call, count=1):
+        """Records a call that is made regardless of the remaining quota (e.g. startup lookups)."""
+        with self.lock:
+            self._roll_over()
+            self.used += self.cost(call, count)
+            self._save()
+
+    def refund(self, call, count=1):
+        """Gives back units charged for a call that turned out not to cost quota."""
+        with self.lock:
+            self._roll_over()
+            self.used = max(0, self.used - self.cost(call, count))
+            self._save()
+
+    def exhaust(self):
+        """Marks today's quota as used up after the API said so."""
+        with self.lock:
+            self._roll_over()
+            self.used = max(self.used, self.daily_quota)
+            self._save()
+
+
+class UploadJob:
+    """One API call to make for a file: the upload itself or a follow-up such as a playlist insert.
+
+    A job may stand for count calls of the same kind sent together (a batch request).
+    extra maps other calls the job may have to make (e.g. a playlist lookup) to
+    their count; their quota is reserved together with the job's own, and the
+    handler refunds what it didn't use.
+    """
+    def __init__(self, path, call='videos.insert', size=0, created=0.0, data=None, rank=1, count=1, extra=None):
+        self.path = path
+        self.call = call
+        self.count = count
+        self.extra = extra or {}
+        self.size = size
+        self.created = created
+        self.data = data or {}
+        # Lower ranks run first; follow-up calls for finished uploads use rank 0.
+        self.rank = rank
+        self.attempts = 0
+        self.not_before = 0.0
+
+    @classmethod
+    def for_file(cls, path):
+        stat = os.stat(path)
+        return cls(path, size=stat.st_size, created=stat.st_ctime)
+
+    def calls(self):
+        """The (call, count) pairs charged when the job starts."""
+        return [(self.call, self.count)] + list(self.extra.items())
+
+    @property
+    def key(self):
+        return (self.path, self.call)
+
+    def sort_key(self, priority):
+        if priority == 'newest':
+            order = -self.created
+        elif priority == 'smallest':
+            order = self.size
+        elif priority == 'largest':
+            order = -self.size
+        else:
+            order = self.created
+        return (self.rank, order, self.path)
+
+
+class UploadScheduler:
+    """Runs handler(job) for submitted jobs on a pool of worker threads.
+
+    handler may return follow-up jobs to submit. It signals failures by raising
+    QuotaExhausted (the job waits for the quota reset), CallLimitReached (jobs
+    for the same call wait for the reset, others go on), RetryableError (the
+    job is retried with exponential backoff, up to max_attempts) or anything
+    else (the job is dropped and logged).
+    """
+    def __init__(self, handler, bucket, workers=2, priority='oldest', max_attempts=5,
+                 backoff_seconds=60, max_backoff_seconds=3600):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {', '.join(PRIORITIES)}.")
+        self.handler = handler
+        self.bucket = bucket
+        self.worker_count = workers
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.condition = threading.Condition()
+        self.ready = []
+        self.delayed = []
+        self.known = set()
+        # call -> time until which jobs for it are held back.
+        self.paused = {}
+        self.active = 0
+        self.stopping = False
+        self.threads = []
+        self.counter = 0
+        self.stats = {'completed': 0, 'failed': 0, 'retried': 0, 'quota_waits': 0}
+
+    def submit(self, job, delay=0):
+        """Queues a job; returns False if the same call for the same file is already queued or running."""
+        with self.condition:
+            if job.key in self.known:
+                return False
+            self.known.add(job.key)
+            job.not_before = time.time() + delay if delay else 0.0
+            self._push(job)
+            self.condition.notify()
+            return True
+
+    def _push(self, job):
+        self.counter += 1
+        if job.not_before > time.time():
+            heapq.heappush(self.delayed, (job.not_before, self.counter, job))
+        else:
+            heapq.heappush(self.ready, (job.sort_key(self.priority), self.counter, job))
+
+    def pending(self):
+        with self.condition:
+            return len(self.ready) + len(self.delayed) + self.active
+
+    def _is_paused(self, call, now):
+        until = self.paused.get(call)
+        if until is not None and until <= now:
+            del self.paused[call]
+            until = None
+        return until is not None
+
+    def _take(self):
+        """Pops the best ready job that may run now and fits in today's quota, and charges it; None if there is none."""
+        now = time.time()
+        while self.delayed and self.delayed[0][0] <= now:
+            _, _, job = heapq.heappop(self.delayed)
+            self.counter += 1
+            heapq.heappush(self.ready, (job.sort_key(self.priority), self.counter, job))
+        if not self.ready:
+            return None
+        best = self.ready[0][2]
+        if not self._is_paused(best.call, now) and self.bucket.try_spend_all(best.calls()):
+            return heapq.heappop(self.ready)[2]
+        # The best job's call is paused or doesn't fit in what is left today; another call might run.
+        for _, _, job in sorted(self.ready):
+            if not self._is_paused(job.call, now) and self.bucket.try_spend_all(job.calls()):
+                self.ready.remove(next(entry for entry in self.ready if entry[2] is job))
+                heapq.heapify(self.ready)
+                return job
+        return None
+
+    def _wait_time(self):
+        timeouts = [60.0]
+        if self.delayed:
+            timeouts.append(self.delayed[0][0] - time.time())
+        if self.ready:
+            # Everything ready is waiting for quota or for its call to be resumed.
+            timeouts.append(seconds_until_reset() + 1)
+        if self.paused:
+            timeouts.append(min(self.paused.values()) - time.time())
+        return max(0.05, min(timeouts))
+
+    def _retry_delay(self, attempts):
+        delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _finish(self, job, outcome, requeue=False):
+        with self.condition:
+            self.active -= 1
+            self.stats[outcome] += 1
+            if requeue:
+                self._push(job)
+            else:
+                self.known.discard(job.key)
+            self.condition.notify_all()
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                job = None
+                while not self.stopping:
+                    job = self._take()
+                    if job:
+                        break
+                    self.condition.wait(self._wait_time())
+                if self.stopping:
+                    return
+                self.active += 1
+
+            try:
+                follow_ups = self.handler(job) or ()
+            except QuotaExhausted as e:
+                self.bucket.exhaust()
+                hours = seconds_until_reset() / 3600
+                logging.warning(f"Quota exhausted ({e}); '{job.path}' waits for the reset in {hours:.1f} hours.")
+                job.not_before = 0.0
+                self._finish(job, 'quota_waits', requeue=True)
+                continue
+            except CallLimitReached as e:
+                seconds = seconds_until_reset()
+                with self.condition:
+                    self.paused[job.call] = time.time() + seconds
+                logging.warning(f"{job.call} limit reached ({e}); {job.call} calls wait {seconds / 3600:.1f} hours, "
+                                f"other calls go on.")
+                job.not_before = 0.0
+                self._finish(job, 'quota_waits', requeue=True)
+                continue
+            except RetryableError as e:
+                job.attempts += 1
+                if job.attempts >= self.max_attempts:
+                    logging.error(f"Giving up on {job.call} for '{job.path}' after {job.attempts} attempts: {e}")
+                    self._finish(job, 'failed')
+                    continue
+                delay = self._retry_delay(job.attempts)
+                logging.warning(f"{job.call} for '{job.path}' failed ({e}); retry {job.attempts} in {delay:.0f}s.")
+                job.not_before = time.time() + delay
+                self._finish(job, 'retried', requeue=True)
+                continue
+            except Exception as e:
+                logging.error(f"{job.call} for '{job.path}' failed: {e}", exc_info=True)
+                self._finish(job, 'failed')
+                continue
+
+            # Queued before the job is marked done, so wait_idle() never sees a gap.
+            for follow_up in follow_ups:
+                self.submit(follow_up)
+            self._finish(job, 'completed')
+
+    def start(self):
+        logging.info(f"Starting {self.worker_count} upload worker(s), {self.bucket.remaining()} quota units left today.")
+        for index in range(self.worker_count):
+            thread = threading.Thread(target=self._worker, name=f"uploader-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def wait_idle(self, timeout=None):
+        """Blocks until no job is queued or running (or timeout seconds pass); returns whether it is idle."""
+        deadline = time.time() + timeout if timeout is not None else None
+        with self.condition:
+            while self.ready or self.delayed or self.active:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining if remaining is not None else 1.0)
+            return True
+
+    def stop(self, timeout=None):
+        """Stops the workers once their current job finishes, waiting at most timeout seconds for them.
+
+        Workers are daemon threads, so an upload still running after the timeout
+        is abandoned when the process exits.
+        """
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        deadline = time.time() + timeout if timeout is not None else None
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0, deadline - time.time()))
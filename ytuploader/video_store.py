@@ -0,0 +1,189 @@
+"""
+Record of uploaded videos, keyed by content fingerprint.
+
+A fingerprint is the file size plus a BLAKE2b hash of a handful of sampled
+blocks (start, end and evenly spaced blocks in between), so it costs a few
+small reads whatever the file size, and survives renames and moves. An optional
+full streaming hash can be stored alongside for a stronger check.
+
+    videos   one row per uploaded video: fingerprint, optional full hash, size,
+             last known path, video ID, playlist ID and timestamps
+    paths    path -> fingerprint cache keyed on size and mtime, so unchanged
+             files are never re-read
+
+Rows are written with single-row statements into a WAL-mode SQLite database,
+so recording an upload costs the same however many videos are stored, and an
+interrupted write never loses earlier entries.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+SAMPLE_BLOCK_SIZE = 64 * 1024
+SAMPLE_BLOCKS = 8
+FULL_HASH_BUFFER = 1024 * 1024
+# Rows migrated from uploaded_videos.json whose file no longer exists.
+LEGACY_PREFIX = 'legacy:'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    fingerprint TEXT PRIMARY KEY,
+    full_hash TEXT,
+    size INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    video_id TEXT,
+    playlist_id TEXT,
+    uploaded_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS paths (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL
+);
+"""
+
+
+def fingerprint(path, size=None):
+    """Returns 'size:hash' where hash covers SAMPLE_BLOCKS blocks spread over the file."""
+    if size is None:
+        size = os.path.getsize(path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(size).encode())
+    buffer = bytearray(SAMPLE_BLOCK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb') as f:
+        if size <= SAMPLE_BLOCK_SIZE * SAMPLE_BLOCKS:
+            offsets = range(0, size, SAMPLE_BLOCK_SIZE)
+        else:
+            last = size - SAMPLE_BLOCK_SIZE
+            offsets = [last * i // (SAMPLE_BLOCKS - 1) for i in range(SAMPLE_BLOCKS)]
+        for offset in offsets:
+            f.seek(offset)
+            read = f.readinto(view)
+            digest.update(view[:read])
+    return f"{size}:{digest.hexdigest()}"
+
+
+def full_hash(path):
+    """Streams the whole file through BLAKE2b."""
+    digest = hashlib.blake2b()
+    buffer = bytearray(FULL_HASH_BUFFER)
+    view = memoryview(buffer)
+    with open(path, 'rb') as f:
+        while True:
+            read = f.readinto(view)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+
+class VideoStore:
+    """Uploaded videos in SQLite; safe to use from the watcher and all upload workers."""
+    def __init__(self, path, use_full_hash=False):
+        self.path = path
+        self.use_full_hash = use_full_hash
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT count(*) FROM videos").fetchone()[0]
+
+    def fingerprint_of(self, path, stat=None):
+        """Returns the file's fingerprint, from the path cache when size and mtime are unchanged."""
+        stat = stat or os.stat(path)
+        with self.lock:
+            row = self.db.execute("SELECT size, mtime_ns, fingerprint FROM paths WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        value = fingerprint(path, stat.st_size)
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO paths (path, size, mtime_ns, fingerprint) VALUES (?, ?, ?, ?)",
+                            (path, stat.st_size, stat.st_mtime_ns, value))
+        return value
+
+    def find(self, path, stat=None):
+        """Returns the stored row (as a dict) for the video at path, or None if it was never uploaded."""
+        value = self.fingerprint_of(path, stat)
+        with self.lock:
+            cursor = self.db.execute("SELECT * FROM videos WHERE fingerprint = ? OR fingerprint = ?",
+                                     (value, LEGACY_PREFIX + path))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    def is_uploaded(self, path, stat=None):
+        return self.find(path, stat) is not None
+
+    def record_upload(self, path, video_id, playlist_id=None):
+        """Records a finished upload; returns the file's fingerprint."""
+        stat = os.stat(path)
+        value = self.fingerprint_of(path, stat)
+        digest = full_hash(path) if self.use_full_hash else None
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT INTO videos (fingerprint, full_hash, size, path, video_id, playlist_id, uploaded_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(fingerprint) DO UPDATE SET "
+                "full_hash=excluded.full_hash, path=excluded.path, video_id=excluded.video_id, "
+                "playlist_id=excluded.playlist_id, updated_at=excluded.updated_at",
+                (value, digest, stat.st_size, path, video_id, playlist_id, now, now))
+        return value
+
+    def set_playlist(self, video_id, playlist_id):
+        with self.lock, self.db:
+            self.db.execute("UPDATE videos SET playlist_id = ?, updated_at = ? WHERE video_id = ?",
+                            (playlist_id, time.time(), video_id))
+
+    def without_playlist(self):
+        """Returns (video_id, path) of uploads that were never added to a playlist."""
+        with self.lock:
+            return self.db.execute("SELECT video_id, path FROM videos WHERE video_id IS NOT NULL "
+                                   "AND playlist_id IS NULL ORDER BY uploaded_at").fetchall()
+
+    def update_path(self, fingerprint_value, path):
+        """Notes where an already uploaded video lives now (after a rename or move)."""
+        with self.lock, self.db:
+            self.db.execute("UPDATE videos SET path = ?, updated_at = ? WHERE fingerprint = ?",
+                            (path, time.time(), fingerprint_value))
+
+    def migrate_json(self, json_path):
+        """Imports the old uploaded_videos.json path list once, then renames it to *.migrated.
+
+        Files that still exist are fingerprinted; missing ones are kept under their
+        path so they are still skipped if they reappear there. Returns the number imported.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, 'r') as f:
+            paths = json.load(f)
+        now = time.time()
+        rows = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                rows.append((self.fingerprint_of(path, stat), stat.st_size, path))
+            except OSError:
+                rows.append((LEGACY_PREFIX + path, 0, path))
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO videos (fingerprint, size, path, uploaded_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                ((value, size, path, now, now) for value, size, path in rows))
+        os.replace(json_path, f"{json_path}.migrated")
+        logging.info(f"Migrated {len(rows)} entries from '{json_path}' into '{self.path}'.")
+        return len(rows)
@@ -1,28 +1,61 @@
 import os
+import sys
 import json
 import time
 import logging
+import mimetypes
+import threading
 import configparser
-from queue import Queue
-from threading import Thread
+import urllib.parse
+from collections import Counter
 
+import httplib2
+from google.auth.credentials import AnonymousCredentials
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import BatchHttpRequest
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
+from library_scan import LibraryScanner
+from playlists import DEFAULT_MAX_AGE, MAX_BATCH_SIZE, PlaylistCache, PlaylistItemQueue
+from resumable import (DEFAULT_CHUNK_SIZE, ChunkedFileUpload, UploadJournal, UploadProgress, chunk_size_from_mb,
+                       file_identity, query_upload_status)
+from stability import StabilityTracker
+from upload_scheduler import (DEFAULT_DAILY_QUOTA, DEFAULT_QUOTA_COSTS, CallLimitReached, QuotaBucket,
+                              QuotaExhausted, RetryableError, UploadJob, UploadScheduler)
+from video_store import VideoStore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+import telemetry  # noqa: E402
+
 # --- Globals ---
 CONFIG = None
-VIDEO_QUEUE = Queue()
-UPLOADED_DB = set()
+SCHEDULER = None
+TRACKER = None
+QUOTA = None
+PLAYLISTS = None
+PLAYLIST_ITEMS = None
+UPLOAD_JOURNAL = None
+VIDEO_STORE = None
+CREDENTIALS = None
+THREAD_STATE = threading.local()
 
 # Supported video formats
 VIDEO_EXTENSIONS = ['.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv']
 
+# 403 reasons that mean no more calls of any kind will succeed until the quota resets.
+QUOTA_ERROR_REASONS = ('quotaExceeded', 'dailyLimitExceeded')
+# Reasons that only stop further calls of the same kind (the channel's upload limit, a 400).
+CALL_LIMIT_REASONS = ('uploadLimitExceeded',)
+RETRYABLE_ERROR_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded', 'backendError')
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+# How often the metrics textfile is rewritten.
+METRICS_FLUSH_SECONDS = 15
+
 
 def setup_logging():
     """Sets up logging to file and console."""
@@ -33,10 +66,24 @@ def setup_logging():
         handlers=[
             logging.FileHandler(log_file),
             logging.StreamHandler()
-        ])
+        ],
+        # load_config() has already logged, which set up a default WARNING-level handler.
+        force=True)
     logging.info("Logger initialized.")
 
 
+def setup_telemetry():
+    """Turns on metrics and JSON logs if the [Telemetry] section asks for them."""
+    json_log = CONFIG.get('Telemetry', 'json_log', fallback='')
+    if not telemetry.configure('ytuploader', json_log=json_log,
+                               textfile=CONFIG.get('Telemetry', 'metrics_textfile', fallback=''),
+                               http_port=CONFIG.getint('Telemetry', 'metrics_port', fallback=0)):
+        return
+    if json_log:
+        logging.getLogger().addHandler(telemetry.JsonLogHandler())
+    logging.info("Telemetry enabled.")
+
+
 def load_config(file='config.ini'):
     """Loads the configuration file."""
     global CONFIG
@@ -47,26 +94,18 @@ def load_config(file='config.ini'):
     logging.info("Configuration loaded successfully.")
 
 
-def load_uploaded_db():
-    """Loads the database of uploaded videos."""
-    global UPLOADED_DB
-    db_path = CONFIG.get('Files', 'uploaded_videos_db')
-    if os.path.exists(db_path):
-        with open(db_path, 'r') as f:
-            UPLOADED_DB = set(json.load(f))
-    logging.info(f"Loaded {len(UPLOADED_DB)} entries from the uploaded videos database.")
+def load_video_store():
+    """Opens the uploaded videos store, importing the old uploaded_videos.json on first start."""
+    global VIDEO_STORE
+    VIDEO_STORE = VideoStore(CONFIG.get('Files', 'video_store', fallback='uploaded_videos.db'),
+                             use_full_hash=CONFIG.getboolean('Uploader', 'full_hash', fallback=False))
+    legacy_db = CONFIG.get('Files', 'uploaded_videos_db', fallback='uploaded_videos.json')
+    VIDEO_STORE.migrate_json(legacy_db)
+    logging.info(f"Loaded {len(VIDEO_STORE)} entries from the uploaded videos store.")
 
 
-def save_uploaded_db():
-    """Saves the database of uploaded videos."""
-    db_path = CONFIG.get('Files', 'uploaded_videos_db')
-    with open(db_path, 'w') as f:
-        json.dump(list(UPLOADED_DB), f, indent=4)
-    logging.info(f"Saved {len(UPLOADED_DB)} entries to the uploaded videos database.")
-
-
-def get_authenticated_service():
-    """Authenticate and return a YouTube API service object."""
+def get_credentials():
+    """Loads (refreshing or creating as needed) the OAuth credentials; returns None if that isn't possible."""
     creds = None
     token_file = CONFIG.get('Files', 'token')
     client_secrets_file = CONFIG.get('Files', 'client_secrets')
@@ -91,44 +130,172 @@ def get_authenticated_service():
             token.write(creds.to_json())
         logging.info("Credentials saved.")
 
-    return build('youtube', 'v3', credentials=creds)
+    return creds
+
+
+def get_authenticated_service():
+    """Authenticate and return a YouTube API service object."""
+    global CREDENTIALS
+    api_endpoint = CONFIG.get('YouTube', 'api_endpoint', fallback='')
+    if CREDENTIALS is None:
+        if api_endpoint and CONFIG.getboolean('YouTube', 'anonymous', fallback=False):
+            # For a local stand-in such as fake_youtube.py, which doesn't check tokens.
+            CREDENTIALS = AnonymousCredentials()
+        else:
+            CREDENTIALS = get_credentials()
+        if CREDENTIALS is None:
+            return None
+    client_options = {'api_endpoint': api_endpoint} if api_endpoint else None
+    return build('youtube', 'v3', credentials=CREDENTIALS, client_options=client_options)
+
+
+def api_uri(uri):
+    """Points an absolute API URI at api_endpoint, if one is configured.
+
+    The client library moves media upload URIs to the endpoint's host but keeps their https scheme.
+    """
+    api_endpoint = CONFIG.get('YouTube', 'api_endpoint', fallback='')
+    if not api_endpoint:
+        return uri
+    endpoint = urllib.parse.urlparse(api_endpoint)
+    return urllib.parse.urlunparse(urllib.parse.urlparse(uri)._replace(scheme=endpoint.scheme, netloc=endpoint.netloc))
+
+
+def new_batch_request(youtube, callback):
+    """Starts a batch request, sent to api_endpoint if one is configured (the client library always uses Google's)."""
+    api_endpoint = CONFIG.get('YouTube', 'api_endpoint', fallback='')
+    if api_endpoint:
+        return BatchHttpRequest(callback=callback, batch_uri=urllib.parse.urljoin(api_endpoint, 'batch'))
+    return youtube.new_batch_http_request(callback=callback)
+
+
+def get_thread_service():
+    """Returns this thread's service object; the underlying HTTP client is not thread-safe, so workers don't share one."""
+    if getattr(THREAD_STATE, 'youtube', None) is None:
+        THREAD_STATE.youtube = get_authenticated_service()
+        if THREAD_STATE.youtube is None:
+            raise Exception("Failed to authenticate with YouTube.")
+    return THREAD_STATE.youtube
+
+
+def get_thread_buffer(size):
+    """Returns this thread's chunk buffer, so uploads reuse one allocation per worker."""
+    buffer = getattr(THREAD_STATE, 'buffer', None)
+    if buffer is None or len(buffer) < size:
+        buffer = THREAD_STATE.buffer = bytearray(size)
+    return buffer
+
+
+def http_error_reason(error):
+    """Returns the first error reason of an API error response, or ''."""
+    try:
+        return json.loads(error.content.decode())['error']['errors'][0]['reason']
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return ''
+
+
+def classify_error(error):
+    """Maps an exception from an API call onto the scheduler's QuotaExhausted/CallLimitReached/RetryableError."""
+    if isinstance(error, HttpError):
+        reason = http_error_reason(error)
+        telemetry.count('api_errors_total', status=error.resp.status, reason=reason or 'none')
+        if error.resp.status == 403 and reason in QUOTA_ERROR_REASONS:
+            return QuotaExhausted(reason)
+        if reason in CALL_LIMIT_REASONS:
+            return CallLimitReached(reason)
+        if error.resp.status in RETRYABLE_STATUS_CODES or reason in RETRYABLE_ERROR_REASONS:
+            return RetryableError(f"HTTP {error.resp.status} {reason}".strip())
+        return error
+    if isinstance(error, (OSError, httplib2.HttpLib2Error)):
+        # Connection resets, timeouts and DNS failures.
+        telemetry.count('network_errors_total')
+        return RetryableError(repr(error))
+    return error
+
+
+def is_video_file(path):
+    return any(path.lower().endswith(ext) for ext in VIDEO_EXTENSIONS)
+
+
+def track_directory(directory):
+    """Tracks every video under a directory that appeared in one go (created or moved in)."""
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if is_video_file(file):
+                TRACKER.track(os.path.join(root, file))
 
 
 class NewVideoHandler(FileSystemEventHandler):
-    """Handles new video file events."""
+    """Feeds file events to the stability tracker, which queues videos once their copy is complete."""
     def on_created(self, event):
         if event.is_directory:
-            return
-        
-        file_path = event.src_path
-        if any(file_path.lower().endswith(ext) for ext in VIDEO_EXTENSIONS):
-            if file_path not in UPLOADED_DB:
-                logging.info(f"New video detected: {file_path}")
-                VIDEO_QUEUE.put(file_path)
-            else:
-                logging.info(f"Ignoring already uploaded video: {file_path}")
+            track_directory(event.src_path)
+        elif is_video_file(event.src_path):
+            logging.info(f"New video detected: {event.src_path}")
+            TRACKER.track(event.src_path)
 
+    def on_modified(self, event):
+        if not event.is_directory:
+            TRACKER.touched(event.src_path)
 
-def get_or_create_playlist(youtube, title, privacy_status):
-    """Gets or creates a YouTube playlist."""
-    playlists_response = youtube.playlists().list(part='snippet', mine=True).execute()
-    for playlist in playlists_response['items']:
-        if playlist['snippet']['title'] == title:
-            logging.info(f"Found existing playlist: '{title}' (ID: {playlist['id']})")
-            return playlist['id']
+    def on_closed(self, event):
+        if not event.is_directory:
+            TRACKER.closed(event.src_path)
+
+    def on_moved(self, event):
+        if event.is_directory:
+            track_directory(event.dest_path)
+        else:
+            TRACKER.moved(event.src_path, event.dest_path, is_video_file(event.dest_path))
+
+
+def queue_upload(path):
+    """Stability tracker callback: the file has stopped changing, so it can be uploaded."""
+    try:
+        job = UploadJob.for_file(path)
+    except OSError:
+        return
+    if SCHEDULER.submit(job):
+        logging.info(f"'{path}' is complete; queued for upload.")
+
+
+def folder_name(file_path):
+    return os.path.basename(os.path.dirname(file_path))
 
-    logging.info(f"Creating new playlist: '{title}'")
-    playlist_body = {
-        'snippet': {'title': title, 'description': f'A playlist for {title}'},
-        'status': {'privacyStatus': privacy_status}
-    }
-    new_playlist = youtube.playlists().insert(part='snippet,status', body=playlist_body).execute()
-    logging.info(f"Successfully created playlist: '{title}' (ID: {new_playlist['id']})")
-    return new_playlist['id']
 
+def playlist_title(file_path):
+    """The playlist a video goes into: its own folder's with playlist_per_folder, otherwise the watch folder's."""
+    if CONFIG.getboolean('YouTube', 'playlist_per_folder', fallback=False):
+        return folder_name(file_path)
+    return os.path.basename(os.path.normpath(CONFIG.get('Paths', 'watch_folder')))
 
-def upload_video(youtube, file_path, playlist_id):
-    """Uploads a single video to YouTube."""
+
+def get_playlist_id(youtube, title, charge=None):
+    """Gets or creates a YouTube playlist, looking it up in the playlist cache first."""
+    privacy_status = CONFIG.get('YouTube', 'privacy_status', fallback='private')
+    return PLAYLISTS.get_or_create(youtube, title, privacy_status, charge=charge)
+
+
+def playlist_lookup_calls(items):
+    """The calls to reserve quota for, besides the inserts, to find or create the playlists of items."""
+    missing = {title for title in (playlist_title(item['path']) for item in items) if not PLAYLISTS.get(title)}
+    if not missing:
+        return {}
+    return {'playlists.list': PLAYLISTS.list_pages(), 'playlists.insert': len(missing)}
+
+
+def settle_reservation(reserved, used):
+    """Refunds reserved calls that weren't made (and charges any made beyond the reservation)."""
+    for call in set(reserved) | set(used):
+        difference = reserved.get(call, 0) - used.get(call, 0)
+        if difference > 0:
+            QUOTA.refund(call, difference)
+        elif difference < 0:
+            QUOTA.charge(call, -difference)
+
+
+def upload_video(youtube, file_path):
+    """Uploads a single video to YouTube and returns its ID; API errors are raised to the caller."""
     file_name = os.path.basename(file_path)
     video_title = os.path.splitext(file_name)[0]
     privacy_status = CONFIG.get('YouTube', 'privacy_status', fallback='private')
@@ -138,76 +305,240 @@ def upload_video(youtube, file_path, playlist_id):
         'snippet': {
             'title': video_title,
             'description': f'Uploaded from {file_path}',
-            'tags': [os.path.basename(os.path.dirname(file_path))],
+            'tags': [folder_name(file_path)],
             'categoryId': category_id
         },
         'status': {'privacyStatus': privacy_status}
     }
 
-    logging.info(f"Starting upload for '{file_name}'...")
-    media = MediaFileUpload(file_path, chunksize=-1, resumable=True)
-    request = youtube.videos().insert(part=','.join(body.keys()), body=body, media_body=media)
-    
-    response = None
-    while response is None:
-        try:
-            status, response = request.next_chunk()
-            if status:
-                logging.info(f"Uploaded {int(status.progress() * 100)}% for '{file_name}'")
-        except HttpError as e:
-            if e.resp.status == 403 and 'quotaExceeded' in e.content.decode():
-                logging.error("YouTube API quota exceeded. Pausing uploads.")
-                raise  # Re-raise the exception to be caught by the main loop
+    chunk_size = chunk_size_from_mb(CONFIG.getfloat('Uploader', 'chunk_size_mb',
+                                                    fallback=DEFAULT_CHUNK_SIZE / (1024 * 1024)))
+    mimetype = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+    identity = file_identity(file_path)
+    media = ChunkedFileUpload(file_path, chunk_size, mimetype, buffer=get_thread_buffer(chunk_size))
+    try:
+        request = youtube.videos().insert(part=','.join(body.keys()), body=body, media_body=media)
+        request.uri = api_uri(request.uri)
+        response = None
+        progress = UploadProgress(media.size())
+
+        session = UPLOAD_JOURNAL.get(file_path, identity)
+        if session:
+            state, result = query_upload_status(request.http, session['uri'], media.size())
+            if state == 'expired':
+                logging.info(f"Upload session for '{file_name}' expired; starting over.")
+                UPLOAD_JOURNAL.remove(file_path)
             else:
-                logging.error(f"An HTTP error occurred during upload: {e}")
-                return None
-        except Exception as e:
-            logging.error(f"A non-HTTP error occurred during upload: {e}")
-            return None
+                # The session's quota was paid when it was created.
+                QUOTA.refund('videos.insert')
+                if state == 'complete':
+                    response = result
+                else:
+                    request.resumable_uri = session['uri']
+                    request.resumable_progress = result
+                    progress = UploadProgress(media.size(), resumed_from=result)
+                    logging.info(f"Resuming upload for '{file_name}' at byte {result} of {media.size()}.")
+        if response is None and not session:
+            logging.info(f"Starting upload for '{file_name}'...")
+
+        while response is None:
+            status, response = request.next_chunk()
+            if response is None:
+                # Every acknowledged chunk is journaled, so a restart continues from here.
+                UPLOAD_JOURNAL.update(file_path, identity, request.resumable_uri, request.resumable_progress)
+                telemetry.count('upload_bytes_total', request.resumable_progress - progress.acknowledged)
+                progress.update(request.resumable_progress)
+                logging.info(f"Uploaded {progress.describe()} for '{file_name}'")
+    finally:
+        media.close()
+    UPLOAD_JOURNAL.remove(file_path)
+    telemetry.count('upload_bytes_total', media.size() - progress.acknowledged)
+    progress.update(media.size())
+    telemetry.observe('upload_mb_per_second', progress.rate / 1e6, buckets=telemetry.RATE_BUCKETS)
 
     video_id = response['id']
-    logging.info(f"Successfully uploaded video: '{video_title}' (ID: {video_id})")
+    logging.info(f"Successfully uploaded video: '{video_title}' (ID: {video_id}) "
+                 f"in {progress.elapsed:.1f}s at {progress.rate / 1e6:.2f} MB/s")
+    return video_id
 
-    # Add to playlist
-    playlist_item_body = {
-        'snippet': {
-            'playlistId': playlist_id,
-            'resourceId': {'kind': 'youtube#video', 'videoId': video_id}
+
+def add_to_playlists(youtube, items, charge=None):
+    """Adds uploaded videos to their playlists with one batch request; returns [(item, error)] for those that failed.
+
+    charge(call) is called for each playlists.list/insert made to look up or create a playlist.
+    """
+    failures = []
+
+    def on_response(request_id, response, exception):
+        item = items[int(request_id)]
+        if exception is None:
+            VIDEO_STORE.set_playlist(item['video_id'], item['playlist_id'])
+        else:
+            failures.append((item, exception))
+
+    batch = new_batch_request(youtube, on_response)
+    for index, item in enumerate(items):
+        item['playlist_id'] = get_playlist_id(youtube, playlist_title(item['path']), charge)
+        playlist_item_body = {
+            'snippet': {
+                'playlistId': item['playlist_id'],
+                'resourceId': {'kind': 'youtube#video', 'videoId': item['video_id']}
+            }
         }
-    }
-    youtube.playlistItems().insert(part='snippet', body=playlist_item_body).execute()
-    logging.info(f"Added video '{video_title}' to playlist.")
-    
-    return video_id
+        batch.add(youtube.playlistItems().insert(part='snippet', body=playlist_item_body), request_id=str(index))
+    batch.execute()
+    return failures
+
+
+def playlist_jobs(force=False):
+    """Turns videos waiting for their playlist into batched playlistItems.insert jobs."""
+    return [UploadJob(items[0]['path'], 'playlistItems.insert', rank=0, count=len(items), data={'items': items},
+                      extra=playlist_lookup_calls(items))
+            for items in PLAYLIST_ITEMS.take_batches(force)]
+
+
+def handle_job(job):
+    """Scheduler handler: makes the job's API call and returns its follow-up jobs."""
+    try:
+        youtube = get_thread_service()
+        if job.call == 'videos.insert':
+            # The scheduler charged this job's quota up front; give it back when no upload is made.
+            if not os.path.exists(job.path):
+                QUOTA.refund('videos.insert')
+                logging.warning(f"'{job.path}' disappeared before it could be uploaded; skipping.")
+                return []
+            with telemetry.span('fingerprint'):
+                existing = VIDEO_STORE.find(job.path)
+            if existing:
+                telemetry.count('duplicates_skipped_total')
+                QUOTA.refund('videos.insert')
+                VIDEO_STORE.update_path(existing['fingerprint'], job.path)
+                logging.info(f"Ignoring already uploaded video: {job.path} (was '{existing['path']}').")
+                return []
+            with telemetry.span('upload'):
+                video_id = upload_video(youtube, job.path)
+            with telemetry.span('record'):
+                VIDEO_STORE.record_upload(job.path, video_id)
+            telemetry.count('videos_uploaded_total')
+            logging.info(f"Successfully processed and logged '{job.path}'.")
+            # Playlist inserts are separate jobs, so a failure there never causes a re-upload. They
+            # are batched; a video's insert waits for a full batch or playlist_batch_seconds.
+            PLAYLIST_ITEMS.add(video_id, job.path)
+            return playlist_jobs()
+        if job.call == 'playlistItems.insert':
+            items = job.data['items']
+            # Playlist lookups and creations were reserved with the job (job.extra); settle what was used.
+            used = Counter()
+            try:
+                with telemetry.span('playlist_batch') as span:
+                    failures = add_to_playlists(youtube, items, charge=lambda call: used.update((call,)))
+                    span.set(items=len(items), failed=len(failures))
+            finally:
+                settle_reservation(job.extra, used)
+            telemetry.count('playlist_items_added_total', len(items) - len(failures))
+            logging.info(f"Added {len(items) - len(failures)} of {len(items)} video(s) to playlists.")
+            retry, errors = [], []
+            for item, error in failures:
+                classified = classify_error(error)
+                if http_error_reason(error) == 'playlistNotFound':
+                    # Deleted since it was cached; look it up (or create it) again.
+                    PLAYLISTS.forget(item['playlist_id'])
+                    classified = RetryableError(f"playlist {item['playlist_id']} not found")
+                if isinstance(classified, (QuotaExhausted, RetryableError)):
+                    retry.append(item)
+                    errors.append(classified)
+                else:
+                    # Left without a playlist in the store, so it is tried again on the next start.
+                    logging.error(f"Could not add video '{item['video_id']}' to a playlist: {error}")
+            if retry:
+                # Only the failed inserts are sent (and charged) again.
+                job.data['items'] = retry
+                job.count = len(retry)
+                job.extra = playlist_lookup_calls(retry)
+                raise next((e for e in errors if isinstance(e, QuotaExhausted)), errors[0])
+            return []
+        raise ValueError(f"Unknown job call '{job.call}'.")
+    except Exception as e:
+        classified = classify_error(e)
+        if classified is e:
+            raise
+        raise classified from e
 
 
 def initial_scan(watch_folder):
     """Scans the watch folder on startup for any videos not yet uploaded."""
     logging.info(f"Performing initial scan of '{watch_folder}'...")
-    video_files = set()
-    for root, dirs, files in os.walk(watch_folder):
-        if 'unsorted' in dirs:
-            dirs.remove('unsorted')
-        for file in files:
-            if any(file.lower().endswith(ext) for ext in VIDEO_EXTENSIONS):
-                video_files.add(os.path.join(root, file))
-    
-    new_videos = sorted(list(video_files - UPLOADED_DB), key=lambda f: os.path.getctime(f))
+    scanner = LibraryScanner(CONFIG.get('Files', 'scan_cache', fallback='scan_cache.json'), VIDEO_EXTENSIONS,
+                             workers=CONFIG.getint('Uploader', 'scan_workers', fallback=8))
+    with telemetry.span('scan') as span:
+        scan = scanner.scan(watch_folder)
+        span.set(videos=len(scan.files), directories=scan.directories, listed=scan.rescanned)
+    telemetry.gauge('library_videos', len(scan.files))
+    logging.info(f"Scanned {scan.describe()}.")
+
+    new_videos = [f for f in scan.files if not VIDEO_STORE.is_uploaded(f.path, f)]
     
     if new_videos:
         logging.info(f"Found {len(new_videos)} new videos during initial scan.")
+        # Files that haven't been written to for a while are queued straight away. Cached
+        # listings may be stale for files rewritten in place, so the tracker stats them afresh.
         for video in new_videos:
-            VIDEO_QUEUE.put(video)
+            TRACKER.track(video.path)
     else:
         logging.info("No new videos found during initial scan.")
 
 
+def load_playlists():
+    """Sets up the playlist cache and queues uploads that never made it into a playlist."""
+    global PLAYLISTS, PLAYLIST_ITEMS
+    PLAYLISTS = PlaylistCache(
+        CONFIG.get('Files', 'playlist_cache', fallback='playlists.json'),
+        max_age=CONFIG.getfloat('YouTube', 'playlist_cache_hours', fallback=DEFAULT_MAX_AGE / 3600) * 3600)
+    PLAYLIST_ITEMS = PlaylistItemQueue(
+        batch_size=CONFIG.getint('Uploader', 'playlist_batch_size', fallback=MAX_BATCH_SIZE),
+        max_delay=CONFIG.getfloat('Uploader', 'playlist_batch_seconds', fallback=60))
+    for video_id, path in VIDEO_STORE.without_playlist():
+        PLAYLIST_ITEMS.add(video_id, path)
+    if len(PLAYLIST_ITEMS):
+        logging.info(f"{len(PLAYLIST_ITEMS)} uploaded video(s) still need to be added to a playlist.")
+
+
+def load_quota_bucket():
+    """Builds the quota bucket from the [Quota] section (costs are keyed by API call, e.g. videos.insert)."""
+    costs = {call: CONFIG.getint('Quota', call, fallback=cost) for call, cost in DEFAULT_QUOTA_COSTS.items()}
+    return QuotaBucket(
+        daily_quota=CONFIG.getint('Quota', 'daily_limit', fallback=DEFAULT_DAILY_QUOTA),
+        costs=costs,
+        state_path=CONFIG.get('Files', 'quota_state', fallback='quota_state.json'))
+
+
+def create_scheduler():
+    return UploadScheduler(
+        handle_job,
+        QUOTA,
+        workers=CONFIG.getint('Uploader', 'workers', fallback=2),
+        priority=CONFIG.get('Uploader', 'priority', fallback='oldest'),
+        max_attempts=CONFIG.getint('Uploader', 'max_attempts', fallback=5),
+        backoff_seconds=CONFIG.getint('Uploader', 'retry_backoff_seconds', fallback=60),
+        max_backoff_seconds=CONFIG.getint('Uploader', 'max_backoff_seconds', fallback=3600))
+
+
+def report_metrics():
+    """Samples queue depth, quota and the other gauges."""
+    telemetry.gauge('queue_depth', SCHEDULER.pending())
+    telemetry.gauge('quota_remaining', QUOTA.remaining())
+    telemetry.gauge('files_settling', len(TRACKER))
+    telemetry.gauge('playlist_items_waiting', len(PLAYLIST_ITEMS))
+    for outcome, value in SCHEDULER.stats.items():
+        telemetry.gauge('scheduler_jobs', value, outcome=outcome)
+
+
 def main():
     """Main function to run the uploader service."""
     try:
         load_config()
         setup_logging()
-        load_uploaded_db()
+        load_video_store()
     except FileNotFoundError as e:
         print(f"FATAL: {e}. Please ensure config.ini is set up correctly.")
         return
@@ -217,67 +548,78 @@ def main():
         logging.fatal(f"Watch folder '{watch_folder}' does not exist. Exiting.")
         return
 
-    # --- Start Watchdog Observer ---
-    event_handler = NewVideoHandler()
-    observer = Observer()
-    observer.schedule(event_handler, watch_folder, recursive=True)
-    observer.start()
-    logging.info(f"Started watching folder: {watch_folder}")
+    setup_telemetry()
+    try:
+        # The sampling profiler sees the upload workers too; cprofile only the main thread.
+        with telemetry.profile(CONFIG.get('Telemetry', 'profile', fallback=''),
+                               CONFIG.get('Telemetry', 'profile_mode', fallback='sample')):
+            run(watch_folder)
+    finally:
+        telemetry.close()
 
-    # --- Perform Initial Scan ---
-    initial_scan(watch_folder)
 
-    # --- Main Processing Loop ---
+def run(watch_folder):
+    """Watches, scans and uploads until interrupted."""
+    global QUOTA, SCHEDULER, TRACKER, UPLOAD_JOURNAL
+    observer = None
     try:
+        QUOTA = load_quota_bucket()
+        UPLOAD_JOURNAL = UploadJournal(CONFIG.get('Files', 'upload_sessions', fallback='upload_sessions.json'))
         youtube = get_authenticated_service()
         if not youtube:
             raise Exception("Failed to authenticate with YouTube.")
-        
-        playlist_title = os.path.basename(os.path.normpath(watch_folder))
-        privacy = CONFIG.get('YouTube', 'privacy_status', fallback='private')
-        playlist_id = get_or_create_playlist(youtube, playlist_title, privacy)
 
+        load_playlists()
+        SCHEDULER = create_scheduler()
+        TRACKER = StabilityTracker(
+            queue_upload,
+            quiet_seconds=CONFIG.getfloat('Uploader', 'stable_seconds', fallback=10),
+            max_interval=CONFIG.getfloat('Uploader', 'stability_max_poll_seconds', fallback=30))
+        TRACKER.start()
+
+        # --- Start Watchdog Observer ---
+        event_handler = NewVideoHandler()
+        observer = Observer()
+        observer.schedule(event_handler, watch_folder, recursive=True)
+        observer.start()
+        logging.info(f"Started watching folder: {watch_folder}")
+
+        # --- Perform Initial Scan ---
+        initial_scan(watch_folder)
+
+        # --- Upload Workers ---
+        SCHEDULER.start()
+        last_flush = time.monotonic()
         while True:
-            try:
-                video_path = VIDEO_QUEUE.get()
-                logging.info(f"Processing '{video_path}' from queue.")
-                
-                # Wait for the file to be fully copied
-                upload_delay = CONFIG.getint('Uploader', 'upload_delay_seconds', fallback=10)
-                time.sleep(upload_delay)
-
-                video_id = upload_video(youtube, video_path, playlist_id)
-                if video_id:
-                    UPLOADED_DB.add(video_path)
-                    save_uploaded_db()
-                    logging.info(f"Successfully processed and logged '{video_path}'.")
-                else:
-                    logging.warning(f"Failed to upload '{video_path}'. It will be retried on next run.")
-                
-                VIDEO_QUEUE.task_done()
-
-            except HttpError: # Specifically for quota errors
-                quota_sleep_hours = CONFIG.getint('Uploader', 'quota_sleep_hours', fallback=24)
-                sleep_seconds = quota_sleep_hours * 3600
-                logging.info(f"Sleeping for {quota_sleep_hours} hours due to API quota limit.")
-                time.sleep(sleep_seconds)
-                logging.info("Waking up after quota sleep. Re-authenticating...")
-                youtube = get_authenticated_service() # Re-auth after long sleep
-                if not youtube:
-                    raise Exception("Failed to re-authenticate with YouTube after quota sleep.")
-                # Put the video back in the queue to be re-processed
-                VIDEO_QUEUE.put(video_path)
+            time.sleep(1)
+            # Partial batches of playlist inserts go out once they have waited long enough.
+            for job in playlist_jobs():
+                SCHEDULER.submit(job)
+            if telemetry.enabled():
+                report_metrics()
+                if time.monotonic() - last_flush >= METRICS_FLUSH_SECONDS:
+                    telemetry.flush()
+                    last_flush = time.monotonic()
 
     except KeyboardInterrupt:
         logging.info("Shutdown signal received. Saving state and exiting.")
     except Exception as e:
         logging.fatal(f"A fatal error occurred in the main loop: {e}", exc_info=True)
     finally:
-        observer.stop()
-        observer.join()
-        save_uploaded_db()
+        if observer:
+            observer.stop()
+            observer.join()
+        if TRACKER:
+            TRACKER.stop()
+        if SCHEDULER:
+            SCHEDULER.stop(timeout=10)
+            logging.info(f"Upload stats: {SCHEDULER.stats}")
+            if TRACKER and telemetry.enabled():
+                report_metrics()
+        if VIDEO_STORE:
+            VIDEO_STORE.close()
         logging.info("Uploader has shut down.")
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()